@@ -0,0 +1,415 @@
+# config/app_loadtest.py
+
+import asyncio
+import random
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+import numpy as np
+
+try:
+    from websockets.asyncio.client import connect
+except ImportError:  # ブラウザの代わりに WebSocket で接続するクライアント（任意）
+    connect = None
+
+APP_PATH = Path(__file__).resolve().parent.parent / "geogessr_app.py"
+
+# セッションが入力するフィルター式（空欄はフィルターなし）
+FILTER_EXPRESSIONS = (
+    "",
+    "language contains Spanish",
+    "tld = .br",
+    "gdp_per_capita > 20000 or language contains French",
+    "not language contains English and crosswalk_stripes >= 5",
+)
+
+# 1セッションの操作の重み（Content Field の切り替え、特徴文字の切り替え、フィルター式の入力）
+ACTION_WEIGHTS = {"field": 3, "char": 2, "filter": 2}
+
+# 操作するウィジェット（要素の種類, ラベル）
+ACTION_WIDGETS = {
+    "field": ("selectbox", "Content Field"),
+    "char": ("button_group", "Characters"),
+    "filter": ("text_input", "Expression"),
+}
+
+# 既定で計測する同時セッション数
+DEFAULT_LEVELS = (1, 2, 4, 8, 16)
+
+# p95 が1セッションのときのこの倍数を超えた同時セッション数を「曲がり目」とする
+BEND_FACTOR = 2.0
+
+# 合否を判定する同時セッション数（p95 が曲がり始める 4 より手前で、結果が安定する水準）
+DEFAULT_TARGET_SESSIONS = 2
+
+# 既定の合否基準（遅延・スループットは1セッションのときの値に対する比、メモリは MB）
+# 2セッションで p95 1.1〜1.2 倍・p99 2.2〜2.8 倍・スループット 0.9〜1.1 倍だった計測に
+# 余裕を持たせた値
+DEFAULT_THRESHOLDS = {
+    "max_p95_ratio": 2.5,
+    "max_p99_ratio": 6.0,
+    "min_throughput_ratio": 0.6,
+    "max_rss_mb": 2048.0,
+}
+
+
+class StreamlitServer:
+    """負荷試験用に streamlit run で起動したサーバー（with を抜けると停止）"""
+
+    def __init__(self, port: int = 0, startup_timeout: float = 60.0):
+        self.port = port or _free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.startup_timeout = startup_timeout
+        self.process = None
+
+    def __enter__(self) -> "StreamlitServer":
+        self.process = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "streamlit",
+                "run",
+                str(APP_PATH),
+                "--server.headless=true",
+                f"--server.port={self.port}",
+                "--server.fileWatcherType=none",
+                "--browser.gatherUsageStats=false",
+            ],
+            cwd=APP_PATH.parent,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"streamlit exited with {self.process.returncode}")
+            try:
+                with urllib.request.urlopen(f"{self.url}/_stcore/health", timeout=1):
+                    return self
+            except OSError:
+                time.sleep(0.2)
+        self.__exit__(None, None, None)
+        raise TimeoutError(f"streamlit did not start within {self.startup_timeout}s")
+
+    def __exit__(self, *exc):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+    @property
+    def pid(self) -> int | None:
+        return self.process.pid if self.process is not None else None
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def process_rss_mb(pid: int | None) -> tuple[float, float] | None:
+    """プロセスの (現在, 最大) 常駐メモリ（MB、取得できない環境では None）"""
+    if pid is None:
+        return None
+    try:
+        status = Path(f"/proc/{pid}/status").read_text()
+    except OSError:
+        return None
+    values = dict(line.split(":", 1) for line in status.splitlines() if ":" in line)
+    try:
+        return (
+            int(values["VmRSS"].split()[0]) / 1024,
+            int(values["VmHWM"].split()[0]) / 1024,
+        )
+    except (KeyError, ValueError):
+        return None
+
+
+def _widget_state(widget_state, element_type: str, element, choice):
+    """ウィジェットの値を WidgetState に設定（選択肢は表示文字列で指定）
+
+    選択肢を文字列で送るか番号で送るかは Streamlit のバージョンで異なるため、
+    要素の proto に文字列の値のフィールドがあるかで判断する。
+    """
+    fields = type(element).DESCRIPTOR.fields_by_name
+    if element_type == "text_input":
+        widget_state.string_value = choice
+    elif element_type == "selectbox":
+        if "raw_value" in fields:
+            widget_state.string_value = choice
+        else:
+            widget_state.int_value = list(element.options).index(choice)
+    else:
+        options = [option.content for option in element.options]
+        if "raw_values" in fields:
+            widget_state.string_array_value.data.extend(choice)
+        else:
+            widget_state.int_array_value.data.extend(options.index(c) for c in choice)
+
+
+class _Session:
+    """ブラウザの代わりに WebSocket でサーバーに接続する1つのセッション"""
+
+    def __init__(self, url: str, seed: int, timeout: float):
+        self.url = url.replace("http", "ws", 1).rstrip("/") + "/_stcore/stream"
+        self.rng = random.Random(seed)
+        self.timeout = timeout
+        # 操作したウィジェットの値（ブラウザと同じく再実行のたびに全て送る）
+        self.values = {}
+        # 操作 → (ID, 要素の種類, 要素, フラグメント ID)
+        self.widgets = {}
+        self.ws = None
+
+    async def rerun(self, fragment_id: str = "") -> tuple[float, int]:
+        """再実行を要求し、終了までの (秒数, 例外の数) を返す"""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        message = BackMsg()
+        message.rerun_script.query_string = ""
+        message.rerun_script.page_script_hash = ""
+        message.rerun_script.fragment_id = fragment_id
+        for action, choice in self.values.items():
+            widget_id, element_type, element, _ = self.widgets[action]
+            state = message.rerun_script.widget_states.widgets.add()
+            state.id = widget_id
+            _widget_state(state, element_type, element, choice)
+
+        started = time.perf_counter()
+        await self.ws.send(message.SerializeToString())
+        errors = 0
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(
+                await asyncio.wait_for(self.ws.recv(), self.timeout)
+            )
+            kind = forward.WhichOneof("type")
+            if kind == "delta" and forward.delta.WhichOneof("type") == "new_element":
+                errors += self._record_element(forward.delta)
+            elif kind == "script_finished":
+                if forward.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    errors += 1
+                # 途中で再実行された場合（逐次読み込み中など）は最後の実行まで待つ
+                if forward.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    return time.perf_counter() - started, errors
+
+    def _record_element(self, delta) -> int:
+        element = delta.new_element
+        element_type = element.WhichOneof("type")
+        if element_type == "exception":
+            return 1
+        for action, (widget_type, label) in ACTION_WIDGETS.items():
+            if element_type == widget_type:
+                widget = getattr(element, element_type)
+                if widget.label == label:
+                    self.widgets[action] = (
+                        widget.id,
+                        element_type,
+                        widget,
+                        delta.fragment_id,
+                    )
+        return 0
+
+    def next_action(self) -> str:
+        """操作を1つ選んで値を変え、再実行するフラグメント ID を返す"""
+        available = [a for a in ACTION_WEIGHTS if a in self.widgets]
+        action = self.rng.choices(available, [ACTION_WEIGHTS[a] for a in available])[0]
+        _, element_type, element, fragment_id = self.widgets[action]
+        if action == "field":
+            self.values[action] = self.rng.choice(list(element.options))
+        elif action == "char":
+            char = self.rng.choice([option.content for option in element.options])
+            self.values[action] = sorted(set(self.values.get(action, ())) ^ {char})
+        else:
+            self.values[action] = self.rng.choice(FILTER_EXPRESSIONS)
+        # フラグメント内のウィジェットはブラウザと同じくフラグメントだけを再実行する
+        return fragment_id
+
+
+async def _run_session(url: str, seed: int, reruns: int, timeout: float) -> dict:
+    session = _Session(url, seed, timeout)
+    async with connect(session.url, subprotocols=["streamlit"], max_size=None) as ws:
+        session.ws = ws
+        startup, errors = await session.rerun()
+        latencies = []
+        for _ in range(reruns):
+            latency, failed = await session.rerun(session.next_action())
+            latencies.append(latency)
+            errors += failed
+    return {"startup": startup, "latencies": latencies, "errors": errors}
+
+
+async def _run_level(url: str, sessions: int, reruns: int, timeout: float):
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(_run_session(url, seed, reruns, timeout) for seed in range(sessions))
+    )
+    return results, time.perf_counter() - started
+
+
+def run_load_test(
+    url: str,
+    sessions: int = 5,
+    reruns: int = 10,
+    timeout: float = 120.0,
+    pid: int | None = None,
+) -> dict:
+    """sessions 個のセッションを同時に接続し、各セッションで reruns 回操作して集計
+
+    セッションは実際の Streamlit サーバーに WebSocket で接続するため、再実行はサーバー内で
+    並行に動き、1プロセスのサーバーが同時接続をどこまでさばけるかを計測できる。
+    遅延は再実行の要求から終了の通知までの時間で、初回の実行は startup_ms として別に報告する。
+    スループットは全セッションの再実行数を経過時間（初回の実行を含む）で割った値。pid を渡すとサーバーの
+    常駐メモリも報告する。
+    """
+    if connect is None:
+        raise RuntimeError("the load test needs the websockets package")
+    results, elapsed = asyncio.run(_run_level(url, sessions, reruns, timeout))
+    latencies = [latency for r in results for latency in r["latencies"]]
+    values = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    rss = process_rss_mb(pid)
+    return {
+        "sessions": sessions,
+        "reruns": len(latencies),
+        "errors": sum(r["errors"] for r in results),
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "startup_ms": float(np.median([r["startup"] for r in results]) * 1000),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": float(np.max(values)),
+        "rss_mb": None if rss is None else rss[0],
+        "peak_rss_mb": None if rss is None else rss[1],
+    }
+
+
+def sweep(
+    url: str,
+    levels=DEFAULT_LEVELS,
+    reruns: int = 10,
+    timeout: float = 120.0,
+    pid: int | None = None,
+) -> list[dict]:
+    """同時セッション数を変えて順に計測（最初の水準が基準になる）"""
+    # 初回の読み込みが最初の水準の遅延に入らないよう、1回接続してから計測する
+    run_load_test(url, 1, 0, timeout)
+    return [run_load_test(url, level, reruns, timeout, pid) for level in levels]
+
+
+def find_bend(results: list[dict], factor: float = BEND_FACTOR) -> int | None:
+    """p95 が基準（最初の水準）の factor 倍を超えた最初の同時セッション数"""
+    baseline = results[0]["p95_ms"]
+    for result in results[1:]:
+        if result["p95_ms"] > factor * baseline:
+            return result["sessions"]
+    return None
+
+
+def check_thresholds(
+    results: list[dict],
+    thresholds: dict = DEFAULT_THRESHOLDS,
+    target: int = DEFAULT_TARGET_SESSIONS,
+) -> list[str]:
+    """target セッションの水準を基準（最初の水準）と比べ、満たさなかった項目の説明を返す
+
+    空なら合格。target の水準がなければ最後の水準で判定する。
+    """
+    baseline = results[0]
+    result = next((r for r in results if r["sessions"] == target), results[-1])
+    failures = []
+    errors = sum(r["errors"] for r in results)
+    if errors:
+        failures.append(f"{errors} reruns raised an exception")
+    for key, limit in (("p95_ms", "max_p95_ratio"), ("p99_ms", "max_p99_ratio")):
+        ratio = result[key] / baseline[key] if baseline[key] else 0.0
+        if ratio > thresholds[limit]:
+            failures.append(
+                f"{key} at {result['sessions']} sessions is {ratio:.1f}x the "
+                f"baseline ({result[key]:.0f} vs {baseline[key]:.0f}) > "
+                f"{thresholds[limit]}x"
+            )
+    ratio = (
+        result["throughput"] / baseline["throughput"] if baseline["throughput"] else 0.0
+    )
+    if ratio < thresholds["min_throughput_ratio"]:
+        failures.append(
+            f"throughput at {result['sessions']} sessions is {ratio:.2f}x the "
+            f"baseline < {thresholds['min_throughput_ratio']}x"
+        )
+    peak = max((r["peak_rss_mb"] or 0) for r in results)
+    if peak > thresholds["max_rss_mb"]:
+        failures.append(f"server rss {peak:.0f} MB > {thresholds['max_rss_mb']}")
+    return failures
+
+
+if __name__ == "__main__":
+    # cd geogessr_app && python -m config.app_loadtest --levels 1,2,4,8 -r 20 --target-sessions 2
+    # 起動済みのサーバーを計測する場合: --url http://127.0.0.1:8501 --pid <サーバーの PID>
+    import argparse
+    from contextlib import nullcontext
+
+    parser = argparse.ArgumentParser(
+        description="Streamlit サーバーへの同時セッション数を変えた負荷試験"
+    )
+    parser.add_argument(
+        "--levels",
+        default=",".join(map(str, DEFAULT_LEVELS)),
+        help="計測する同時セッション数（カンマ区切り、最初が基準）",
+    )
+    parser.add_argument("-r", "--reruns", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument(
+        "--url", help="起動済みのサーバー（省略時は streamlit run で起動）"
+    )
+    parser.add_argument(
+        "--pid", type=int, help="--url のサーバーのプロセス ID（メモリの計測用）"
+    )
+    parser.add_argument("--bend-factor", type=float, default=BEND_FACTOR)
+    parser.add_argument(
+        "--target-sessions",
+        type=int,
+        default=DEFAULT_TARGET_SESSIONS,
+        help="合否を判定する同時セッション数",
+    )
+    for key, value in DEFAULT_THRESHOLDS.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=float, default=value)
+    args = parser.parse_args()
+    levels = [int(level) for level in args.levels.split(",")]
+
+    with nullcontext() if args.url else StreamlitServer() as server:
+        url = args.url or server.url
+        pid = args.pid if args.url else server.pid
+        results = sweep(url, levels, args.reruns, args.timeout, pid)
+
+    baseline = results[0]
+    print("sessions  reruns  errors  rerun/s  p50 ms  p95 ms  p99 ms  p95/base  rss MB")
+    for result in results:
+        rss = "n/a" if result["rss_mb"] is None else f"{result['rss_mb']:.0f}"
+        print(
+            f"{result['sessions']:>8}  {result['reruns']:>6}  {result['errors']:>6}  "
+            f"{result['throughput']:>7.2f}  {result['p50_ms']:>6.0f}  "
+            f"{result['p95_ms']:>6.0f}  {result['p99_ms']:>6.0f}  "
+            f"{result['p95_ms'] / baseline['p95_ms']:>8.1f}  {rss:>6}"
+        )
+    bend = find_bend(results, args.bend_factor)
+    print(
+        f"p95 bends (> {args.bend_factor}x baseline) at {bend} sessions"
+        if bend is not None
+        else f"p95 stays within {args.bend_factor}x baseline up to {levels[-1]} sessions"
+    )
+
+    failures = check_thresholds(
+        results,
+        {key: getattr(args, key) for key in DEFAULT_THRESHOLDS},
+        args.target_sessions,
+    )
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
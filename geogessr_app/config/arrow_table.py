@@ -0,0 +1,125 @@
+# config/arrow_table.py
+
+import numpy as np
+
+from config.data_processor import DataProcessor
+from config.field_columns import get_field_column, materialize_field
+from config.field_config import FILTERABLE_FIELDS
+
+try:
+    import pyarrow as pa
+except ImportError:
+    # pyarrow は streamlit 経由で入る任意の依存（なければ表は表示しない）
+    pa = None
+
+# 連続した行の区間がこの数以下なら区間ごとのスライス（コピーなし）をつなぎ、
+# それより細かく散らばっている場合は take で1回だけ集める
+MAX_SLICE_RUNS = 256
+
+
+def arrow_available() -> bool:
+    """表の作成に使う pyarrow が使えるかどうか"""
+    return pa is not None
+
+
+def table_fields() -> list[str]:
+    """表の列にするフィールド（フィルター可能なフィールド）"""
+    return list(FILTERABLE_FIELDS)
+
+
+def table_dependencies() -> set[str]:
+    """表が依存するトップレベルのキー（キャッシュの無効化に使用）"""
+    fields = {"latlng"}
+    for field_path in table_fields():
+        fields |= DataProcessor.field_dependencies(field_path)
+    return fields
+
+
+def _field_array(column) -> "pa.Array":
+    if FILTERABLE_FIELDS[column.field_path][0] == "number":
+        return pa.array(column.numeric, mask=np.isnan(column.numeric))
+    display = np.array(column.display, dtype=object)
+    return pa.array(display, type=pa.string(), mask=~column.valid)
+
+
+def _latlng(info: dict) -> list:
+    latlng = info.get("latlng") or []
+    return latlng[:2] if len(latlng) >= 2 else [np.nan, np.nan]
+
+
+def build_country_table(data: dict, column_for=None) -> "pa.Table":
+    """全ての国を行、フィルター可能なフィールドを列にした Arrow の表
+
+    全ての列を同じ data から作る。column_for(field_path) は展開済みの FieldColumn を
+    返す（省略時や、返した列の国の並びが data と違う場合は data から展開し直す）。
+    数値フィールドは float64、それ以外は表示用の文字列で、値がなければ null。
+    """
+    if pa is None:
+        raise ImportError("The country table requires pyarrow")
+    countries = tuple(data)
+
+    def aligned_column(field_path: str):
+        column = column_for(field_path) if column_for else None
+        if column is None or column.countries != countries:
+            column = materialize_field(data, field_path)
+        return column
+
+    latlng = np.array(
+        [_latlng(info) for info in data.values()], dtype=np.float64
+    ).reshape(-1, 2)
+    arrays = {
+        "country": pa.array(list(data), type=pa.string()),
+        "lat": pa.array(latlng[:, 0], mask=np.isnan(latlng[:, 0])),
+        "lng": pa.array(latlng[:, 1], mask=np.isnan(latlng[:, 1])),
+    }
+    for field_path in table_fields():
+        arrays[field_path] = _field_array(aligned_column(field_path))
+    lengths = {name: len(array) for name, array in arrays.items()}
+    if set(lengths.values()) != {len(countries)}:
+        raise ValueError(f"column lengths differ from {len(countries)} rows: {lengths}")
+    return pa.table(arrays)
+
+
+def get_country_table(store, data: dict, version: str) -> "pa.Table":
+    """data（version は data と同じ時点のバージョン）の Arrow の表
+
+    バージョンごとに1回だけ作り、同じバージョンのエントリだけを使うため、表の行は
+    常に data の国の並びと一致する。
+    """
+    store.ensure_fields(table_fields())
+    return store.cache("arrow_table").get_or_compute(
+        "table",
+        lambda: build_country_table(
+            data, lambda field_path: get_field_column(store, field_path)
+        ),
+        fields=table_dependencies(),
+        version=version,
+    )
+
+
+def select_rows(table: "pa.Table", indices: np.ndarray) -> "pa.Table":
+    """行番号（昇順）の行だけを含む表
+
+    連続した区間が少なければ区間ごとの slice（バッファを共有するのでコピーしない）を
+    つなぎ、細かく散らばっている場合は take で1回だけ集める。
+    """
+    indices = np.asarray(indices, dtype=np.int64)
+    if len(indices) == table.num_rows:
+        return table
+    if len(indices) == 0:
+        return table.slice(0, 0)
+    breaks = np.flatnonzero(np.diff(indices) != 1) + 1
+    starts = np.concatenate(([indices[0]], indices[breaks]))
+    lengths = np.diff(np.concatenate(([0], breaks, [len(indices)])))
+    if len(starts) > MAX_SLICE_RUNS:
+        return table.take(pa.array(indices))
+    return pa.concat_tables(
+        [table.slice(int(start), int(n)) for start, n in zip(starts, lengths)]
+    )
+
+
+def column_labels() -> dict[str, str]:
+    """st.dataframe の列見出し（フィールドの説明）"""
+    return {
+        field_path: FILTERABLE_FIELDS[field_path][1] for field_path in table_fields()
+    }
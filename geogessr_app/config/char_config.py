@@ -1,3 +1,5 @@
+import unicodedata
+
 CHAR_TO_LANGUAGES = {
     # 北欧・西ヨーロッパ
     "å": ["Swedish", "Norwegian", "Danish"],
@@ -115,3 +117,64 @@ CHAR_TO_LANGUAGES = {
     "ʼ": ["Malay"],
     "ʔ": ["Malay"],
 }
+
+# 特定できる言語の数による色分け（1, 2, 3, 4以上）
+SPECIFICITY_MARKERS = {1: "🟥", 2: "🟧", 3: "🟨", 4: "🟩"}
+SPECIFICITY_LEGEND = "🟥 1 language · 🟧 2 · 🟨 3 · 🟩 4+"
+
+
+def char_script(char: str) -> str:
+    """文字体系の名前（Unicode の文字名の先頭、修飾文字はラテン文字として扱う）"""
+    script = unicodedata.name(char, "OTHER").split()[0]
+    return "Latin" if script in ("LATIN", "MODIFIER") else script.title()
+
+
+def char_specificity(char: str) -> int:
+    """その文字を使う言語の数（4以上は4）"""
+    return min(len(CHAR_TO_LANGUAGES.get(char, ())), 4) or 4
+
+
+def _base_form(char: str) -> str:
+    return (
+        unicodedata.normalize("NFKD", char)
+        .encode("ASCII", "ignore")
+        .decode("ASCII")
+        .lower()
+    )
+
+
+def _script_rank(script: str) -> tuple:
+    # ラテン文字を先頭に、残りは文字体系名の順
+    return (script != "Latin", script)
+
+
+# 文字選択の並び順（文字体系 → 特定しやすさ → 基本文字）は import 時に1回だけ計算
+CHAR_PICKER_OPTIONS = tuple(
+    sorted(
+        CHAR_TO_LANGUAGES,
+        key=lambda c: (
+            _script_rank(char_script(c)),
+            char_specificity(c),
+            _base_form(c),
+            c,
+        ),
+    )
+)
+CHAR_PICKER_LABELS = {
+    c: f"{SPECIFICITY_MARKERS[char_specificity(c)]}{c}" for c in CHAR_PICKER_OPTIONS
+}
+
+
+def get_and_matching_languages(
+    selected_chars: list[str], char_to_lang: dict = CHAR_TO_LANGUAGES
+) -> set[str]:
+    """選択した文字を全て使う言語の集合"""
+    if not selected_chars:
+        return set()
+    lang_sets = [set(char_to_lang.get(c, [])) for c in selected_chars]
+    return set.intersection(*lang_sets)
+
+
+def matches_selected_language(info: dict, matching_langs: set[str]) -> bool:
+    langs = info.get("language", [])
+    return any(lang in matching_langs for lang in langs)
@@ -0,0 +1,175 @@
+# config/choropleth.py
+
+import hashlib
+import json
+from pathlib import Path
+
+import numpy as np
+
+from config.country_aliases import AliasIndex
+from config.paths import BOUNDARY_PATH, CACHE_DIR
+
+# ズーム帯ごとの簡略化許容誤差（度）: (最小ズーム, 許容誤差)
+# 帯は次の帯の最小ズーム未満まで（小数のズームも含む半開区間）
+ZOOM_BANDS = (
+    (0, 0.5),
+    (3, 0.15),
+    (5, 0.04),
+    (7, 0.01),
+)
+
+# 境界データ側で国名が入っている可能性のあるプロパティ（先に見つかったものを使用）
+BOUNDARY_NAME_PROPERTIES = ("name", "NAME", "ADMIN", "name_en", "NAME_EN", "admin")
+
+
+def band_for_zoom(zoom: float | None) -> int:
+    """ズームレベルに対応するズーム帯の番号"""
+    zoom = 2 if zoom is None else max(zoom, ZOOM_BANDS[0][0])
+    band = 0
+    for i, (low, _) in enumerate(ZOOM_BANDS):
+        if zoom >= low:
+            band = i
+    return band
+
+
+def douglas_peucker(points: np.ndarray, tolerance: float) -> np.ndarray:
+    """Douglas-Peucker 法で折れ線を簡略化（始点・終点は必ず残す）"""
+    n = len(points)
+    if n <= 2:
+        return points
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        segment = points[start + 1 : end]
+        a, b = points[start], points[end]
+        ab = b - a
+        length = np.hypot(ab[0], ab[1])
+        if length == 0:
+            distances = np.hypot(segment[:, 0] - a[0], segment[:, 1] - a[1])
+        else:
+            distances = (
+                np.abs(ab[0] * (segment[:, 1] - a[1]) - ab[1] * (segment[:, 0] - a[0]))
+                / length
+            )
+        i = int(np.argmax(distances))
+        if distances[i] > tolerance:
+            split = start + 1 + i
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return points[keep]
+
+
+def _simplify_ring(ring: list, tolerance: float) -> list | None:
+    simplified = douglas_peucker(np.asarray(ring, dtype=np.float64), tolerance)
+    # 閉じたリングとして成立しない（4点未満）場合は捨てる
+    if len(simplified) < 4:
+        return None
+    return np.round(simplified, 4).tolist()
+
+
+def simplify_geometry(geometry: dict, tolerance: float) -> dict | None:
+    """Polygon / MultiPolygon を簡略化（潰れたポリゴンは除外）"""
+    if geometry["type"] == "Polygon":
+        polygons = [geometry["coordinates"]]
+    elif geometry["type"] == "MultiPolygon":
+        polygons = geometry["coordinates"]
+    else:
+        return None
+
+    simplified = []
+    for polygon in polygons:
+        outer = _simplify_ring(polygon[0], tolerance)
+        if outer is None:
+            continue
+        holes = [
+            ring
+            for ring in (_simplify_ring(hole, tolerance) for hole in polygon[1:])
+            if ring is not None
+        ]
+        simplified.append([outer] + holes)
+
+    if not simplified:
+        return None
+    if len(simplified) == 1:
+        return {"type": "Polygon", "coordinates": simplified[0]}
+    return {"type": "MultiPolygon", "coordinates": simplified}
+
+
+def _feature_name(feature: dict) -> str | None:
+    properties = feature.get("properties") or {}
+    for key in BOUNDARY_NAME_PROPERTIES:
+        if properties.get(key):
+            return str(properties[key])
+    return None
+
+
+def load_boundary_bands(
+    country_names,
+    boundary_path: Path = BOUNDARY_PATH,
+    cache_dir: Path = CACHE_DIR / "choropleth",
+) -> list[dict[str, dict]]:
+    """ズーム帯ごとの簡略化済みジオメトリ（国名 → ジオメトリ）を返す
+
+    簡略化の結果は境界ファイルの内容ハッシュをキーにディスクへキャッシュする。
+    """
+    boundary_path = Path(boundary_path)
+    if not boundary_path.exists():
+        return []
+
+    raw = boundary_path.read_bytes()
+    digest = hashlib.sha1(raw).hexdigest()[:16]
+    cache_dir = Path(cache_dir)
+    cache_paths = [cache_dir / f"{digest}-band{i}.json" for i in range(len(ZOOM_BANDS))]
+
+    if all(path.exists() for path in cache_paths):
+        bands = [json.loads(path.read_text(encoding="utf-8")) for path in cache_paths]
+    else:
+        features = json.loads(raw.decode("utf-8")).get("features", [])
+        bands = []
+        for (_, tolerance), path in zip(ZOOM_BANDS, cache_paths):
+            band = {}
+            for feature in features:
+                name = _feature_name(feature)
+                geometry = feature.get("geometry")
+                if not name or not geometry:
+                    continue
+                simplified = simplify_geometry(geometry, tolerance)
+                if simplified is not None:
+                    band[name] = simplified
+            bands.append(band)
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(band, ensure_ascii=False), encoding="utf-8")
+
+    # 境界データの国名を geo_data.yaml のキーに結合
+    alias_index = AliasIndex(list(country_names))
+    joined = []
+    for band in bands:
+        resolved = {}
+        for name, geometry in band.items():
+            country = alias_index.resolve(name)
+            if country is not None:
+                resolved[country] = geometry
+        joined.append(resolved)
+    return joined
+
+
+def build_feature_collection(geometries: dict[str, dict], styles: dict) -> dict:
+    """国名 → (表示値, 塗り色) から folium.GeoJson 用の FeatureCollection を作成"""
+    features = []
+    for country, (value, fill) in styles.items():
+        geometry = geometries.get(country)
+        if geometry is None:
+            continue
+        features.append(
+            {
+                "type": "Feature",
+                "geometry": geometry,
+                "properties": {"name": country, "value": value, "fill": fill},
+            }
+        )
+    return {"type": "FeatureCollection", "features": features}
@@ -0,0 +1,57 @@
+# config/country_aliases.py
+
+import re
+import unicodedata
+
+# geo_data.yaml のキー → 外部データで使われる別名
+COUNTRY_ALIASES = {
+    "United States of America": ["United States", "USA", "US", "U.S."],
+    "United Kingdom": ["UK", "Great Britain", "Britain"],
+    "Czech Republic": ["Czechia"],
+    "Turkey": ["Türkiye", "Turkiye"],
+    "Russia": ["Russian Federation"],
+    "South Korea": ["Korea, South", "Republic of Korea", "Korea, Rep."],
+    "Laos": ["Lao PDR", "Lao People's Democratic Republic"],
+    "Vietnam": ["Viet Nam"],
+    "Eswatini": ["Swaziland"],
+    "North Macedonia": ["Macedonia"],
+    "Hong Kong": ["Hong Kong SAR", "Hong Kong, China"],
+    "Palestine": ["State of Palestine", "West Bank and Gaza"],
+    "São Tomé and Príncipe": ["Sao Tome and Principe"],
+    "U.S. Virgin Islands": ["United States Virgin Islands", "Virgin Islands (U.S.)"],
+    "Réunion": ["Reunion"],
+    "Curaçao": ["Curacao"],
+}
+
+
+def normalize_country_name(name: str) -> str:
+    """表記揺れを吸収した比較用の国名（アクセント除去・小文字化・記号除去）"""
+    text = (
+        unicodedata.normalize("NFKD", name)
+        .encode("ASCII", "ignore")
+        .decode("ASCII")
+        .casefold()
+    )
+    text = text.replace("&", " and ")
+    text = re.sub(r"[^a-z0-9]+", " ", text).strip()
+    if text.startswith("the "):
+        text = text[4:]
+    return text
+
+
+class AliasIndex:
+    """外部データの国名を geo_data.yaml のキーに解決するインデックス"""
+
+    def __init__(self, country_names, aliases: dict | None = None):
+        self._index = {}
+        for name in country_names:
+            self._index[normalize_country_name(name)] = name
+        for canonical, alias_list in (aliases or COUNTRY_ALIASES).items():
+            if canonical not in country_names:
+                continue
+            for alias in alias_list:
+                self._index.setdefault(normalize_country_name(alias), canonical)
+
+    def resolve(self, name: str) -> str | None:
+        """国名を解決（見つからなければ None）"""
+        return self._index.get(normalize_country_name(name))
@@ -0,0 +1,346 @@
+# config/country_record.py
+
+import sys
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import ClassVar
+
+
+class _Missing:
+    """元データにキーがないことを表す値（null が明示されたキーと区別する）"""
+
+    __slots__ = ()
+
+    def __repr__(self) -> str:
+        return "MISSING"
+
+    def __reduce__(self):
+        return "MISSING"
+
+
+MISSING = _Missing()
+
+
+def _intern(value):
+    """文字列ならインターンして返す（重複する値を1つのオブジェクトに共有）"""
+    if isinstance(value, str):
+        return sys.intern(value)
+    return value
+
+
+def _shared(record, pool: dict | None):
+    """同一内容のレコードをプールから再利用（ハッシュできない値を含む場合はそのまま）"""
+    if pool is None:
+        return record
+    try:
+        return pool.setdefault(record, record)
+    except TypeError:
+        return record
+
+
+def _strings(value, pool: dict | None):
+    """文字列のリストをインターンした文字列のタプルにする（リスト以外はそのまま）"""
+    if not isinstance(value, (list, tuple)):
+        return _intern(value)
+    return _shared(tuple(_intern(v) for v in value), pool)
+
+
+class _Record(Mapping):
+    """元データの辞書と同じように読めるレコードの共通部分
+
+    キーは元データにあったフィールド（MISSING 以外）と extra のキーで、値の取得や
+    .get()・in・反復は元の辞書と同じ結果になる。
+    """
+
+    __slots__ = ()
+    # 元データのキーに対応するフィールド（extra 以外）
+    KEYS: ClassVar[tuple[str, ...]] = ()
+
+    def __getitem__(self, key):
+        if key in self.KEYS:
+            value = getattr(self, key)
+            if value is not MISSING:
+                return value
+        else:
+            for extra_key, value in self.extra:
+                if extra_key == key:
+                    return value
+        raise KeyError(key)
+
+    def __iter__(self):
+        for key in self.KEYS:
+            if getattr(self, key) is not MISSING:
+                yield key
+        for key, _value in self.extra:
+            yield key
+
+    def __len__(self) -> int:
+        return sum(1 for _key in self)
+
+    @classmethod
+    def _extra(cls, raw: Mapping) -> tuple[tuple[str, object], ...]:
+        """未知のキーは (キー, 値) のタプルとしてそのまま保持"""
+        return tuple(
+            (_intern(key), _intern(value))
+            for key, value in raw.items()
+            if key not in cls.KEYS
+        )
+
+    def to_dict(self) -> dict:
+        """YAML・JSON に書き出せる辞書に戻す（タプルはリスト、サブレコードは辞書）"""
+        return {key: to_plain(value) for key, value in self.items()}
+
+
+def to_plain(value):
+    """レコードとタプルを辞書とリストに戻す（json.dumps の default にも使える）"""
+    if isinstance(value, _Record):
+        return value.to_dict()
+    if isinstance(value, Mapping):
+        return {key: to_plain(v) for key, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_plain(v) for v in value]
+    return value
+
+
+@dataclass(frozen=True, slots=True)
+class Flag(_Record):
+    """国旗情報"""
+
+    KEYS: ClassVar[tuple[str, ...]] = ("description", "emoji", "image_url")
+
+    description: str | None = MISSING
+    emoji: str | None = MISSING
+    image_url: str | None = MISSING
+    extra: tuple[tuple[str, object], ...] = ()
+
+    @classmethod
+    def from_dict(cls, raw: Mapping) -> "Flag":
+        return cls(
+            **{key: _intern(raw[key]) for key in cls.KEYS if key in raw},
+            extra=cls._extra(raw),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class PlateSide(_Record):
+    """ナンバープレート片面（front/rear）の配色設定"""
+
+    KEYS: ClassVar[tuple[str, ...]] = (
+        "aspect_ratio",
+        "bg_color",
+        "border_color",
+        "left_band_color",
+        "right_band_color",
+        "text_color",
+        "top_band_color",
+    )
+
+    aspect_ratio: float | None = MISSING
+    bg_color: str | None = MISSING
+    border_color: str | None = MISSING
+    left_band_color: str | None = MISSING
+    right_band_color: str | None = MISSING
+    text_color: str | None = MISSING
+    top_band_color: str | None = MISSING
+    extra: tuple[tuple[str, object], ...] = ()
+
+    @classmethod
+    def from_dict(cls, raw: Mapping) -> "PlateSide":
+        return cls(
+            **{key: _intern(raw[key]) for key in cls.KEYS if key in raw},
+            extra=cls._extra(raw),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class PlateConfig(_Record):
+    """number_plate_config に対応するレコード"""
+
+    KEYS: ClassVar[tuple[str, ...]] = ("front", "rear")
+
+    front: PlateSide | None = MISSING
+    rear: PlateSide | None = MISSING
+    extra: tuple[tuple[str, object], ...] = ()
+
+    @classmethod
+    def from_dict(cls, raw: Mapping, pool: dict | None = None) -> "PlateConfig":
+        sides = {}
+        for key in cls.KEYS:
+            if key in raw:
+                side = raw[key]
+                sides[key] = (
+                    _shared(PlateSide.from_dict(side), pool)
+                    if isinstance(side, Mapping)
+                    else side
+                )
+        return cls(**sides, extra=cls._extra(raw))
+
+
+@dataclass(frozen=True, slots=True)
+class Tip(_Record):
+    """GeoGuessr Tips の1項目（text または image）"""
+
+    KEYS: ClassVar[tuple[str, ...]] = ("type", "content", "path", "caption")
+
+    type: str | None = MISSING
+    content: str | None = MISSING
+    path: str | None = MISSING
+    caption: str | None = MISSING
+    extra: tuple[tuple[str, object], ...] = ()
+
+    @classmethod
+    def from_dict(cls, raw: Mapping) -> "Tip":
+        return cls(
+            **{key: _intern(raw[key]) for key in cls.KEYS if key in raw},
+            extra=cls._extra(raw),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class Tips(_Record):
+    """geoguessr_tips（short版・long版）"""
+
+    KEYS: ClassVar[tuple[str, ...]] = ("short", "long")
+
+    short: tuple | None = MISSING
+    long: tuple | None = MISSING
+    extra: tuple[tuple[str, object], ...] = ()
+
+    @classmethod
+    def from_dict(cls, raw: Mapping, pool: dict | None = None) -> "Tips":
+        lists = {}
+        for key in cls.KEYS:
+            if key in raw:
+                tips = raw[key]
+                # 辞書以外の項目（文字列の Tips など）はそのまま残す
+                lists[key] = (
+                    tuple(
+                        (
+                            _shared(Tip.from_dict(tip), pool)
+                            if isinstance(tip, Mapping)
+                            else _intern(tip)
+                        )
+                        for tip in tips
+                    )
+                    if isinstance(tips, (list, tuple))
+                    else tips
+                )
+        return cls(**lists, extra=cls._extra(raw))
+
+
+@dataclass(frozen=True, slots=True)
+class Country(_Record):
+    """geo_data.yaml の1エントリを表す型付きの不変レコード
+
+    元データの辞書と同じキー・値で読めるため、DataProcessor などは辞書と同様に扱える。
+    """
+
+    # geo_data.yaml と同じ（アルファベット順の）キー順
+    KEYS: ClassVar[tuple[str, ...]] = (
+        "camera",
+        "crosswalk_features",
+        "crosswalk_stripes",
+        "flag",
+        "gdp_per_capita",
+        "geoguessr_tips",
+        "language",
+        "latlng",
+        "number_plate",
+        "number_plate_config",
+        "sign_back",
+        "tld",
+    )
+
+    name: str
+    camera: str | None = MISSING
+    crosswalk_features: str | None = MISSING
+    crosswalk_stripes: int | str | None = MISSING
+    flag: Flag | None = MISSING
+    gdp_per_capita: int | float | str | None = MISSING
+    geoguessr_tips: Tips | None = MISSING
+    language: tuple[str, ...] | None = MISSING
+    latlng: tuple[float, float] | None = MISSING
+    number_plate: str | None = MISSING
+    number_plate_config: PlateConfig | None = MISSING
+    sign_back: str | None = MISSING
+    tld: str | None = MISSING
+    extra: tuple[tuple[str, object], ...] = ()
+
+    @classmethod
+    def from_dict(cls, name: str, info: Mapping, pool: dict | None = None):
+        """YAML由来の辞書（または Country）からレコードを生成
+
+        pool を複数の国で共有すると、同一内容のサブレコード（プレート配色・Tips・言語の
+        組み合わせ）が1つのオブジェクトにまとめられる。
+        """
+        fields = {}
+        for key in cls.KEYS:
+            if key not in info:
+                continue
+            value = info[key]
+            if key == "flag" and isinstance(value, Mapping):
+                value = Flag.from_dict(value)
+            elif key == "number_plate_config" and isinstance(value, Mapping):
+                value = _shared(PlateConfig.from_dict(value, pool), pool)
+            elif key == "geoguessr_tips" and isinstance(value, Mapping):
+                value = _shared(Tips.from_dict(value, pool), pool)
+            elif key == "latlng" and isinstance(value, list):
+                value = tuple(value)
+            elif key == "language":
+                value = _strings(value, pool)
+            else:
+                value = _intern(value)
+            fields[key] = value
+        return cls(name=_intern(str(name)), **fields, extra=cls._extra(info))
+
+
+def build_countries(data: Mapping, pool: dict | None = None) -> dict[str, Country]:
+    """データセット全体をCountryレコードに変換（サブレコードは国間で共有）"""
+    pool = {} if pool is None else pool
+    return {name: Country.from_dict(name, info, pool) for name, info in data.items()}
+
+
+def measure_memory(n_regions: int = 100_000, source_path: str = "geo_data.yaml"):
+    """合成データセットでエントリあたりのメモリ使用量（辞書 vs レコード）を計測"""
+    import gc
+    import tracemalloc
+
+    from config.synthetic import iter_synthetic_dataset
+
+    def build_dicts() -> dict:
+        return dict(iter_synthetic_dataset(n_regions, source_path))
+
+    def build_records() -> dict:
+        pool = {}
+        return {
+            name: Country.from_dict(name, info, pool)
+            for name, info in iter_synthetic_dataset(n_regions, source_path)
+        }
+
+    results = {}
+    for label, builder in (("dict", build_dicts), ("record", build_records)):
+        gc.collect()
+        tracemalloc.start()
+        dataset = builder()
+        gc.collect()
+        current, _peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[label] = current / n_regions
+        del dataset
+    return results
+
+
+if __name__ == "__main__":
+    # cd geogessr_app && python -m config.country_record [件数] [YAMLパス]
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Countryレコードのメモリ比較")
+    parser.add_argument("n_regions", nargs="?", type=int, default=100_000)
+    parser.add_argument("source", nargs="?", default="../geo_data.yaml")
+    args = parser.parse_args()
+
+    per_entry = measure_memory(args.n_regions, args.source)
+    print(f"regions: {args.n_regions}")
+    print(f"dict   : {per_entry['dict']:.0f} bytes/entry")
+    print(f"record : {per_entry['record']:.0f} bytes/entry")
+    print(f"ratio  : {per_entry['record'] / per_entry['dict']:.2%}")
@@ -1,5 +1,10 @@
 # config/data_processor.py
 
+from collections.abc import Mapping
+
+from config.field_config import FIELD_DEPENDENCIES
+from config.flag_sprites import flag_html as flag_sprite_html
+from config.map_styles import background_style
 from config.number_plate_config import (
     get_combined_plate_data_url,
     has_number_plate_config,
@@ -78,27 +83,23 @@ class DataProcessor:
         if not has_number_plate_config(info):
             return None
 
-        # 国名を引数として渡す
-        plate_data_url = get_combined_plate_data_url(info, country)
+        # キャッシュ済みの画像があれば使い、なければ国名を引数として生成
+        plate_data_url = info.get("_plate_data_url") or get_combined_plate_data_url(
+            info, country
+        )
 
         # フラグと国名の表示
-        flag_html = ""
-        if show_flag:
-            flag_url = info.get("flag", {}).get("image_url", "")
-            if flag_url:
-                flag_html = f'<img src="{flag_url}" style="width: 30px; height: auto; display: block; margin: 0 auto 5px auto;" />'
+        flag_html = flag_sprite_html(info) if show_flag else ""
 
         country_text = ""
         if show_country_name:
-            country_text = f'<div style="font-size: 10px; margin-bottom: 5px; color: #000;">{country}</div>'
-
-        html = f"""
-        <div style="text-align: center; font-size: 10px;">
-            {flag_html}
-            {country_text}
-            <img src="{plate_data_url}" style="width: 120px; height: auto; display: block; margin: 0 auto;" />
-        </div>
-        """
+            country_text = f'<div class="gg-plate-name">{country}</div>'
+
+        # スタイルは地図に1回だけ埋め込むスタイルシート（map_styles）で指定
+        html = (
+            f'<div class="gg-label gg-plate">{flag_html}{country_text}'
+            f'<img src="{plate_data_url}" class="gg-plate-img" /></div>'
+        )
         return html
 
     @staticmethod
@@ -116,15 +117,11 @@ class DataProcessor:
             return None
 
         # フラグと国名の表示
-        flag_html = ""
-        if show_flag:
-            flag_url = info.get("flag", {}).get("image_url", "")
-            if flag_url:
-                flag_html = f'<img src="{flag_url}" style="width: 25px; height: auto; display: block; margin: 0 auto 3px auto;" />'
+        flag_html = flag_sprite_html(info) if show_flag else ""
 
         country_text = ""
         if show_country_name:
-            country_text = f'<div style="font-size: 9px; margin-bottom: 3px; color: #000; font-weight: bold;">{country}</div>'
+            country_text = f'<div class="gg-tips-name">{country}</div>'
 
         # Tips内容を動的に構築（コンパクト版）
         tips_content = ""
@@ -134,7 +131,7 @@ class DataProcessor:
                 text = tip["content"]
                 if len(text) > 25:  # 25文字以上は省略
                     text = text[:22] + "..."
-                tips_content += f'<div style="margin: 2px 0; font-size: 8px; line-height: 1.2; color: #333;">{text}</div>'
+                tips_content += f'<div class="gg-tip-text">{text}</div>'
             elif tip.get("type") == "image":
                 image_path = tip.get("path", "")
                 caption = tip.get("caption", "")
@@ -148,22 +145,20 @@ class DataProcessor:
                     image_src = f"assets/tips/{image_path}"
 
                 # 画像サイズを大幅に縮小
-                tips_content += f"""
-                <div style="margin: 3px 0; text-align: center;">
-                    <img src="{image_src}" style="width: 30%; max-width: 30px; height: auto; display: block; margin: 0 auto;" />
-                    {f'<div style="font-size: 7px; text-align: center; color: #666; margin-top: 1px; line-height: 1.1;">{caption[:20]}{"..." if len(caption) > 20 else ""}</div>' if caption else ""}
-                </div>
-                """
-
-        html = f"""
-        <div style="text-align: center; font-size: 10px; background: {bg_color}; padding: 4px; border-radius: 4px; border: 1px solid #666; max-width: 120px;">
-            {flag_html}
-            {country_text}
-            <div style="text-align: left; max-width: 110px;">
-                {tips_content}
-            </div>
-        </div>
-        """
+                caption_html = ""
+                if caption:
+                    short_caption = caption[:20] + ("..." if len(caption) > 20 else "")
+                    caption_html = f'<div class="gg-tip-caption">{short_caption}</div>'
+                tips_content += (
+                    f'<div class="gg-tip-image"><img src="{image_src}" />'
+                    f"{caption_html}</div>"
+                )
+
+        html = (
+            f'<div class="gg-tips"{background_style(bg_color)}>'
+            f"{flag_html}{country_text}"
+            f'<div class="gg-tips-body">{tips_content}</div></div>'
+        )
         return html
 
     @staticmethod
@@ -183,7 +178,7 @@ class DataProcessor:
             if not isinstance(dotted_key, str):
                 return dotted_key
             for key in dotted_key.split("."):
-                if isinstance(obj, dict) and key in obj:
+                if isinstance(obj, Mapping) and key in obj:
                     obj = obj[key]
                 else:
                     return None
@@ -191,6 +186,13 @@ class DataProcessor:
         except Exception:
             return None
 
+    @staticmethod
+    def field_dependencies(field_path: str) -> set[str]:
+        """フィールドの値が依存するトップレベルのキー"""
+        if field_path in FIELD_DEPENDENCIES:
+            return set(FIELD_DEPENDENCIES[field_path])
+        return {field_path.split(".", 1)[0]}
+
     @staticmethod
     def supports_filtering(field_path: str) -> bool:
         """指定されたフィールドがフィルタリング可能かどうか"""
@@ -210,7 +212,7 @@ class DataProcessor:
         if value is None:
             return False
 
-        if isinstance(value, list):
+        if isinstance(value, (list, tuple)):
             if match_type == "contains":
                 return any(filter_value.lower() in str(v).lower() for v in value)
             elif match_type == "equals":
@@ -0,0 +1,386 @@
+# config/dataset_store.py
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable
+
+from config.country_record import Country
+from config.paths import (
+    DATA_LAYOUT,
+    GEO_DATA_PATH,
+    SHARD_DIR,
+    SHARED_DATASET_DIR,
+    SHARED_DATASET_MODE,
+)
+from config.yaml_blocks import (
+    country_info,
+    iter_top_level_blocks,
+    iter_top_level_items,
+    parse_block,
+    split_top_level_blocks,
+)
+
+# 国の追加・削除を表す擬似フィールド（全ての国に依存するエントリを無効化する）
+MEMBERSHIP_FIELD = "__membership__"
+
+# 逐次読み込みで最初に公開する国数（以降は公開のたびに倍にする）
+STREAM_FIRST_BATCH = 200
+
+
+class DerivedCache:
+    """国・フィールド単位で無効化できる派生データのキャッシュ
+
+    各エントリは依存する国（None なら全ての国）と依存するトップレベルの
+    フィールド（None なら全てのフィールド）を持ち、変更がそのどちらにも
+    重なった場合だけ破棄される。max_entries を指定すると LRU で古いエントリを捨てる。
+    計算中に依存先が無効化された結果は、呼び出し元には返すがキャッシュには入れない。
+    """
+
+    def __init__(self, name: str, max_entries: int | None = None):
+        self.name = name
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        # 計算中のエントリの依存先と、計算中に無効化されたかどうか
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_compute(
+        self,
+        key,
+        compute: Callable,
+        countries: set[str] | None = None,
+        fields: set[str] | None = None,
+        version=None,
+    ):
+        """key のエントリを返す（なければ compute() の結果を保存して返す）
+
+        version を指定すると、同じ version で保存されたエントリだけを使う（国の並びに
+        依存する列などは、並びのバージョンを渡して古い並びのエントリを使わないようにする）。
+        """
+        countries = frozenset(countries) if countries is not None else None
+        fields = frozenset(fields) if fields is not None else None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[3] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            token = object()
+            pending = self._pending[token] = [countries, fields, False]
+
+        try:
+            value = compute()
+        finally:
+            with self._lock:
+                del self._pending[token]
+        with self._lock:
+            if pending[2]:
+                # 計算に使ったデータが途中で変わったので保存しない
+                return value
+            self._entries[key] = (value, countries, fields, version)
+            self._entries.move_to_end(key)
+            if self.max_entries is not None:
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def invalidate(self, changes: dict[str, set[str]]) -> int:
+        """変更された (国 → フィールド集合) に依存するエントリを破棄し、破棄数を返す"""
+        if not changes:
+            return 0
+        changed_fields = set().union(*changes.values())
+        with self._lock:
+            stale = [
+                key
+                for key, (_, countries, fields, _) in self._entries.items()
+                if _is_affected(countries, fields, changes, changed_fields)
+            ]
+            for key in stale:
+                del self._entries[key]
+            for pending in self._pending.values():
+                if _is_affected(pending[0], pending[1], changes, changed_fields):
+                    pending[2] = True
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _is_affected(countries, fields, changes, changed_fields) -> bool:
+    if countries is None:
+        return (
+            fields is None
+            or MEMBERSHIP_FIELD in changed_fields
+            or not fields.isdisjoint(changed_fields)
+        )
+    for country in countries.intersection(changes):
+        if fields is None or not fields.isdisjoint(changes[country]):
+            return True
+    return False
+
+
+def mark_reordered(old_order: list, new_order: list, changes: dict) -> bool:
+    """並びが変わったかどうか（変わった場合は位置が変わった国を構成の変更として記録）"""
+    if new_order == old_order:
+        return False
+    # 並べ替えだけでも国の位置に依存するキャッシュは使えなくなるため、
+    # 位置が変わった国は追加・削除と同じく国の構成の変更として扱う
+    for i, name in enumerate(new_order):
+        if i >= len(old_order) or old_order[i] != name:
+            changes.setdefault(name, set()).add(MEMBERSHIP_FIELD)
+    return True
+
+
+def _block_hash(block: str) -> str:
+    return hashlib.sha1(block.encode("utf-8")).hexdigest()
+
+
+def _dataset_version(names, block_hashes: dict[str, str]) -> str:
+    return hashlib.sha1(
+        "".join(block_hashes[name] for name in names).encode("ascii")
+    ).hexdigest()[:12]
+
+
+class DatasetStore:
+    """geo_data.yaml を保持し、変更された国ブロックだけを再パースするストア"""
+
+    def __init__(self, path: Path | str = GEO_DATA_PATH, stream: bool = False):
+        self.path = Path(path)
+        self.data = {}
+        self.version = ""
+        # 国の追加・削除・並べ替えのたびに増える番号（国の位置に依存するキャッシュに使う）
+        self.order_version = 0
+        self._block_hashes = {}
+        self._stat = None
+        # 国の間で共有するサブレコード（同じプレート配色・Tips・言語の組み合わせ）
+        self._pool = {}
+        self._caches = {}
+        self._lock = threading.RLock()
+        self._watcher = None
+        self.reload_count = 0
+        # 逐次読み込みの途中かどうか（途中の data は読み込んだ国だけを含む）
+        self.loading = False
+        # 最初の国が公開された（または読み込みが終わった）ことを知らせる
+        self._first_batch = threading.Event()
+        if stream:
+            self.start_streaming()
+        else:
+            self.refresh()
+
+    def cache(self, name: str, max_entries: int | None = None) -> DerivedCache:
+        """名前付きの派生キャッシュを取得（なければ作成）"""
+        with self._lock:
+            if name not in self._caches:
+                self._caches[name] = DerivedCache(name, max_entries)
+            return self._caches[name]
+
+    def snapshot(self) -> tuple[dict, str, int]:
+        """同じ時点の (data, version, order_version) の組"""
+        with self._lock:
+            return self.data, self.version, self.order_version
+
+    def _record(self, name, info) -> Country:
+        """国データを Country レコードに変換（サブレコードはストアのプールで共有）"""
+        return Country.from_dict(name, info, self._pool)
+
+    @property
+    def caches(self) -> dict[str, DerivedCache]:
+        return dict(self._caches)
+
+    def ensure_fields(self, field_paths) -> dict[str, set[str]]:
+        """指定フィールドのデータを読み込む（単一ファイルでは常に読み込み済み）"""
+        return {}
+
+    def refresh(self) -> dict[str, set[str]]:
+        """ファイルが更新されていれば差分を取り込み、(国 → 変更フィールド) を返す"""
+        if self.loading:
+            return {}
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return {}
+        stat_key = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            if stat_key == self._stat:
+                return {}
+            text = self.path.read_text(encoding="utf-8")
+            self._stat = stat_key
+            return self._apply_text(text)
+
+    def _apply_text(self, text: str) -> dict[str, set[str]]:
+        blocks = split_top_level_blocks(text)
+        new_data = {}
+        new_hashes = {}
+        changes = {}
+
+        for name, block in blocks:
+            block_hash = _block_hash(block)
+            new_hashes[name] = block_hash
+            if self._block_hashes.get(name) == block_hash:
+                # 変更のない国は前回のオブジェクトをそのまま使う
+                new_data[name] = self.data[name]
+                continue
+
+            name, info = parse_block(block)
+            info = self._record(name, info)
+            old_info = self.data.get(name)
+            new_data[name] = info
+            if old_info is None:
+                changes[name] = set(info) | {MEMBERSHIP_FIELD}
+            else:
+                changed = {
+                    key
+                    for key in set(info) | set(old_info)
+                    if info.get(key) != old_info.get(key)
+                }
+                if changed:
+                    changes[name] = changed
+
+        for name in self.data.keys() - new_data.keys():
+            changes[name] = set(self.data[name]) | {MEMBERSHIP_FIELD}
+
+        order_changed = mark_reordered(list(self.data), list(new_data), changes)
+        if order_changed:
+            self.order_version += 1
+        self.data = new_data
+        # ハッシュが変わっただけ（逐次読み込みの後の全体の比較など）でもバージョンは作り直す
+        hashes_changed = new_hashes != self._block_hashes
+        self._block_hashes = new_hashes
+        if changes or order_changed or hashes_changed or not self.version:
+            self.version = _dataset_version(new_data, new_hashes)
+            self.reload_count += 1
+        for cache in self._caches.values():
+            cache.invalidate(changes)
+        return changes
+
+    def start_streaming(self, first_batch: int = STREAM_FIRST_BATCH):
+        """別スレッドでファイルを国ごとに読み込み、読み込んだ国から順に data に公開
+
+        公開する国数は first_batch から倍々に増やすため、data の作り直しは全体で国数に
+        比例する。読み込み中は refresh() は何もせず、読み終わった data は refresh() で
+        全体を読んだ場合と同じになる。
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._first_batch.set()
+            return
+        self.loading = True
+
+        def ingest():
+            try:
+                batch = {}
+                size = first_batch
+                with open(self.path, "r", encoding="utf-8") as f:
+                    for name, info in iter_top_level_items(f):
+                        batch[str(name)] = self._record(name, country_info(name, info))
+                        if len(batch) >= size:
+                            self._publish(batch)
+                            batch = {}
+                            size *= 2
+                self._publish(batch)
+                self._finish_streaming((stat.st_mtime_ns, stat.st_size))
+            finally:
+                self.loading = False
+                self._first_batch.set()
+
+        threading.Thread(target=ingest, name="geo-data-stream", daemon=True).start()
+
+    def _publish(self, batch: dict):
+        """読み込んだ国を追加した data に差し替え、国の追加としてキャッシュを無効化"""
+        if not batch:
+            return
+        changes = {name: set(info) | {MEMBERSHIP_FIELD} for name, info in batch.items()}
+        with self._lock:
+            # 読み取り中の辞書は変更せず、新しい辞書に差し替える
+            self.data = {**self.data, **batch}
+            self.order_version += 1
+            self.version = hashlib.sha1(
+                f"{self.path}:{len(self.data)}".encode("utf-8")
+            ).hexdigest()[:12]
+            for cache in self._caches.values():
+                cache.invalidate(changes)
+        self._first_batch.set()
+
+    def wait_for_first_batch(self, timeout: float | None = None) -> bool:
+        """逐次読み込みで最初の国が公開されるまで待つ（逐次読み込みでなければすぐ返る）"""
+        if not self.loading:
+            return True
+        return self._first_batch.wait(timeout)
+
+    def _finish_streaming(self, stat_key: tuple):
+        """ブロックのハッシュを求め、以降の refresh() で差分だけを取り込めるようにする"""
+        with open(self.path, "r", encoding="utf-8") as f:
+            block_hashes = {
+                name: _block_hash(block) for name, block in iter_top_level_blocks(f)
+            }
+        stat = os.stat(self.path)
+        with self._lock:
+            # 読み込み中にファイルが変わった場合は、次の refresh() で全体を比較し直す。
+            # 前回の状態を消しておくと、内容が同じでも仮のバージョンが作り直される
+            if (stat.st_mtime_ns, stat.st_size) != stat_key or list(
+                block_hashes
+            ) != list(self.data):
+                self._stat = None
+                self._block_hashes = {}
+                return
+            self._block_hashes = block_hashes
+            self._stat = stat_key
+            self.version = _dataset_version(self.data, block_hashes)
+            self.reload_count += 1
+
+    def start_watcher(self, interval: float = 1.0):
+        """バックグラウンドでファイルを監視し、変更を自動で取り込む"""
+        with self._lock:
+            if self._watcher is not None:
+                return
+
+            def watch():
+                while True:
+                    time.sleep(interval)
+                    self.refresh()
+
+            self._watcher = threading.Thread(
+                target=watch, name="geo-data-watcher", daemon=True
+            )
+            self._watcher.start()
+
+
+def create_dataset_store(
+    layout: str = DATA_LAYOUT,
+    stream: bool = False,
+    attach: bool = SHARED_DATASET_MODE == "attach",
+) -> DatasetStore:
+    """設定されたデータ配置（単一ファイル／シャード）に応じたストアを作成
+
+    stream=True なら単一ファイルを別スレッドで逐次読み込む（シャードでは無視）。
+    attach=True なら読み込み役のプロセスが公開した共有ファイルだけを読む（YAML は解析しない）。
+    """
+    if attach:
+        from config.shared_dataset import AttachedDatasetStore
+
+        return AttachedDatasetStore(SHARED_DATASET_DIR)
+    if layout == "sharded":
+        from config.shards import ShardedDatasetStore
+
+        return ShardedDatasetStore(SHARD_DIR)
+    return DatasetStore(GEO_DATA_PATH, stream=stream)
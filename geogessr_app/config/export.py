@@ -0,0 +1,270 @@
+# config/export.py
+
+import csv
+import io
+import json
+from itertools import islice
+
+import numpy as np
+
+from config.char_config import matches_selected_language
+from config.field_columns import format_display_value, materialize_field
+from config.field_config import EXPRESSION_FIELDS, FILTERABLE_FIELDS
+from config.filter_expressions import evaluate_columns, expression_fields
+
+# 形式 → (拡張子, MIME タイプ)
+EXPORT_FORMATS = {
+    "csv": ("csv", "text/csv"),
+    "jsonl": ("jsonl", "application/x-ndjson"),
+    "parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+
+EXPORT_FORMAT_LABELS = {"csv": "CSV", "jsonl": "JSON Lines", "parquet": "Parquet"}
+
+# 1回に列へ展開して判定・書き出しする行数（メモリ使用量はこの件数で決まる）
+EXPORT_CHUNK_ROWS = 10_000
+
+# フィールドの前に付ける列
+BASE_COLUMNS = ("country", "lat", "lng")
+
+
+def parquet_available() -> bool:
+    """Parquet の書き出しに使う pyarrow が使えるかどうか"""
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def available_formats() -> list[str]:
+    return [fmt for fmt in EXPORT_FORMATS if fmt != "parquet" or parquet_available()]
+
+
+def export_fields(content_field: str, expression=None) -> list[str]:
+    """出力するフィールド（表示中のフィールドと、フィルター式で使われているフィールド）"""
+    fields = dict.fromkeys([content_field])
+    fields.update(
+        (field_path, None)
+        for field_path in sorted(expression_fields(expression))
+        if EXPRESSION_FIELDS.get(field_path, ("",))[0] != "country"
+    )
+    return list(fields)
+
+
+def numeric_fields(fields: list[str]) -> set[str]:
+    """数値として出力できるフィールド（Parquet では数値の列になる）"""
+    return {
+        field_path
+        for field_path in fields
+        if FILTERABLE_FIELDS.get(field_path, ("",))[0] == "number"
+    }
+
+
+def _batched(iterable, size: int):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def iter_export_rows(
+    records,
+    fields: list[str],
+    expression=None,
+    matching_langs: set[str] | None = None,
+    special: dict | None = None,
+    chunk_rows: int = EXPORT_CHUNK_ROWS,
+    numeric_values: bool = False,
+):
+    """(国名, 国データ) の列を chunk_rows 件ずつ判定し、条件を満たす行を dict で順に返す
+
+    matching_langs が None なら文字フィルターなし。special は evaluate_columns と同じ。
+    numeric_values=True なら数値のフィールドは元の値ではなく FieldColumn.numeric の値
+    （解釈できなければ None）にする（Parquet の数値の列用）。
+    """
+    special = special or {}
+    as_numeric = numeric_fields(fields) if numeric_values else set()
+    for chunk in _batched(records, chunk_rows):
+        chunk_data = dict(chunk)
+        countries = tuple(chunk_data)
+        needed = dict.fromkeys(fields)
+        needed.update(
+            (field_path, None)
+            for field_path in expression_fields(expression)
+            if field_path not in special
+        )
+        columns = {
+            field_path: materialize_field(chunk_data, field_path)
+            for field_path in needed
+        }
+        mask = evaluate_columns(expression, countries, columns, special)
+        if matching_langs is not None:
+            mask &= np.array(
+                [
+                    matches_selected_language(info, matching_langs)
+                    for info in chunk_data.values()
+                ],
+                dtype=bool,
+            )
+        for i in np.flatnonzero(mask):
+            country = countries[i]
+            latlng = chunk_data[country].get("latlng") or [None, None]
+            row = {"country": country, "lat": latlng[0], "lng": latlng[1]}
+            for field_path in fields:
+                column = columns[field_path]
+                if field_path in as_numeric:
+                    value = column.numeric[i]
+                    row[field_path] = None if np.isnan(value) else float(value)
+                else:
+                    row[field_path] = column.raw[i]
+            yield row
+
+
+def iter_csv(rows, fields: list[str]):
+    """行を CSV のバイト列として少しずつ返す（リストはカンマ区切りの文字列）"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([*BASE_COLUMNS, *fields])
+    for batch in _batched(rows, 1000):
+        for row in batch:
+            writer.writerow(
+                [row["country"], row["lat"], row["lng"]]
+                + [format_display_value(row[f]) for f in fields]
+            )
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def iter_jsonl(rows):
+    """行を JSON Lines のバイト列として少しずつ返す（値は元の型のまま）"""
+    for batch in _batched(rows, 1000):
+        yield "".join(
+            json.dumps(row, ensure_ascii=False) + "\n" for row in batch
+        ).encode("utf-8")
+
+
+def write_parquet(
+    rows, fields: list[str], target, batch_rows: int = EXPORT_CHUNK_ROWS
+) -> int:
+    """行を batch_rows 件ごとの行グループとして Parquet に書き出し、行数を返す
+
+    数値のフィールドは float64 の列になるため、行は iter_export_rows(numeric_values=True)
+    で作る。それ以外のフィールドは表示用の文字列の列。
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Parquet export requires pyarrow") from e
+
+    numeric = numeric_fields(fields)
+    schema = pa.schema(
+        [("country", pa.string()), ("lat", pa.float64()), ("lng", pa.float64())]
+        + [
+            (field_path, pa.float64() if field_path in numeric else pa.string())
+            for field_path in fields
+        ]
+    )
+    count = 0
+    with pq.ParquetWriter(target, schema) as writer:
+        for batch in _batched(rows, batch_rows):
+            columns = {
+                "country": [row["country"] for row in batch],
+                "lat": [row["lat"] for row in batch],
+                "lng": [row["lng"] for row in batch],
+            }
+            for field_path in fields:
+                columns[field_path] = [
+                    (
+                        row[field_path]
+                        if field_path in numeric
+                        else format_display_value(row[field_path])
+                    )
+                    for row in batch
+                ]
+            writer.write_table(pa.table(columns, schema=schema))
+            count += len(batch)
+    return count
+
+
+def export_rows(rows, fmt: str, target, fields: list[str]) -> int:
+    """行を fmt 形式でバイナリのファイルオブジェクト target に書き出し、行数を返す"""
+    if fmt == "parquet":
+        return write_parquet(rows, fields, target)
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"unknown export format: {fmt}")
+
+    count = 0
+
+    def counted():
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+
+    chunks = iter_csv(counted(), fields) if fmt == "csv" else iter_jsonl(counted())
+    for chunk in chunks:
+        target.write(chunk)
+    return count
+
+
+if __name__ == "__main__":
+    # cd geogessr_app && python -m config.export --format csv --out countries.csv \
+    #     --field "GDP per capita" --expr "language contains Spanish" --chars ñ
+    # cd geogessr_app && python -m config.export --format parquet --out big.parquet \
+    #     --synthetic 1000000
+    import argparse
+    import time
+
+    from config.char_config import get_and_matching_languages
+    from config.dataset_store import create_dataset_store
+    from config.field_config import field_options
+    from config.filter_expressions import parse_expression
+    from config.paths import GEO_DATA_PATH
+    from config.synthetic import iter_synthetic_dataset
+
+    parser = argparse.ArgumentParser(description="フィルター結果をファイルに書き出す")
+    parser.add_argument("--format", choices=list(EXPORT_FORMATS), default="csv")
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--field", default=next(iter(field_options)))
+    parser.add_argument("--expr", default="")
+    parser.add_argument("--chars", default="", help="文字フィルター（例: ñé）")
+    parser.add_argument("--synthetic", type=int, default=0, help="合成データの件数")
+    args = parser.parse_args()
+
+    content_field = field_options.get(args.field, args.field)
+    expression = parse_expression(args.expr) if args.expr.strip() else None
+    if any(
+        EXPRESSION_FIELDS.get(f, ("",))[0] == "country"
+        for f in expression_fields(expression)
+    ):
+        parser.error("country-based conditions (#similar_to) need the app's index")
+    fields = export_fields(content_field, expression)
+    matching_langs = (
+        get_and_matching_languages(list(args.chars)) if args.chars else None
+    )
+
+    if args.synthetic:
+        records = iter_synthetic_dataset(args.synthetic, str(GEO_DATA_PATH))
+    else:
+        store = create_dataset_store()
+        store.ensure_fields([*fields, *expression_fields(expression), "language"])
+        records = store.data.items()
+
+    started = time.perf_counter()
+    with open(args.out, "wb") as f:
+        rows = iter_export_rows(
+            records,
+            fields,
+            expression,
+            matching_langs,
+            numeric_values=args.format == "parquet",
+        )
+        count = export_rows(rows, args.format, f, fields)
+    print(
+        f"wrote {count} rows to {args.out} "
+        f"in {time.perf_counter() - started:.1f}s ({args.format})"
+    )
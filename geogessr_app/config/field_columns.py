@@ -0,0 +1,203 @@
+# config/field_columns.py
+
+import re
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from config.data_processor import DataProcessor
+from config.number_plate_config import PlateAttributeIndex, has_number_plate_config
+from config.street_config import get_street_terms_for_languages
+
+
+@dataclass(frozen=True)
+class FieldColumn:
+    """1つのフィールドを全ての国について一括で展開した列
+
+    表示用文字列・元の値・有効かどうかを国の順番（データセットの順）に保持する。
+    """
+
+    field_path: str
+    countries: tuple[str, ...]
+    raw: tuple
+    display: tuple[str, ...]
+    valid: np.ndarray
+    # 数値として解釈した値（解釈できない場合は NaN）
+    numeric: np.ndarray = field(repr=False)
+    # フィルター判定用に小文字化した値（リストはタプル、値なしは None）
+    lowered: tuple = field(repr=False)
+    positions: dict = field(repr=False)
+
+    def __len__(self) -> int:
+        return len(self.countries)
+
+    def position(self, country: str) -> int | None:
+        return self.positions.get(country)
+
+    def matches(
+        self, match_type: str, filter_value: str, candidates: np.ndarray | None = None
+    ) -> np.ndarray:
+        """DataProcessor.filter_matches と同じ判定を行ったマスク
+
+        candidates（行番号の配列）を渡した場合はその行だけを判定し、同じ長さのマスクを返す。
+        """
+        rows = range(len(self.countries)) if candidates is None else candidates
+        needle = filter_value.lower()
+        mask = np.zeros(len(rows), dtype=bool)
+        for i, row in enumerate(rows):
+            value = self.lowered[row]
+            if value is None:
+                continue
+            if isinstance(value, tuple):
+                if match_type == "contains":
+                    mask[i] = any(needle in v for v in value)
+                elif match_type == "equals":
+                    mask[i] = needle in value
+            elif match_type == "contains":
+                mask[i] = needle in value
+            elif match_type == "equals":
+                mask[i] = needle == value
+        return mask
+
+
+def parse_numeric_value(value):
+    """数値、範囲、不確実性を含む値を解析"""
+    if isinstance(value, (int, float)):
+        return value
+
+    if not isinstance(value, str):
+        return None
+
+    # "3" のような単純な数値
+    if value.isdigit():
+        return int(value)
+
+    # "3.5" のような小数
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    # "3 or 5", "3-5", "3～5" のような範囲
+    range_patterns = [
+        r"(\d+(?:\.\d+)?)\s*(?:or|または)\s*(\d+(?:\.\d+)?)",  # "3 or 5"
+        r"(\d+(?:\.\d+)?)\s*[-～〜]\s*(\d+(?:\.\d+)?)",  # "3-5", "3～5"
+        r"(\d+(?:\.\d+)?)\s*to\s*(\d+(?:\.\d+)?)",  # "3 to 5"
+    ]
+
+    for pattern in range_patterns:
+        match = re.search(pattern, value)
+        if match:
+            # 範囲の場合は中央値を返す
+            min_val = float(match.group(1))
+            max_val = float(match.group(2))
+            return (min_val + max_val) / 2
+
+    # "約3", "~3", "3前後" のような近似値
+    approx_patterns = [
+        r"(?:約|~|around|approximately)\s*(\d+(?:\.\d+)?)",  # "約3", "~3"
+        r"(\d+(?:\.\d+)?)\s*(?:前後|程度|くらい)",  # "3前後"
+    ]
+
+    for pattern in approx_patterns:
+        match = re.search(pattern, value)
+        if match:
+            return float(match.group(1))
+
+    # 単純に数値を抽出
+    numbers = re.findall(r"\d+(?:\.\d+)?", value)
+    if numbers:
+        # 複数の数値がある場合は最初のものを使用
+        return float(numbers[0])
+
+    return None
+
+
+def format_display_value(value) -> str:
+    """表示用の文字列に変換（リストはカンマ区切り、None は空文字）"""
+    if isinstance(value, (list, tuple)):
+        return ", ".join(str(v) for v in value)
+    if not isinstance(value, str):
+        return str(value) if value is not None else ""
+    return value
+
+
+def _is_valid(field_path: str, info: dict, value, display: str) -> bool:
+    """表示する値があるかどうか（"No ... available" のような文字列判定は使わない）"""
+    if field_path == "#number_plate_visual":
+        return has_number_plate_config(info)
+    if field_path == "#geoguessr_tips":
+        tips_data = info.get("geoguessr_tips", {})
+        return bool(tips_data.get("short") or tips_data.get("long"))
+    if field_path == "#dynamic_street_terms":
+        return bool(get_street_terms_for_languages(info.get("language", [])))
+    if DataProcessor.is_special_field(field_path):
+        return False
+    return bool(display.strip())
+
+
+def _lower(value):
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple)):
+        return tuple(str(v).lower() for v in value)
+    return str(value).lower()
+
+
+def materialize_field(data: dict, field_path: str) -> FieldColumn:
+    """全ての国についてフィールドを1回ずつ処理して列を作成"""
+    countries = tuple(data)
+    raw, display, valid, lowered, numeric = [], [], [], [], []
+    for info in data.values():
+        value = DataProcessor.process_field(field_path, info)
+        text = format_display_value(value)
+        raw.append(value)
+        display.append(text)
+        valid.append(_is_valid(field_path, info, value, text))
+        lowered.append(_lower(value))
+        parsed = parse_numeric_value(value)
+        numeric.append(np.nan if parsed is None else parsed)
+    return FieldColumn(
+        field_path=field_path,
+        countries=countries,
+        raw=tuple(raw),
+        display=tuple(display),
+        valid=np.array(valid, dtype=bool),
+        numeric=np.array(numeric, dtype=np.float64),
+        lowered=tuple(lowered),
+        positions={country: i for i, country in enumerate(countries)},
+    )
+
+
+def get_field_column(store, field_path: str) -> FieldColumn:
+    """ストアの派生キャッシュから列を取得（フィールドごとにプロセス内で1回だけ計算）
+
+    キャッシュはフィールドが依存するキーが変わったときだけ無効化されるため、
+    データセットのバージョンが変わっても無関係なフィールドは再計算されない。
+    """
+    store.ensure_fields([field_path])
+    shared = getattr(store, "shared", None)
+    if shared is not None:
+        # 共有ファイルを読むストアでは、公開された同じバージョンの列をそのまま参照する
+        column = shared.column(field_path)
+        if column is not None:
+            return column
+    # 列は国の位置に依存するため、並びのバージョンが同じエントリだけを使う。data は計算の
+    # 開始後に読むので、計算中の変更はキャッシュの無効化で検知される
+    return store.cache("field_columns").get_or_compute(
+        field_path,
+        lambda: materialize_field(store.data, field_path),
+        fields=DataProcessor.field_dependencies(field_path),
+        version=store.order_version,
+    )
+
+
+def get_plate_attribute_index(store) -> PlateAttributeIndex:
+    """ナンバープレートの属性索引（number_plate_config が変わったときだけ作り直す）"""
+    store.ensure_fields(["number_plate_config"])
+    return store.cache("plate_attributes").get_or_compute(
+        "index",
+        lambda: PlateAttributeIndex.from_data(store.data),
+        fields={"number_plate_config"},
+        version=store.order_version,
+    )
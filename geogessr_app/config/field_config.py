@@ -21,6 +21,17 @@ icon_options = {
     "show_country_name": "Show Country Name",
 }
 
+# ナンバープレートの構造化属性（number_plate_config の front / rear ごと）
+PLATE_SIDES = ("front", "rear")
+PLATE_ATTRIBUTES = {
+    "bg_color": "background",
+    "text_color": "text",
+    "border_color": "border",
+    "top_band_color": "top band",
+    "left_band_color": "left band",
+    "right_band_color": "right band",
+}
+
 # フィルター対象の定義（型・説明）
 FILTERABLE_FIELDS = {
     "language": ("list", "Languages spoken"),
@@ -35,6 +46,59 @@ FILTERABLE_FIELDS = {
     "camera": ("string", "Camera description"),
 }
 
+# フィルター式からだけ参照するフィールド（フィルター行の選択肢・表・共有ファイルには出さない）
+EXPRESSION_ONLY_FIELDS = {
+    "#similar_to": ("country", "Country name (shows it and its look-alikes)"),
+}
+
+# ナンバープレートの属性は属性索引（値 → 国のビット列）で判定する
+EXPRESSION_ONLY_FIELDS.update(
+    {
+        f"number_plate_config.{side}.{attribute}": (
+            "plate",
+            f"{side.title()} plate {label} colour",
+        )
+        for side in PLATE_SIDES
+        for attribute, label in PLATE_ATTRIBUTES.items()
+    }
+)
+
+# フィルター式で使えるすべてのフィールド
+EXPRESSION_FIELDS = {**FILTERABLE_FIELDS, **EXPRESSION_ONLY_FIELDS}
+
+# 動的フィールドが依存するトップレベルのキー（キャッシュの無効化に使用）
+FIELD_DEPENDENCIES = {
+    "#dynamic_street_terms": ("language",),
+    "#number_plate_visual": ("number_plate_config",),
+    "#geoguessr_tips": ("geoguessr_tips",),
+    "#similar_to": (
+        "language",
+        "number_plate_config",
+        "crosswalk_stripes",
+        "camera",
+        "sign_back",
+        "tld",
+    ),
+}
+
+# シャード化したデータのフィールドグループ（1グループ = 1ファイル、core は常に読み込む）
+FIELD_GROUPS = {
+    "core": (
+        "flag",
+        "latlng",
+        "language",
+        "tld",
+        "gdp_per_capita",
+        "crosswalk_stripes",
+    ),
+    "text": ("number_plate", "crosswalk_features", "sign_back", "camera"),
+    "plate": ("number_plate_config",),
+    "tips": ("geoguessr_tips",),
+}
+
+# ポップアップ表示に必要なグループ（tips は読み込み済みの場合のみ表示される）
+POPUP_FIELD_GROUPS = ("core", "text")
+
 DISPLAY_OPTIONS = {
     "prepend_country_name": {
         "flag.description": True,
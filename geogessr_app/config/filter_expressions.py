@@ -0,0 +1,544 @@
+# config/filter_expressions.py
+
+import re
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from config.data_processor import DataProcessor
+from config.field_columns import (
+    FieldColumn,
+    get_field_column,
+    get_plate_attribute_index,
+)
+from config.field_config import EXPRESSION_FIELDS
+from config.similarity import SIMILAR_TO_TOP_K
+
+# 文字列の一致判定と、数値フィールド用の比較演算子
+TEXT_MATCH_TYPES = ("contains", "equals")
+NUMERIC_MATCH_TYPES = (">", ">=", "<", "<=")
+
+# フィルター結果キャッシュ（全セッション共通）の最大エントリ数
+FILTER_RESULT_CACHE_SIZE = 256
+
+_TOKEN_PATTERN = re.compile(
+    r"""\s*(?:
+        (?P<paren>[()])
+        |"(?P<dquoted>(?:[^"\\]|\\.)*)"
+        |'(?P<squoted>[^']*)'
+        |(?P<op>>=|<=|!=|>|<|=)
+        |(?P<word>[^\s()"'<>=!]+)
+    )""",
+    re.VERBOSE,
+)
+
+
+class FilterSyntaxError(ValueError):
+    """フィルター式の構文エラー"""
+
+
+@dataclass(frozen=True)
+class Predicate:
+    """1つのフィールドに対する条件（field match value）"""
+
+    field: str
+    match: str
+    value: str
+
+    def __str__(self) -> str:
+        return f"{self.field} {self.match} {self.value!r}"
+
+
+@dataclass(frozen=True)
+class And:
+    children: tuple
+
+    def __str__(self) -> str:
+        return "(" + " and ".join(str(c) for c in self.children) + ")"
+
+
+@dataclass(frozen=True)
+class Or:
+    children: tuple
+
+    def __str__(self) -> str:
+        return "(" + " or ".join(str(c) for c in self.children) + ")"
+
+
+@dataclass(frozen=True)
+class Not:
+    child: object
+
+    def __str__(self) -> str:
+        return f"not {self.child}"
+
+
+def make_predicate(field_path: str, match: str, value: str) -> Predicate:
+    """フィールドと一致方法を検証して条件を作成"""
+    if field_path not in EXPRESSION_FIELDS:
+        raise FilterSyntaxError(f"field is not filterable: {field_path}")
+    if match == "=":
+        match = "equals"
+    if match in NUMERIC_MATCH_TYPES:
+        if EXPRESSION_FIELDS[field_path][0] != "number":
+            raise FilterSyntaxError(f"{match} needs a numeric field, got {field_path}")
+        try:
+            float(value)
+        except ValueError:
+            raise FilterSyntaxError(f"{match} needs a number, got {value!r}") from None
+    elif match not in TEXT_MATCH_TYPES:
+        raise FilterSyntaxError(f"unknown match type: {match}")
+    return Predicate(field_path, match, value)
+
+
+def simplify(expr):
+    """入れ子の And / Or を平らにし、要素が1つだけのグループを外す"""
+    if isinstance(expr, Not):
+        child = simplify(expr.child)
+        return child.child if isinstance(child, Not) else Not(child)
+    if isinstance(expr, (And, Or)):
+        children = []
+        for child in (simplify(c) for c in expr.children):
+            if type(child) is type(expr):
+                children.extend(child.children)
+            else:
+                children.append(child)
+        if len(children) == 1:
+            return children[0]
+        return type(expr)(tuple(children))
+    return expr
+
+
+def rows_to_expression(filters: list[dict]):
+    """フィルターパネルの行（暗黙の AND）を式に変換（行がなければ None）"""
+    return combine(
+        *(make_predicate(f["field"], f["match"], f["value"]) for f in filters)
+    )
+
+
+def combine(*expressions):
+    """None を除いた式を AND で結合（全て None なら None）"""
+    parts = tuple(e for e in expressions if e is not None)
+    if not parts:
+        return None
+    return simplify(And(parts))
+
+
+def canonicalize(expr):
+    """同じ結果になる式が同じ形になるように正規化（キャッシュのキーに使用）
+
+    一致判定は大文字・小文字を区別しないので値は小文字にそろえ、数値は float 表記にし、
+    And / Or の子は重複を除いて並べ替える。
+    """
+    if expr is None:
+        return None
+    if isinstance(expr, Predicate):
+        if expr.match in NUMERIC_MATCH_TYPES:
+            return Predicate(expr.field, expr.match, str(float(expr.value)))
+        return Predicate(expr.field, expr.match, expr.value.lower())
+    if isinstance(expr, Not):
+        return simplify(Not(canonicalize(expr.child)))
+    expr = simplify(expr)
+    if not isinstance(expr, (And, Or)):
+        return canonicalize(expr)
+    children = {canonicalize(c) for c in expr.children}
+    return simplify(type(expr)(tuple(sorted(children, key=str))))
+
+
+def _tokenize(text: str) -> list[tuple[str, str]]:
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        m = _TOKEN_PATTERN.match(text, pos)
+        if not m or m.end() == pos:
+            raise FilterSyntaxError(f"unexpected character at {pos}: {text[pos:]!r}")
+        pos = m.end()
+        kind = m.lastgroup
+        if kind == "dquoted":
+            tokens.append(("value", re.sub(r"\\(.)", r"\1", m.group(kind))))
+        elif kind == "squoted":
+            tokens.append(("value", m.group(kind)))
+        else:
+            tokens.append((kind, m.group(kind)))
+    return tokens
+
+
+class _Parser:
+    """再帰下降で or < and < not の優先順位の式を読む"""
+
+    def __init__(self, tokens: list[tuple[str, str]]):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek_keyword(self) -> str | None:
+        if self.pos < len(self.tokens) and self.tokens[self.pos][0] == "word":
+            return self.tokens[self.pos][1].lower()
+        return None
+
+    def next(self) -> tuple[str, str]:
+        if self.pos >= len(self.tokens):
+            raise FilterSyntaxError("unexpected end of expression")
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def parse(self):
+        expr = self.parse_or()
+        if self.pos != len(self.tokens):
+            raise FilterSyntaxError(f"unexpected token: {self.tokens[self.pos][1]!r}")
+        return expr
+
+    def parse_or(self):
+        children = [self.parse_and()]
+        while self.peek_keyword() == "or":
+            self.pos += 1
+            children.append(self.parse_and())
+        return children[0] if len(children) == 1 else Or(tuple(children))
+
+    def parse_and(self):
+        children = [self.parse_not()]
+        while self.peek_keyword() == "and":
+            self.pos += 1
+            children.append(self.parse_not())
+        return children[0] if len(children) == 1 else And(tuple(children))
+
+    def parse_not(self):
+        if self.peek_keyword() == "not":
+            self.pos += 1
+            return Not(self.parse_not())
+        kind, text = self.next()
+        if kind == "paren" and text == "(":
+            expr = self.parse_or()
+            if self.next() != ("paren", ")"):
+                raise FilterSyntaxError("missing closing parenthesis")
+            return expr
+        if kind != "word":
+            raise FilterSyntaxError(f"expected a field name, got {text!r}")
+        field_path = text
+        kind, match = self.next()
+        if kind == "word":
+            match = match.lower()
+        elif kind != "op":
+            raise FilterSyntaxError(f"expected a match type after {field_path}")
+        kind, value = self.next()
+        if kind not in ("word", "value"):
+            raise FilterSyntaxError(f"expected a value after {field_path} {match}")
+        if match == "!=":
+            return Not(make_predicate(field_path, "equals", value))
+        return make_predicate(field_path, match, value)
+
+
+def parse_expression(text: str):
+    """フィルター式の文字列を解析（空文字なら None）
+
+    例: language contains Spanish and (tld = .ar or not gdp_per_capita < 10000)
+    """
+    tokens = _tokenize(text)
+    if not tokens:
+        return None
+    return simplify(_Parser(tokens).parse())
+
+
+def expression_fields(expr) -> set[str]:
+    """式で使われているフィールドの集合"""
+    if expr is None:
+        return set()
+    if isinstance(expr, Predicate):
+        return {expr.field}
+    if isinstance(expr, Not):
+        return expression_fields(expr.child)
+    fields = set()
+    for child in expr.children:
+        fields |= expression_fields(child)
+    return fields
+
+
+def expression_dependencies(expr) -> set[str]:
+    """式の結果が依存するトップレベルのキー（キャッシュの無効化に使用）"""
+    fields = set()
+    for field_path in expression_fields(expr):
+        fields |= DataProcessor.field_dependencies(field_path)
+    return fields
+
+
+# ---- 統計情報 ----
+
+
+@dataclass(frozen=True)
+class FieldStats:
+    """選択率の見積もりに使うフィールドごとの統計情報"""
+
+    field_path: str
+    rows: int
+    non_null: int
+    # 小文字化した値 → その値を持つ国の数（リストは要素ごとに数える）
+    counts: dict = field(repr=False)
+    # 数値として解釈できた値（昇順）
+    numeric: np.ndarray = field(repr=False)
+
+    @property
+    def cardinality(self) -> int:
+        return len(self.counts)
+
+    @classmethod
+    def from_column(cls, column: FieldColumn) -> "FieldStats":
+        counts = {}
+        non_null = 0
+        for value in column.lowered:
+            if value is None:
+                continue
+            non_null += 1
+            for v in set(value) if isinstance(value, tuple) else (value,):
+                counts[v] = counts.get(v, 0) + 1
+        numeric = column.numeric[~np.isnan(column.numeric)]
+        return cls(
+            field_path=column.field_path,
+            rows=len(column),
+            non_null=non_null,
+            counts=counts,
+            numeric=np.sort(numeric),
+        )
+
+    def selectivity(self, predicate: Predicate) -> float:
+        """条件を満たす国の割合の見積もり（0〜1）"""
+        if self.rows == 0:
+            return 0.0
+        needle = predicate.value.lower()
+        if predicate.match == "equals":
+            matched = self.counts.get(needle, 0)
+        elif predicate.match == "contains":
+            matched = min(
+                self.non_null,
+                sum(count for value, count in self.counts.items() if needle in value),
+            )
+        else:
+            threshold = float(predicate.value)
+            side = "left" if predicate.match in (">=", "<") else "right"
+            below = int(np.searchsorted(self.numeric, threshold, side=side))
+            matched = (
+                below if predicate.match in ("<", "<=") else len(self.numeric) - below
+            )
+        return matched / self.rows
+
+
+def get_field_stats(store, field_path: str) -> FieldStats:
+    """フィールドの統計情報（列と同じくフィールドの依存キーが変わったときだけ再計算）"""
+    return store.cache("field_stats").get_or_compute(
+        field_path,
+        lambda: FieldStats.from_column(get_field_column(store, field_path)),
+        fields=DataProcessor.field_dependencies(field_path),
+    )
+
+
+# ---- 実行計画 ----
+
+
+@dataclass
+class PlanNode:
+    """式を評価順に並べ替えた実行計画のノード"""
+
+    kind: str
+    estimate: float
+    children: list = field(default_factory=list)
+    predicate: Predicate | None = None
+    # 直近の実行結果（判定した行数・残った行数、短絡で省略された場合は skipped）
+    rows_in: int | None = None
+    rows_out: int | None = None
+    skipped: bool = False
+
+
+def compile_plan(expr, n_rows: int, stats_for) -> PlanNode:
+    """選択率の見積もりをもとに評価順を決めた実行計画を作成
+
+    AND は絞り込みの強い（選択率の低い）条件から、OR は一致しやすい条件から評価する。
+    stats_for(field_path) は FieldStats を返す。
+    """
+    if isinstance(expr, Predicate):
+        if EXPRESSION_FIELDS[expr.field][0] == "country":
+            estimate = min(1.0, (SIMILAR_TO_TOP_K + 1) / max(n_rows, 1))
+        else:
+            estimate = stats_for(expr.field).selectivity(expr)
+        return PlanNode("predicate", estimate, predicate=expr)
+    if isinstance(expr, Not):
+        child = compile_plan(expr.child, n_rows, stats_for)
+        return PlanNode("not", 1.0 - child.estimate, [child])
+
+    children = [compile_plan(c, n_rows, stats_for) for c in expr.children]
+    if isinstance(expr, And):
+        children.sort(key=lambda c: c.estimate)
+        estimate = float(np.prod([c.estimate for c in children]))
+        return PlanNode("and", estimate, children)
+    children.sort(key=lambda c: -c.estimate)
+    estimate = 1.0 - float(np.prod([1.0 - c.estimate for c in children]))
+    return PlanNode("or", estimate, children)
+
+
+def execute_plan(plan: PlanNode, n_rows: int, evaluate) -> np.ndarray:
+    """実行計画を評価して長さ n_rows のマスクを返す
+
+    evaluate(predicate, candidates) は candidates（行番号の配列）の各行について
+    条件を満たすかどうかのマスクを返す。途中の結果が空になった時点で残りの評価を省略する。
+    """
+    mask = np.zeros(n_rows, dtype=bool)
+    candidates = np.arange(n_rows)
+    mask[candidates[_execute(plan, candidates, evaluate)]] = True
+    return mask
+
+
+def _mark_skipped(node: PlanNode):
+    node.rows_in = node.rows_out = None
+    node.skipped = True
+    for child in node.children:
+        _mark_skipped(child)
+
+
+def _execute(node: PlanNode, candidates: np.ndarray, evaluate) -> np.ndarray:
+    node.rows_in = len(candidates)
+    node.skipped = False
+    if node.kind == "predicate":
+        result = (
+            evaluate(node.predicate, candidates)
+            if len(candidates)
+            else np.zeros(0, dtype=bool)
+        )
+    elif node.kind == "not":
+        result = ~_execute(node.children[0], candidates, evaluate)
+    elif node.kind == "and":
+        result = np.ones(len(candidates), dtype=bool)
+        for i, child in enumerate(node.children):
+            if not result.any():
+                for rest in node.children[i:]:
+                    _mark_skipped(rest)
+                break
+            active = np.flatnonzero(result)
+            result[active] = _execute(child, candidates[active], evaluate)
+    else:
+        result = np.zeros(len(candidates), dtype=bool)
+        for i, child in enumerate(node.children):
+            if result.all():
+                for rest in node.children[i:]:
+                    _mark_skipped(rest)
+                break
+            pending = np.flatnonzero(~result)
+            result[pending] = _execute(child, candidates[pending], evaluate)
+    node.rows_out = int(result.sum())
+    return result
+
+
+def explain(plan: PlanNode | None, indent: int = 0) -> str:
+    """実行計画（評価順・見積もり・直近の実行結果）をテキストで表示"""
+    if plan is None:
+        return "(no filters)"
+    label = str(plan.predicate) if plan.kind == "predicate" else plan.kind.upper()
+    line = f"{'  ' * indent}{label}  est={plan.estimate:.3f}"
+    if plan.skipped:
+        line += "  skipped"
+    elif plan.rows_in is not None:
+        line += f"  rows {plan.rows_in} -> {plan.rows_out}"
+    lines = [line]
+    for child in plan.children:
+        lines.append(explain(child, indent + 1))
+    return "\n".join(lines)
+
+
+def column_evaluator(store, countries: tuple[str, ...], special: dict | None = None):
+    """一括展開済みの列で条件を評価する evaluate 関数を作成
+
+    special はフィールド → (値 → 国名の集合) で、列を持たない条件（#similar_to など）に使う。
+    """
+    special = special or {}
+
+    def evaluate(predicate: Predicate, candidates: np.ndarray) -> np.ndarray:
+        if predicate.field in special:
+            matched = special[predicate.field](predicate.value)
+            return np.array([countries[i] in matched for i in candidates], dtype=bool)
+
+        if (
+            predicate.match == "equals"
+            and EXPRESSION_FIELDS[predicate.field][0] == "plate"
+        ):
+            return _plate_rows(store, countries, predicate, candidates)
+
+        column = get_field_column(store, predicate.field)
+        if column.countries != countries:
+            # 並び順だけが変わった場合などは国名で位置をそろえる
+            rows = np.array(
+                [column.positions.get(countries[i], -1) for i in candidates], dtype=int
+            )
+            present = rows >= 0
+            result = np.zeros(len(candidates), dtype=bool)
+            result[present] = _evaluate_rows(column, predicate, rows[present])
+            return result
+        return _evaluate_rows(column, predicate, candidates)
+
+    return evaluate
+
+
+def _plate_rows(store, countries, predicate: Predicate, candidates: np.ndarray):
+    """ナンバープレートの属性の一致を属性索引のビット列から求める"""
+    index = get_plate_attribute_index(store)
+    _, side, attribute = predicate.field.split(".")
+    mask = index.match([(side, attribute, predicate.value)])
+    if index.countries != countries:
+        rows = np.array(
+            [index.positions.get(countries[i], -1) for i in candidates], dtype=int
+        )
+        return np.where(rows >= 0, mask[rows], False)
+    return mask[candidates]
+
+
+def _evaluate_rows(column: FieldColumn, predicate: Predicate, rows: np.ndarray):
+    if predicate.match in TEXT_MATCH_TYPES:
+        return column.matches(predicate.match, predicate.value, rows)
+    values = column.numeric[rows]
+    threshold = float(predicate.value)
+    with np.errstate(invalid="ignore"):
+        if predicate.match == ">":
+            return values > threshold
+        if predicate.match == ">=":
+            return values >= threshold
+        if predicate.match == "<":
+            return values < threshold
+        return values <= threshold
+
+
+def evaluate_expression(
+    store, expr, countries: tuple[str, ...], special: dict | None = None
+) -> tuple[np.ndarray, PlanNode | None]:
+    """式を評価して (countries の順のマスク, 実行済みの計画) を返す"""
+    if expr is None:
+        return np.ones(len(countries), dtype=bool), None
+    plan = compile_plan(
+        expr, len(countries), lambda field_path: get_field_stats(store, field_path)
+    )
+    evaluate = column_evaluator(store, countries, special)
+    return execute_plan(plan, len(countries), evaluate), plan
+
+
+def evaluate_columns(
+    expr,
+    countries: tuple[str, ...],
+    columns: dict[str, FieldColumn],
+    special: dict | None = None,
+) -> np.ndarray:
+    """ストアを使わず、countries と同じ並びの列だけで式を評価したマスク
+
+    ストリーミング出力のように、データセットを一定件数ずつ列に展開して判定する場合に使う。
+    """
+    if expr is None:
+        return np.ones(len(countries), dtype=bool)
+    special = special or {}
+    plan = compile_plan(
+        expr,
+        len(countries),
+        lambda field_path: FieldStats.from_column(columns[field_path]),
+    )
+
+    def evaluate(predicate: Predicate, candidates: np.ndarray) -> np.ndarray:
+        if predicate.field in special:
+            matched = special[predicate.field](predicate.value)
+            return np.array([countries[i] in matched for i in candidates], dtype=bool)
+        return _evaluate_rows(columns[predicate.field], predicate, candidates)
+
+    return execute_plan(plan, len(countries), evaluate)
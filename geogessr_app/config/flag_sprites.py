@@ -0,0 +1,219 @@
+# config/flag_sprites.py
+
+import hashlib
+import json
+import re
+import urllib.request
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+import folium
+
+from config.paths import FLAG_DIR, FLAG_SPRITE_PATH
+
+SVG_NS = "http://www.w3.org/2000/svg"
+XLINK_NS = "http://www.w3.org/1999/xlink"
+
+ET.register_namespace("", SVG_NS)
+ET.register_namespace("xlink", XLINK_NS)
+
+_URL_REF = re.compile(r"url\(\s*#([^)\s]+)\s*\)")
+
+
+def flag_code(info: dict) -> str:
+    """flag.image_url のファイル名（拡張子なし）を旗のコードとして返す（例: "al"）"""
+    url = info.get("flag", {}).get("image_url", "")
+    return url.rsplit("/", 1)[-1].rsplit(".", 1)[0] if url else ""
+
+
+def symbol_id(code: str) -> str:
+    return f"flag-{code}"
+
+
+def _prefix_ids(element: ET.Element, prefix: str):
+    """旗ごとの SVG の中の id と参照に接頭辞を付けて、1つの文書にまとめても衝突しないようにする"""
+    for node in element.iter():
+        for name, value in list(node.attrib.items()):
+            if name == "id":
+                node.set(name, f"{prefix}-{value}")
+            elif name in ("href", f"{{{XLINK_NS}}}href") and value.startswith("#"):
+                node.set(name, f"#{prefix}-{value[1:]}")
+            elif "url(" in value:
+                node.set(name, _URL_REF.sub(rf"url(#{prefix}-\1)", value))
+        if node.tag == f"{{{SVG_NS}}}style" and node.text:
+            node.text = _URL_REF.sub(rf"url(#{prefix}-\1)", node.text)
+
+
+def _symbol_from_svg(path: Path, code: str) -> ET.Element:
+    root = ET.parse(path).getroot()
+    view_box = root.get("viewBox")
+    if not view_box:
+        width = float(re.sub(r"[^\d.]", "", root.get("width", "640")) or 640)
+        height = float(re.sub(r"[^\d.]", "", root.get("height", "480")) or 480)
+        view_box = f"0 0 {width:g} {height:g}"
+    symbol = ET.Element(f"{{{SVG_NS}}}symbol", {"id": symbol_id(code)})
+    symbol.set("viewBox", view_box)
+    for child in root:
+        symbol.append(child)
+    _prefix_ids(symbol, symbol_id(code))
+    # symbol 自体の id は接頭辞を付けない
+    symbol.set("id", symbol_id(code))
+    return symbol
+
+
+def build_flag_sprite(
+    flag_dir: Path = FLAG_DIR, sprite_path: Path = FLAG_SPRITE_PATH
+) -> dict:
+    """flag_dir の SVG を1つの <symbol> 集合にまとめ、旗のコード → symbol の索引を書き出す
+
+    索引（sprite_path と同名の .json）には各 symbol の id と viewBox を記録する。
+    """
+    flag_dir = Path(flag_dir)
+    sprite = ET.Element(f"{{{SVG_NS}}}svg")
+    index = {}
+    for path in sorted(flag_dir.glob("*.svg")):
+        code = path.stem
+        symbol = _symbol_from_svg(path, code)
+        sprite.append(symbol)
+        index[code] = {"id": symbol.get("id"), "viewBox": symbol.get("viewBox")}
+
+    markup = ET.tostring(sprite, encoding="unicode")
+    sprite_path = Path(sprite_path)
+    sprite_path.parent.mkdir(parents=True, exist_ok=True)
+    sprite_path.write_text(markup, encoding="utf-8")
+    sprite_path.with_suffix(".json").write_text(
+        json.dumps(
+            {
+                "digest": hashlib.sha1(markup.encode("utf-8")).hexdigest()[:12],
+                "symbols": index,
+            },
+            ensure_ascii=False,
+            indent=1,
+        ),
+        encoding="utf-8",
+    )
+    return index
+
+
+def fetch_flags(data: dict, flag_dir: Path = FLAG_DIR) -> list[str]:
+    """flag.image_url の SVG のうち flag_dir にないものを取得（一度だけ実行するビルド手順）"""
+    flag_dir = Path(flag_dir)
+    flag_dir.mkdir(parents=True, exist_ok=True)
+    fetched = []
+    for info in data.values():
+        code = flag_code(info)
+        target = flag_dir / f"{code}.svg"
+        if not code or target.exists():
+            continue
+        with urllib.request.urlopen(info["flag"]["image_url"], timeout=30) as response:
+            target.write_bytes(response.read())
+        fetched.append(code)
+    return fetched
+
+
+class FlagSprite:
+    """ビルド済みのスプライト（旗のコード → <symbol> のマークアップ）"""
+
+    def __init__(self, sprite_path: Path = FLAG_SPRITE_PATH):
+        self.sprite_path = Path(sprite_path)
+        self.symbols = {}
+        self.view_boxes = {}
+        self._stat = None
+        self.reload()
+
+    def reload(self):
+        """スプライトが作り直されていれば読み直す"""
+        try:
+            stat = self.sprite_path.stat()
+        except FileNotFoundError:
+            self.symbols, self.view_boxes, self._stat = {}, {}, None
+            return
+        stat_key = (stat.st_mtime_ns, stat.st_size)
+        if stat_key == self._stat:
+            return
+        root = ET.fromstring(self.sprite_path.read_text(encoding="utf-8"))
+        symbols, view_boxes = {}, {}
+        for symbol in root:
+            code = symbol.get("id", "").removeprefix("flag-")
+            markup = ET.tostring(symbol, encoding="unicode")
+            # 名前空間の宣言は外側の <svg> にまとめる
+            for declaration in (f' xmlns="{SVG_NS}"', f' xmlns:xlink="{XLINK_NS}"'):
+                markup = markup.replace(declaration, "")
+            symbols[code] = markup
+            view_boxes[code] = symbol.get("viewBox")
+        self.symbols, self.view_boxes, self._stat = symbols, view_boxes, stat_key
+
+    @property
+    def version(self):
+        """スプライトファイルの (更新時刻, サイズ)（なければ None）"""
+        return self._stat
+
+    def flag_html(self, info: dict, css_class: str = "gg-flag") -> str:
+        """旗の HTML（スプライトにあれば <use> で参照し、なければ画像 URL にフォールバック）"""
+        code = flag_code(info)
+        if code in self.symbols:
+            return (
+                f'<svg class="{css_class}" viewBox="{self.view_boxes[code]}">'
+                f'<use href="#{symbol_id(code)}"/></svg>'
+            )
+        url = info.get("flag", {}).get("image_url", "")
+        return f'<img src="{url}" class="{css_class}" />' if url else ""
+
+    def markup(self, codes) -> str:
+        """codes の旗だけを含む非表示の <symbol> 集合"""
+        symbols = "".join(
+            self.symbols[c] for c in sorted(set(codes)) if c in self.symbols
+        )
+        if not symbols:
+            return ""
+        return (
+            f'<svg xmlns="{SVG_NS}" xmlns:xlink="{XLINK_NS}" '
+            f'style="display:none">{symbols}</svg>'
+        )
+
+
+_sprite = None
+
+
+def get_flag_sprite() -> FlagSprite:
+    """プロセス内で共有するスプライト（ファイルが更新されていれば読み直す）"""
+    global _sprite
+    if _sprite is None:
+        _sprite = FlagSprite()
+    else:
+        _sprite.reload()
+    return _sprite
+
+
+def flag_html(info: dict, css_class: str = "gg-flag") -> str:
+    return get_flag_sprite().flag_html(info, css_class)
+
+
+def inject_flag_sprite(m: folium.Map, codes) -> folium.Map:
+    """地図で使う旗の <symbol> 集合を本文に1回だけ埋め込む"""
+    markup = get_flag_sprite().markup(codes)
+    if markup:
+        m.get_root().html.add_child(folium.Element(markup), name="gg_flag_sprite")
+    return m
+
+
+if __name__ == "__main__":
+    # cd geogessr_app && python -m config.flag_sprites fetch   （初回のみ、CDN から取得）
+    # cd geogessr_app && python -m config.flag_sprites build
+    import argparse
+
+    from config.dataset_store import create_dataset_store
+
+    parser = argparse.ArgumentParser(description="旗の SVG スプライトを作成")
+    parser.add_argument("command", choices=["fetch", "build"])
+    parser.add_argument("--flags", default=str(FLAG_DIR))
+    parser.add_argument("--out", default=str(FLAG_SPRITE_PATH))
+    args = parser.parse_args()
+
+    if args.command == "fetch":
+        fetched = fetch_flags(create_dataset_store().data, Path(args.flags))
+        print(f"fetched {len(fetched)} flags into {args.flags}")
+    else:
+        index = build_flag_sprite(Path(args.flags), Path(args.out))
+        size = Path(args.out).stat().st_size
+        print(f"built {len(index)} symbols into {args.out} ({size / 1024:.1f} KB)")
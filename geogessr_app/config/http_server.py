@@ -0,0 +1,113 @@
+# config/http_server.py
+
+import asyncio
+import json
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+_STATUS_TEXT = {
+    200: "OK",
+    304: "Not Modified",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    500: "Internal Server Error",
+}
+
+
+class ResponseCache:
+    """リクエスト（データバージョン, パス, クエリなど）をキーにした LRU のレスポンスキャッシュ"""
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class AsyncHttpServer:
+    """HTTP/1.1 の keep-alive 接続を受け、respond() の結果を返す小さなサーバー
+
+    サブクラスは respond(method, target, headers) → (ステータス, ヘッダー, ボディ) を実装する。
+    HEAD にも GET と同じボディを返せば、Content-Length を GET と同じにしてボディを省く。
+    respond() はスレッドプールで実行するため、時間のかかる処理も他の接続を止めない
+    （複数のスレッドから同時に呼ばれる）。respond() の想定外の例外は 500 として返す。
+    """
+
+    def respond(self, method: str, target: str, headers: dict) -> tuple:
+        raise NotImplementedError
+
+    def _respond_safely(self, method: str, target: str, headers: dict) -> tuple:
+        try:
+            return self.respond(method, target, headers)
+        except Exception:
+            logger.exception("error while handling %s %s", method, target)
+            body = json.dumps({"error": "internal server error"}).encode("utf-8")
+            return 500, {"Content-Type": "application/json; charset=utf-8"}, body
+
+    async def handle_connection(self, reader, writer):
+        """HTTP/1.1 の keep-alive 接続を処理"""
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, *_ = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                status, response_headers, body = await loop.run_in_executor(
+                    None, self._respond_safely, method, target, headers
+                )
+                keep_alive = headers.get("connection", "").lower() != "close"
+                response_headers["Content-Length"] = str(len(body))
+                if method == "HEAD":
+                    body = b""
+                response_headers["Connection"] = "keep-alive" if keep_alive else "close"
+                head = (
+                    f"HTTP/1.1 {status} {_STATUS_TEXT.get(status, '')}\r\n"
+                    + "".join(
+                        f"{name}: {value}\r\n"
+                        for name, value in response_headers.items()
+                    )
+                )
+                writer.write(head.encode("latin-1") + b"\r\n" + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str, port: int):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        async with server:
+            await server.serve_forever()
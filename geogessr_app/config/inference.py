@@ -0,0 +1,212 @@
+# config/inference.py
+
+import re
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from config.char_config import CHAR_TO_LANGUAGES
+from config.field_columns import format_display_value
+
+# 手がかりの種類と重み（全ての観測と一致すれば +重み、どれとも一致しなければ -重み）
+CLUE_WEIGHTS = {
+    "chars": 3.0,
+    "plate": 2.0,
+    "crosswalk_stripes": 1.5,
+    "crosswalk_features": 1.0,
+    "sign_back": 1.0,
+    "camera": 1.0,
+}
+
+CLUE_LABELS = {
+    "chars": "Characters",
+    "plate": "Number Plate",
+    "crosswalk_stripes": "Crosswalk Stripes",
+    "crosswalk_features": "Crosswalk Features",
+    "sign_back": "Sign Back",
+    "camera": "Camera",
+}
+
+# 候補として表示する上位件数
+INFERENCE_TOP_K = 15
+
+# 国データのうち推論に使うトップレベルのキー（キャッシュの無効化に使用）
+CLUE_DEPENDENCIES = {
+    "language",
+    "number_plate_config",
+    "crosswalk_stripes",
+    "crosswalk_features",
+    "sign_back",
+    "camera",
+}
+
+_PLATE_BANDS = ("top_band_color", "left_band_color", "right_band_color")
+
+
+def _char_tokens(info: dict) -> set[str] | None:
+    """国の言語で使われる特徴文字（言語データがなければ None）"""
+    languages = set(info.get("language") or [])
+    if not languages:
+        return None
+    return {c for c, langs in CHAR_TO_LANGUAGES.items() if languages & set(langs)}
+
+
+def _plate_tokens(info: dict) -> set[str] | None:
+    """前後どちらかのナンバープレートに見られる地の色・帯の色"""
+    config = info.get("number_plate_config") or {}
+    tokens = set()
+    for side in ("front", "rear"):
+        plate = config.get(side) or {}
+        if plate.get("bg_color"):
+            tokens.add(f"{plate['bg_color']} background")
+        tokens.update(f"{plate[band]} band" for band in _PLATE_BANDS if plate.get(band))
+    return tokens or None
+
+
+def _stripe_tokens(info: dict) -> set[str] | None:
+    """横断歩道の縞の本数（"4 or 6" のような値はどちらの本数とも一致させる）"""
+    value = info.get("crosswalk_stripes")
+    if value is None:
+        return None
+    return set(re.findall(r"\d+", str(value))) or None
+
+
+def _text_tokens(key: str):
+    def tokens(info: dict) -> set[str] | None:
+        text = format_display_value(info.get(key)).strip()
+        return {text} if text else None
+
+    return tokens
+
+
+_EXTRACTORS = {
+    "chars": _char_tokens,
+    "plate": _plate_tokens,
+    "crosswalk_stripes": _stripe_tokens,
+    "crosswalk_features": _text_tokens("crosswalk_features"),
+    "sign_back": _text_tokens("sign_back"),
+    "camera": _text_tokens("camera"),
+}
+
+
+def _option_key(option: str):
+    # 数値の選択肢は数値順、それ以外は文字列順
+    return (0, int(option), "") if option.isdigit() else (1, 0, option)
+
+
+@dataclass(frozen=True)
+class ClueMatch:
+    """推論結果の1か国分（合計スコアと手がかりごとの寄与）"""
+
+    country: str
+    score: float
+    contributions: dict = field(default_factory=dict)
+    # 情報のある手がかりが全て観測と一致したかどうか
+    consistent: bool = True
+
+
+class InferenceIndex:
+    """国ごとの特徴を手がかりの選択肢のビット列に展開した索引
+
+    全ての手がかりの選択肢を列に並べた (国数 × 選択肢数) の行列を持ち、
+    観測された選択肢との一致数を1回の行列積で求める。
+    """
+
+    def __init__(
+        self,
+        names: list[str],
+        options: dict[str, tuple[str, ...]],
+        features: np.ndarray,
+        known: np.ndarray,
+    ):
+        self.names = names
+        self.options = options
+        # 列の並び（手がかりごとの選択肢を順に連結）と各選択肢の列番号
+        self.clues = list(options)
+        self._columns = {}
+        for clue in self.clues:
+            for option in options[clue]:
+                self._columns[(clue, option)] = len(self._columns)
+        self.features = features
+        self.known = known
+        self.weights = np.array([CLUE_WEIGHTS[c] for c in self.clues], np.float32)
+
+    @classmethod
+    def from_data(cls, data: dict) -> "InferenceIndex":
+        names = list(data)
+        tokens = {
+            clue: [extract(info) for info in data.values()]
+            for clue, extract in _EXTRACTORS.items()
+        }
+        options = {}
+        for clue, values in tokens.items():
+            found = set().union(*(v for v in values if v))
+            if clue == "chars":
+                found |= set(CHAR_TO_LANGUAGES)
+            options[clue] = tuple(sorted(found, key=_option_key))
+
+        n_options = sum(len(o) for o in options.values())
+        features = np.zeros((len(names), n_options), dtype=np.float32)
+        known = np.zeros((len(names), len(options)), dtype=bool)
+        offset = 0
+        for c, (clue, values) in enumerate(tokens.items()):
+            column_of = {option: offset + j for j, option in enumerate(options[clue])}
+            for i, value in enumerate(values):
+                if value is None:
+                    continue
+                known[i, c] = True
+                features[i, [column_of[v] for v in value]] = 1.0
+            offset += len(options[clue])
+        return cls(names, options, features, known)
+
+    def score(self, observed: dict[str, list[str]]) -> tuple[np.ndarray, np.ndarray]:
+        """観測（手がかり → 選択肢のリスト）に対する (合計スコア, 手がかりごとの寄与)
+
+        寄与は 重み × (2 × 一致した割合 − 1) で、国にその手がかりの情報がなければ 0。
+        """
+        selection = np.zeros((len(self._columns), len(self.clues)), dtype=np.float32)
+        for c, clue in enumerate(self.clues):
+            for option in observed.get(clue) or ():
+                column = self._columns.get((clue, option))
+                if column is not None:
+                    selection[column, c] = 1.0
+        counts = selection.sum(axis=0)
+        active = counts > 0
+
+        matched = self.features @ selection
+        fraction = np.divide(matched, counts, out=np.zeros_like(matched), where=active)
+        contributions = (2.0 * fraction - 1.0) * self.weights * (self.known & active)
+        # 情報のない国の寄与を -0.0 ではなく 0.0 にそろえる
+        contributions += 0.0
+        return contributions.sum(axis=1), contributions
+
+    def rank(self, observed: dict[str, list[str]], limit: int | None = None):
+        """スコアの高い順の ClueMatch のリスト（同点は国名順）"""
+        totals, contributions = self.score(observed)
+        active = [
+            c
+            for c, clue in enumerate(self.clues)
+            if any(
+                (clue, option) in self._columns for option in observed.get(clue) or ()
+            )
+        ]
+        # 情報のある手がかりが全て満点（重みと同じ寄与）なら観測と矛盾しない
+        consistent = np.all(
+            (contributions[:, active] >= self.weights[active] - 1e-6)
+            | ~self.known[:, active],
+            axis=1,
+        )
+        order = np.lexsort((np.array(self.names), -totals))
+        if limit is not None:
+            order = order[:limit]
+        return [
+            ClueMatch(
+                country=self.names[i],
+                score=float(totals[i]),
+                contributions={
+                    self.clues[c]: float(contributions[i, c]) for c in active
+                },
+                consistent=bool(consistent[i]),
+            )
+            for i in order
+        ]
@@ -0,0 +1,147 @@
+# config/ingest.py
+
+import csv
+import os
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Iterator
+
+from config.country_aliases import AliasIndex
+from config.paths import DATA_DIR, GEO_DATA_PATH
+from config.yaml_blocks import parse_block, replace_scalar_field, split_top_level_blocks
+
+
+def normalize_number(raw: str):
+    """'256,581' や ' 1,234.5 ' のような文字列を数値に変換（変換不能なら None）"""
+    if raw is None:
+        return None
+    text = str(raw).strip().replace(",", "").replace("\u00a0", "").replace(" ", "")
+    if not text or text in {"-", "—", "–", "N/A", "n/a"}:
+        return None
+    if re.fullmatch(r"[-+]?\d+", text):
+        return int(text)
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+@dataclass(frozen=True)
+class CsvSource:
+    """CSVデータソースの定義（どの列をどのフィールドに取り込むか）"""
+
+    path: Path
+    name_column: str
+    value_column: str
+    target_field: str
+    parse: Callable = normalize_number
+
+
+# 取り込み対象のデータソース（新しいソースはここに追加）
+CSV_SOURCES = {
+    "gdp_per_capita": CsvSource(
+        path=DATA_DIR / "gdp_per_capita.csv",
+        name_column="Country/Territory",
+        value_column="Estimate",
+        target_field="gdp_per_capita",
+    ),
+}
+
+
+@dataclass
+class IngestReport:
+    """取り込み結果のレポート"""
+
+    updated: list = field(default_factory=list)  # (国名, フィールド, 旧値, 新値)
+    unchanged: int = 0
+    unmatched: list = field(default_factory=list)  # (ソース名, 外部データの国名)
+    invalid: list = field(default_factory=list)  # (ソース名, 国名, 生の値)
+
+    def format(self) -> str:
+        lines = [f"updated: {len(self.updated)}, unchanged: {self.unchanged}"]
+        for country, field_name, old, new in self.updated:
+            lines.append(f"  ~ {country}.{field_name}: {old} -> {new}")
+        if self.invalid:
+            lines.append(f"invalid values: {len(self.invalid)}")
+            for source, name, raw in self.invalid:
+                lines.append(f"  ! [{source}] {name}: {raw!r}")
+        lines.append(f"unmatched names: {len(self.unmatched)}")
+        for source, name in self.unmatched:
+            lines.append(f"  ? [{source}] {name}")
+        return "\n".join(lines)
+
+
+def stream_csv_rows(source: CsvSource) -> Iterator[tuple[str, str]]:
+    """CSVを1行ずつ読み、(国名, 生の値) を返す"""
+    with open(source.path, "r", encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f):
+            name = (row.get(source.name_column) or "").strip()
+            if name:
+                yield name, row.get(source.value_column)
+
+
+def ingest_sources(
+    sources: dict[str, CsvSource] | None = None,
+    data_path: Path = GEO_DATA_PATH,
+    dry_run: bool = False,
+) -> IngestReport:
+    """CSVソースを geo_data.yaml にマージし、値が変わったエントリだけを書き換える"""
+    sources = CSV_SOURCES if sources is None else sources
+    text = Path(data_path).read_text(encoding="utf-8")
+    blocks = split_top_level_blocks(text)
+    block_index = {name: i for i, (name, _) in enumerate(blocks)}
+    alias_index = AliasIndex(list(block_index))
+    parsed = {}  # 変更対象になった国だけパースしてキャッシュ
+    new_blocks = [block for _, block in blocks]
+
+    report = IngestReport()
+    for source_name, source in sources.items():
+        for raw_name, raw_value in stream_csv_rows(source):
+            country = alias_index.resolve(raw_name)
+            if country is None:
+                report.unmatched.append((source_name, raw_name))
+                continue
+
+            value = source.parse(raw_value)
+            if value is None:
+                report.invalid.append((source_name, raw_name, raw_value))
+                continue
+
+            i = block_index[country]
+            if country not in parsed:
+                parsed[country] = parse_block(new_blocks[i])[1]
+            old_value = parsed[country].get(source.target_field)
+            if old_value == value:
+                report.unchanged += 1
+                continue
+
+            new_blocks[i] = replace_scalar_field(
+                new_blocks[i], source.target_field, value
+            )
+            parsed[country][source.target_field] = value
+            report.updated.append((country, source.target_field, old_value, value))
+
+    if report.updated and not dry_run:
+        tmp_path = f"{data_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+            f.write("".join(new_blocks))
+        os.replace(tmp_path, data_path)
+
+    return report
+
+
+if __name__ == "__main__":
+    # cd geogessr_app && python -m config.ingest [--dry-run] [--source gdp_per_capita]
+    import argparse
+
+    parser = argparse.ArgumentParser(description="CSVデータを geo_data.yaml に取り込む")
+    parser.add_argument("--data", default=str(GEO_DATA_PATH))
+    parser.add_argument(
+        "--source", action="append", choices=sorted(CSV_SOURCES), default=None
+    )
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    selected = {name: CSV_SOURCES[name] for name in args.source or CSV_SOURCES}
+    print(ingest_sources(selected, Path(args.data), dry_run=args.dry_run).format())
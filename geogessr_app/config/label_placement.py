@@ -0,0 +1,91 @@
+# config/label_placement.py
+
+import math
+
+TILE_SIZE = 256
+
+# ラベルの大きさの見積もり（px）
+CHAR_WIDTH = 6
+LABEL_PADDING = 10
+LABEL_HEIGHT = 18
+MAX_LABEL_WIDTH = 220
+
+# 配置結果のキャッシュに保持する (フィールド, ズーム, 国名表示) の組の数
+LABEL_PLACEMENT_CACHE_SIZE = 64
+
+# 衝突したときに試す位置（ラベル中心の点からのずれ、幅・高さに対する倍率）
+CANDIDATE_OFFSETS = (
+    (0.0, 0.0),
+    (0.0, -1.0),
+    (0.0, 1.0),
+    (0.6, 0.0),
+    (-0.6, 0.0),
+)
+
+
+def project(lat: float, lng: float, zoom: int) -> tuple[float, float]:
+    """緯度経度を Web メルカトルのピクセル座標に変換"""
+    scale = TILE_SIZE * (2**zoom)
+    lat = max(-85.05112878, min(85.05112878, lat))
+    x = (lng + 180.0) / 360.0 * scale
+    sin_lat = math.sin(math.radians(lat))
+    y = (0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)) * scale
+    return x, y
+
+
+def label_size(text: str) -> tuple[int, int]:
+    """ラベル文字列から表示サイズ（幅, 高さ）を見積もる"""
+    width = min(MAX_LABEL_WIDTH, len(text) * CHAR_WIDTH + LABEL_PADDING)
+    return width, LABEL_HEIGHT
+
+
+class _Grid:
+    """配置済みラベルの矩形を格子単位で管理する空間インデックス"""
+
+    def __init__(self, cell: float):
+        self.cell = cell
+        self._cells = {}
+
+    def _keys(self, rect):
+        x0, y0, x1, y1 = rect
+        for gx in range(int(x0 // self.cell), int(x1 // self.cell) + 1):
+            for gy in range(int(y0 // self.cell), int(y1 // self.cell) + 1):
+                yield gx, gy
+
+    def collides(self, rect) -> bool:
+        x0, y0, x1, y1 = rect
+        for key in self._keys(rect):
+            for ox0, oy0, ox1, oy1 in self._cells.get(key, ()):
+                if x0 < ox1 and ox0 < x1 and y0 < oy1 and oy0 < y1:
+                    return True
+        return False
+
+    def add(self, rect):
+        for key in self._keys(rect):
+            self._cells.setdefault(key, []).append(rect)
+
+
+def place_labels(labels: list[tuple[str, float, float, str]], zoom: int) -> dict:
+    """衝突しないようにラベルを貪欲法で配置
+
+    labels は優先度の高い順の (国名, 緯度, 経度, ラベル文字列)。
+    戻り値は 国名 → ピクセル単位のずれ (dx, dy)。配置できなかった国は含まれない。
+    """
+    grid = _Grid(cell=MAX_LABEL_WIDTH / 2)
+    placements = {}
+    for country, lat, lng, text in labels:
+        x, y = project(lat, lng, zoom)
+        width, height = label_size(text)
+        for fx, fy in CANDIDATE_OFFSETS:
+            dx, dy = fx * width, fy * height
+            rect = (
+                x + dx - width / 2,
+                y + dy - height / 2,
+                x + dx + width / 2,
+                y + dy + height / 2,
+            )
+            if not grid.collides(rect):
+                grid.add(rect)
+                placements[country] = (int(dx), int(dy))
+                break
+    return placements
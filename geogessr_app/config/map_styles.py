@@ -0,0 +1,45 @@
+# config/map_styles.py
+
+import folium
+
+# マーカー・ポップアップ共通のスタイル（地図1枚につき1回だけ埋め込む）
+MAP_STYLESHEET = """
+.gg-label{text-align:center;font-size:10px}
+.gg-flag{width:40px;height:auto;display:block;margin:0 auto}
+.gg-text{display:inline-block;background:#fff;padding:1px 4px;border-radius:4px;max-width:1000px;word-wrap:break-word;border:1px solid #666;color:#000}
+.gg-text-only{padding:2px 6px;line-height:1.2}
+.gg-plate .gg-flag{width:30px;margin-bottom:5px}
+.gg-plate-name{font-size:10px;margin-bottom:5px;color:#000}
+.gg-plate-img{width:120px;height:auto;display:block;margin:0 auto}
+.gg-tips{text-align:center;font-size:10px;background:#fff;padding:4px;border-radius:4px;border:1px solid #666;max-width:120px}
+.gg-tips .gg-flag{width:25px;margin-bottom:3px}
+.gg-tips-name{font-size:9px;margin-bottom:3px;color:#000;font-weight:bold}
+.gg-tips-body{text-align:left;max-width:110px}
+.gg-tip-text{margin:2px 0;font-size:8px;line-height:1.2;color:#333}
+.gg-tip-image{margin:3px 0;text-align:center}
+.gg-tip-image img{width:30%;max-width:30px;height:auto;display:block;margin:0 auto}
+.gg-tip-caption{font-size:7px;text-align:center;color:#666;margin-top:1px;line-height:1.1}
+.gg-popup{width:300px;text-align:left;max-height:400px;overflow-y:auto;background:#fff;color:#000;border:1px solid #666}
+.gg-popup-header{text-align:center;margin-bottom:10px;padding:10px;background:#f8f9fa;border-bottom:1px solid #ddd}
+.gg-popup-header h4{margin:0 0 8px 0;color:#000}
+.gg-popup-flag{width:80px;height:auto}
+.gg-popup-body{font-size:12px;line-height:1.4;padding:10px;color:#000}
+.gg-popup-tip{margin:5px 0}
+.gg-popup-tip img{max-width:120px;height:auto;display:block}
+"""
+
+
+def background_style(bg_color: str) -> str:
+    """背景色が既定（白）以外の場合だけ style 属性を返す"""
+    if not bg_color or bg_color == "white":
+        return ""
+    return f' style="background:{bg_color}"'
+
+
+def inject_map_styles(m: folium.Map) -> folium.Map:
+    """共通スタイルシートを地図のヘッダーに埋め込む"""
+    m.get_root().header.add_child(
+        folium.Element(f"<style>{MAP_STYLESHEET.strip()}</style>"),
+        name="gg_map_styles",
+    )
+    return m
@@ -0,0 +1,329 @@
+# config/memory_profile.py
+
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from config.paths import MEMORY_PROFILE, REPO_ROOT
+
+# 再実行ごとに報告する、増えたメモリの多い割り当て箇所の件数
+TOP_ALLOCATORS = 10
+
+# 保持する直近の再実行のレポート数（プロセス全体）
+REPORT_HISTORY = 50
+
+# 割り当て箇所の集計から除くファイル（計測そのものの割り当て）
+_IGNORED_FILES = (tracemalloc.__file__, "<frozen importlib._bootstrap>", "<unknown>")
+
+
+@dataclass(frozen=True)
+class Allocation:
+    """再実行の前後で増えたメモリの割り当て箇所（ファイル:行）"""
+
+    location: str
+    size: int
+    count: int
+
+
+@dataclass(frozen=True)
+class StageMemory:
+    """処理段階ごとのメモリ（入れ子の段階は "render/markers" のようなパス）"""
+
+    stage: str
+    calls: int
+    # 段階の終了時に残っていた増加分（呼び出しの合計、バイト）
+    allocated: int
+    # 段階の開始時からの最大の増加分（呼び出しの中の最大、バイト）
+    peak: int
+
+
+@dataclass(frozen=True)
+class MemoryReport:
+    """1回の再実行のメモリ使用量の内訳"""
+
+    scope: str
+    seconds: float
+    allocated: int
+    peak: int
+    # 再実行の終了時点でプロセス全体が追跡しているメモリ
+    traced: int
+    stages: tuple[StageMemory, ...]
+    top: tuple[Allocation, ...]
+
+    def format(self) -> str:
+        """段階ごとの内訳と割り当て箇所の上位を表形式の文字列で返す"""
+        lines = [
+            f"{self.scope} rerun: {self.seconds * 1000:.0f} ms, "
+            f"retained {_format_bytes(self.allocated)}, peak {_format_bytes(self.peak)}, "
+            f"traced {_format_bytes(self.traced)}",
+            f"  {'stage':<28} {'calls':>6} {'retained':>10} {'peak':>10}",
+        ]
+        for stage in self.stages:
+            depth = stage.stage.count("/")
+            name = "  " * depth + stage.stage.rsplit("/", 1)[-1]
+            lines.append(
+                f"  {name:<28} {stage.calls:>6} "
+                f"{_format_bytes(stage.allocated):>10} {_format_bytes(stage.peak):>10}"
+            )
+        if self.top:
+            lines.append("  top allocators (retained by the rerun):")
+            for allocation in self.top:
+                lines.append(
+                    f"    {_format_bytes(allocation.size):>10} "
+                    f"{allocation.count:>7} blocks  {allocation.location}"
+                )
+        return "\n".join(lines)
+
+
+def _format_bytes(size: int) -> str:
+    if abs(size) < 1024:
+        return f"{size} B"
+    if abs(size) < 1024**2:
+        return f"{size / 1024:.1f} KB"
+    return f"{size / 1024**2:.1f} MB"
+
+
+def _short_location(filename: str, lineno: int) -> str:
+    # サイトパッケージはパッケージ名から、リポジトリ内はリポジトリからの相対パスで表示
+    parts = filename.replace("\\", "/").split("/site-packages/", 1)
+    if len(parts) == 2:
+        filename = parts[1]
+    elif filename.startswith(str(REPO_ROOT)):
+        filename = os.path.relpath(filename, REPO_ROOT)
+    return f"{filename}:{lineno}"
+
+
+class _Frame:
+    def __init__(self, path: str, start: int):
+        self.path = path
+        self.start = start
+        self.peak = start
+
+
+class MemoryProfiler:
+    """tracemalloc で再実行の処理段階ごとのメモリ使用量を集計する（既定は無効）
+
+    段階の計測は追跡中のメモリ量を読むだけなので、ループの中でも使える。割り当て箇所は
+    再実行の開始時と終了時のスナップショットの差分で求める。tracemalloc はプロセス全体を
+    追跡するため、同時に動いている他のセッションの割り当ても含まれる。
+    """
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        top: int = TOP_ALLOCATORS,
+        history: int = REPORT_HISTORY,
+    ):
+        self.top = top
+        self.reports = deque(maxlen=history)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.enabled = False
+        if enabled:
+            self.start()
+
+    def start(self):
+        """メモリの追跡を始める（始める前の割り当ては集計されない）"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.enabled = True
+
+    def _state(self):
+        state = self._local
+        if not hasattr(state, "stack"):
+            state.stack = []
+            state.stages = {}
+            state.snapshot = None
+            state.scope = ""
+            state.started = 0.0
+        return state
+
+    def begin_rerun(self, scope: str) -> bool:
+        """再実行の計測を始める（ページ全体の再実行の中のフラグメントなら False）
+
+        "app" は前回の実行が途中で止まっていても、そこから計測をやり直す。
+        """
+        if not self.enabled:
+            return False
+        state = self._state()
+        if state.stack and scope != "app":
+            return False
+        state.snapshot = tracemalloc.take_snapshot()
+        state.stages = {}
+        state.scope = scope
+        state.started = time.perf_counter()
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        state.stack = [_Frame("", current)]
+        return True
+
+    def end_rerun(self) -> MemoryReport | None:
+        """計測中の再実行のレポートを作り、履歴に追加して返す"""
+        if not self.enabled:
+            return None
+        state = self._state()
+        if not state.stack:
+            return None
+        root = state.stack[0]
+        current, peak = tracemalloc.get_traced_memory()
+        seconds = time.perf_counter() - state.started
+        top = self._top_allocations(state.snapshot)
+        stages = tuple(
+            StageMemory(path, calls, allocated, peak_size)
+            for path, (calls, allocated, peak_size) in state.stages.items()
+        )
+        report = MemoryReport(
+            scope=state.scope,
+            seconds=seconds,
+            allocated=current - root.start,
+            peak=max(root.peak, peak) - root.start,
+            traced=current,
+            stages=stages,
+            top=top,
+        )
+        state.stack = []
+        state.snapshot = None
+        # スナップショットの比較で一時的に使ったメモリを次の計測のピークに含めない
+        tracemalloc.reset_peak()
+        with self._lock:
+            self.reports.append(report)
+        return report
+
+    def enter(self, name: str):
+        """段階の開始（stage() を使えない、with で囲めない範囲用）"""
+        state = self._state()
+        if not self.enabled or not state.stack:
+            return
+        parent = state.stack[-1]
+        current, peak = tracemalloc.get_traced_memory()
+        parent.peak = max(parent.peak, peak)
+        tracemalloc.reset_peak()
+        path = f"{parent.path}/{name}" if parent.path else name
+        # 表示順は段階を始めた順（入れ子の段階は親の後）
+        state.stages.setdefault(path, (0, 0, 0))
+        state.stack.append(_Frame(path, current))
+
+    def exit(self):
+        """enter() で始めた段階の終了"""
+        state = self._state()
+        if not self.enabled or len(state.stack) < 2:
+            return
+        frame = state.stack.pop()
+        current, peak = tracemalloc.get_traced_memory()
+        frame.peak = max(frame.peak, peak)
+        # 親の段階のピークには子の段階のピークも含める
+        parent = state.stack[-1]
+        parent.peak = max(parent.peak, frame.peak)
+        calls, allocated, peak_size = state.stages.get(frame.path, (0, 0, 0))
+        state.stages[frame.path] = (
+            calls + 1,
+            allocated + current - frame.start,
+            max(peak_size, frame.peak - frame.start),
+        )
+
+    @contextmanager
+    def stage(self, name: str):
+        """with ブロックの間のメモリの増加分と最大値を段階 name として記録"""
+        self.enter(name)
+        try:
+            yield
+        finally:
+            self.exit()
+
+    def _top_allocations(self, before) -> tuple[Allocation, ...]:
+        if before is None:
+            return ()
+        after = tracemalloc.take_snapshot()
+        filters = [tracemalloc.Filter(False, name) for name in _IGNORED_FILES]
+        stats = after.filter_traces(filters).compare_to(
+            before.filter_traces(filters), "lineno"
+        )
+        return tuple(
+            Allocation(
+                _short_location(stat.traceback[0].filename, stat.traceback[0].lineno),
+                stat.size_diff,
+                stat.count_diff,
+            )
+            for stat in stats[: self.top]
+            if stat.size_diff > 0
+        )
+
+
+# アプリ全体で共有する計測器（GEO_MEMORY_PROFILE=on のときだけ追跡する）
+PROFILER = MemoryProfiler(enabled=MEMORY_PROFILE == "on")
+
+
+def _run_app(fields: list[str], expression: str):
+    """AppTest でアプリを画面なしで実行し、各再実行のレポートを表示"""
+    from streamlit.testing.v1 import AppTest
+
+    from config.app_loadtest import APP_PATH
+
+    # -m で実行したときの __main__ ではなく、アプリが読み込むモジュールの計測器を使う
+    from config.memory_profile import PROFILER
+
+    at = AppTest.from_file(str(APP_PATH), default_timeout=600)
+    at.run()
+    if expression:
+        at.text_input(key="filter_expression").input(expression)
+        at.run()
+    for field_label in fields:
+        at.sidebar.selectbox[0].set_value(field_label)
+        at.run()
+    if at.exception:
+        raise SystemExit(at.exception[0].message)
+    for report in PROFILER.reports:
+        print(report.format())
+        print()
+
+
+if __name__ == "__main__":
+    # cd geogessr_app && python -m config.memory_profile --synthetic 5000 \
+    #     --field "GDP per capita" --field "Number Plate (Visual; Front, Rear)"
+    # アプリでは GEO_MEMORY_PROFILE=on で起動すると、サイドバーに内訳を表示する
+    import argparse
+    import subprocess
+    import sys
+    import tempfile
+    from pathlib import Path
+
+    from config.paths import GEO_DATA_PATH
+    from config.synthetic import write_synthetic_yaml
+
+    parser = argparse.ArgumentParser(
+        description="処理段階ごとのメモリ使用量を画面なしの再実行で計測"
+    )
+    parser.add_argument("--synthetic", type=int, default=0, help="合成データの件数")
+    parser.add_argument(
+        "--field", action="append", default=[], help="切り替える表示フィールド"
+    )
+    parser.add_argument("--expr", default="", help="入力するフィルター式")
+    parser.add_argument("--run-app", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_app:
+        _run_app(args.field, args.expr)
+        sys.exit(0)
+
+    # 設定（データの場所・計測の有効化）は読み込み時に決まるため、子プロセスで実行する
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {**os.environ, "GEO_MEMORY_PROFILE": "on", "GEO_METRICS_PORT": "0"}
+        if args.synthetic:
+            data_path = Path(tmp) / "geo_data.yaml"
+            started = time.perf_counter()
+            write_synthetic_yaml(data_path, args.synthetic, str(GEO_DATA_PATH))
+            print(
+                f"generated {args.synthetic} regions "
+                f"in {time.perf_counter() - started:.1f}s",
+                flush=True,
+            )
+            env.update(GEO_DATA_PATH=str(data_path), GEO_DATA_LAYOUT="monolithic")
+        command = [sys.executable, "-m", "config.memory_profile", "--run-app"]
+        command += [f"--field={field_label}" for field_label in args.field]
+        command += [f"--expr={args.expr}"]
+        app_dir = Path(__file__).resolve().parent.parent
+        sys.exit(subprocess.run(command, env=env, cwd=app_dir).returncode)
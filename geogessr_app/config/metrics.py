@@ -0,0 +1,288 @@
+# config/metrics.py
+
+import asyncio
+import itertools
+import math
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from config.http_server import AsyncHttpServer
+from config.paths import METRICS_HOST, METRICS_PORT
+
+# 秒単位の既定のバケット（再実行・処理段階の所要時間）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# 地図ペイロードは描画し直して測るため、この回数に1回だけ計測する
+PAYLOAD_SAMPLE_EVERY = 20
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items())
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """(サンプル名, ラベル, 値) を返す"""
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+
+class Counter(_Metric):
+    """単調に増える値（再実行回数など）"""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Histogram(_Metric):
+    """観測値の累積バケット・合計・件数"""
+
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, help_text: str, labelnames=(), buckets=DEFAULT_BUCKETS
+    ):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        """with ブロックの所要時間（秒）を記録"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(c), t)) for key, (c, t) in self._values.items()]
+        for key, (counts, total) in items:
+            labels = dict(zip(self.labelnames, key))
+            for bound, count in zip(self.buckets, counts):
+                bucket_labels = {**labels, "le": _format_value(bound)}
+                yield f"{self.name}_bucket", bucket_labels, count
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, counts[-1]
+
+
+class MetricsRegistry:
+    """指標と、スクレイプ時に値を集める collector の一覧"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help_text: str, labelnames=()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def histogram(
+        self, name: str, help_text: str, labelnames=(), buckets=DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def register_collector(self, name: str, collect):
+        """collect() は (指標名, 種類, 説明, [(ラベル, 値), ...]) の列を返す"""
+        with self._lock:
+            self._collectors[name] = collect
+
+    def render(self) -> str:
+        """Prometheus のテキスト形式（0.0.4）"""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for collect in collectors:
+            for name, kind, help_text, samples in collect():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(
+                        f"{name}{_format_labels(labels)} {_format_value(value)}"
+                    )
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+RERUNS = REGISTRY.counter(
+    "geo_reruns_total",
+    "Script reruns (app: whole page, fragment: map panel)",
+    ["scope"],
+)
+RERUN_SECONDS = REGISTRY.histogram(
+    "geo_rerun_duration_seconds", "Rerun duration in seconds", ["scope"]
+)
+STAGE_SECONDS = REGISTRY.histogram(
+    "geo_stage_duration_seconds",
+    "Time per rerun stage (load, filter, render, serialize) in seconds",
+    ["stage"],
+)
+LOAD_DATA = REGISTRY.counter(
+    "geo_load_data_total",
+    "load_data calls (hit: data unchanged, reload: changed blocks re-parsed)",
+    ["result"],
+)
+MAP_MARKERS = REGISTRY.histogram(
+    "geo_map_markers",
+    "Markers drawn per map render",
+    buckets=(0, 10, 25, 50, 100, 250, 500, 1000, 5000),
+)
+PAYLOAD_BYTES = REGISTRY.histogram(
+    "geo_map_payload_bytes",
+    f"Rendered map HTML size in bytes (sampled every {PAYLOAD_SAMPLE_EVERY} renders)",
+    buckets=tuple(2**i * 64 * 1024 for i in range(10)),
+)
+
+_map_renders = itertools.count(1)
+
+
+def sample_payload() -> bool:
+    """この地図描画でペイロードのサイズを計測するかどうか（PAYLOAD_SAMPLE_EVERY 回に1回）"""
+    return next(_map_renders) % PAYLOAD_SAMPLE_EVERY == 0
+
+
+def cache_collector(store):
+    """DatasetStore の派生キャッシュの件数・ヒット率などを集める collector"""
+
+    def collect():
+        caches = sorted(store.caches.items())
+        yield (
+            "geo_cache_hits_total",
+            "counter",
+            "Derived cache hits",
+            [({"cache": name}, cache.hits) for name, cache in caches],
+        )
+        yield (
+            "geo_cache_misses_total",
+            "counter",
+            "Derived cache misses",
+            [({"cache": name}, cache.misses) for name, cache in caches],
+        )
+        yield (
+            "geo_cache_evictions_total",
+            "counter",
+            "Derived cache LRU evictions",
+            [({"cache": name}, cache.evictions) for name, cache in caches],
+        )
+        yield (
+            "geo_cache_entries",
+            "gauge",
+            "Derived cache entries",
+            [({"cache": name}, len(cache)) for name, cache in caches],
+        )
+        yield (
+            "geo_cache_hit_ratio",
+            "gauge",
+            "Derived cache hit ratio (hits / lookups)",
+            [({"cache": name}, cache.hit_rate) for name, cache in caches],
+        )
+        yield (
+            "geo_dataset_reloads_total",
+            "counter",
+            "Times the dataset file was re-read",
+            [({}, store.reload_count)],
+        )
+
+    return collect
+
+
+class MetricsServer(AsyncHttpServer):
+    """/metrics で指標をテキスト形式で返すローカル HTTP サービス"""
+
+    def __init__(self, registry: MetricsRegistry = REGISTRY):
+        self.registry = registry
+
+    def respond(self, method: str, target: str, headers: dict) -> tuple:
+        if method not in ("GET", "HEAD"):
+            return 405, {"Content-Type": "text/plain"}, b"method not allowed\n"
+        if urlsplit(target).path != "/metrics":
+            return 404, {"Content-Type": "text/plain"}, b"not found\n"
+        body = self.registry.render().encode("utf-8")
+        response_headers = {
+            "Content-Type": "text/plain; version=0.0.4; charset=utf-8",
+            "Cache-Control": "no-store",
+        }
+        return 200, response_headers, body
+
+
+def start_metrics_server(
+    registry: MetricsRegistry = REGISTRY,
+    host: str = METRICS_HOST,
+    port: int = METRICS_PORT,
+) -> threading.Thread | None:
+    """別スレッドのイベントループで /metrics を配信（ポートが使えなければ None）"""
+    if not port:
+        return None
+    server = MetricsServer(registry)
+    try:
+        # 先に待ち受けを確認して、使用中のポートではスレッドを起動しない
+        loop = asyncio.new_event_loop()
+        listener = loop.run_until_complete(
+            asyncio.start_server(server.handle_connection, host, port)
+        )
+    except OSError:
+        loop.close()
+        return None
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(listener.serve_forever())
+
+    thread = threading.Thread(target=run, name="metrics-server", daemon=True)
+    thread.start()
+    return thread
@@ -2,6 +2,10 @@
 
 import urllib.parse
 
+import numpy as np
+
+from config.field_config import PLATE_ATTRIBUTES, PLATE_SIDES
+
 # デフォルト設定
 DEFAULT_WIDTH = 400  # 520から400に変更（約23%縮小）
 DEFAULT_ASPECT_RATIO = 1 / 2.3
@@ -138,3 +142,61 @@ def get_combined_plate_data_url(country_data: dict, country_name: str = "") -> s
     if not svg:
         return ""
     return f"data:image/svg+xml,{urllib.parse.quote(svg)}"
+
+
+def plate_attribute_field(side: str, attribute: str) -> str:
+    """フィルター用のフィールドパス（例: number_plate_config.rear.bg_color）"""
+    return f"number_plate_config.{side}.{attribute}"
+
+
+class PlateAttributeIndex:
+    """ナンバープレートの (前後, 属性) ごとに 値 → 国のビット列 を持つ索引
+
+    ビット列は国の並び（データセットの順）に np.packbits で詰めたもの。複数の条件は
+    ビット列の AND で求めるため、国ごとの設定を辿らずに済む。
+    """
+
+    def __init__(self, countries: tuple[str, ...], bits: dict):
+        self.countries = countries
+        self.bits = bits
+        self.positions = {country: i for i, country in enumerate(countries)}
+
+    @classmethod
+    def from_data(cls, data: dict) -> "PlateAttributeIndex":
+        countries = tuple(data)
+        members = {}
+        for i, info in enumerate(data.values()):
+            config = info.get("number_plate_config") or {}
+            for side in PLATE_SIDES:
+                plate = config.get(side) or {}
+                for attribute in PLATE_ATTRIBUTES:
+                    value = plate.get(attribute)
+                    if value:
+                        key = (side, attribute)
+                        members.setdefault(key, {}).setdefault(
+                            str(value).lower(), []
+                        ).append(i)
+        bits = {}
+        for key, values in members.items():
+            bits[key] = {}
+            for value, rows in values.items():
+                mask = np.zeros(len(countries), dtype=bool)
+                mask[rows] = True
+                bits[key][value] = np.packbits(mask)
+        return cls(countries, bits)
+
+    def values(self, side: str, attribute: str) -> list[str]:
+        return sorted(self.bits.get((side, attribute), {}))
+
+    def _bits(self, side: str, attribute: str, value: str) -> np.ndarray:
+        packed = self.bits.get((side, attribute), {}).get(value.strip().lower())
+        if packed is None:
+            return np.zeros((len(self.countries) + 7) // 8, dtype=np.uint8)
+        return packed
+
+    def match(self, conditions) -> np.ndarray:
+        """(前後, 属性, 値) の条件を全て満たす国のマスク（条件なしなら全ての国）"""
+        packed = np.full((len(self.countries) + 7) // 8, 0xFF, dtype=np.uint8)
+        for side, attribute, value in conditions:
+            packed &= self._bits(side, attribute, value)
+        return np.unpackbits(packed, count=len(self.countries)).astype(bool)
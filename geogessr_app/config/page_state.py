@@ -0,0 +1,20 @@
+# config/page_state.py
+
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class PageState:
+    """ページ全体の再実行で決まり、フラグメントが読み取るだけの共有状態
+
+    フラグメントだけが再実行されたときは、直前のページ全体の実行で渡された値がそのまま使われる。
+    """
+
+    # サイドバーで選択した表示フィールド（表示名とフィールドパス）
+    selected_field: str
+    content_field: str
+    # 文字フィルター（選択した文字と、それを全て使う言語）
+    selected_chars: tuple[str, ...]
+    matching_langs: frozenset[str]
+    # 数値フィールドの分布（凡例と背景色で共有、数値でなければ None）
+    numeric_percentiles: dict | None = None
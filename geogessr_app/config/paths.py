@@ -0,0 +1,40 @@
+# config/paths.py
+
+import os
+from pathlib import Path
+
+# リポジトリのルート（geo_data.yaml や data/ がある場所）
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+GEO_DATA_PATH = Path(os.environ.get("GEO_DATA_PATH", REPO_ROOT / "geo_data.yaml"))
+DATA_DIR = REPO_ROOT / "data"
+SHARD_DIR = DATA_DIR / "shards"
+
+# データの配置方法: "monolithic"（geo_data.yaml）または "sharded"（SHARD_DIR）
+DATA_LAYOUT = os.environ.get("GEO_DATA_LAYOUT", "monolithic")
+
+# 旗の SVG（国ごとのファイル）と、それをまとめたスプライト（ビルド手順で作成）
+FLAG_DIR = DATA_DIR / "flags"
+FLAG_SPRITE_PATH = DATA_DIR / "flag_sprite.svg"
+
+# 国境ポリゴン（GeoJSON、コロプレス表示用・任意）と生成物のキャッシュ
+BOUNDARY_PATH = DATA_DIR / "boundaries.geojson"
+CACHE_DIR = DATA_DIR / ".cache"
+
+# 列データの共有ファイル（複数のワーカープロセスで読み取り専用にメモリマップする）
+SHARED_DATASET_DIR = CACHE_DIR / "shared"
+# "attach" のときは共有ファイルだけを読み、YAML は解析しない（"off" なら各プロセスで読み込む）
+SHARED_DATASET_MODE = os.environ.get("GEO_SHARED_DATASET", "off")
+
+# 背景地図: "osm"（インターネットの OpenStreetMap）または "mbtiles"（ローカルのタイル）
+BASE_TILES = os.environ.get("GEO_BASE_TILES", "osm")
+# オフライン用のタイル（MBTiles / SQLite）と、それを配信する tile_server の URL
+MBTILES_PATH = Path(os.environ.get("GEO_MBTILES_PATH", DATA_DIR / "basemap.mbtiles"))
+TILE_SERVER_URL = os.environ.get("GEO_TILE_SERVER_URL", "http://127.0.0.1:8766")
+
+# /metrics（Prometheus のテキスト形式）を配信するアドレス（ポート 0 なら配信しない）
+METRICS_HOST = os.environ.get("GEO_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("GEO_METRICS_PORT", "9464"))
+
+# "on" のとき tracemalloc で再実行の処理段階ごとのメモリ使用量を集計する（計測の分だけ遅くなる）
+MEMORY_PROFILE = os.environ.get("GEO_MEMORY_PROFILE", "off")
@@ -0,0 +1,217 @@
+# config/query_api.py
+
+import asyncio
+import gzip
+import hashlib
+import json
+from functools import partial
+from typing import Callable
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from config.dataset_store import DatasetStore, create_dataset_store
+from config.field_columns import get_field_column
+from config.field_config import EXPRESSION_FIELDS, FILTERABLE_FIELDS, field_options
+from config.filter_expressions import (
+    FilterSyntaxError,
+    combine,
+    evaluate_expression,
+    expression_fields,
+    parse_expression,
+    rows_to_expression,
+)
+from config.http_server import AsyncHttpServer, ResponseCache
+from config.similarity import cached_similarity_index
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+
+class ApiError(Exception):
+    """HTTPエラーとして返す例外"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def resolve_field(name: str) -> str:
+    """フィールドパス（"tld"、"#dynamic_street_terms"）または表示名を解決"""
+    if name in field_options:
+        return field_options[name]
+    if name in field_options.values() or name in FILTERABLE_FIELDS:
+        return name
+    # ナンバープレートの属性など、列を持つ式専用のフィールドも値を返せる
+    if EXPRESSION_FIELDS.get(name, ("",))[0] == "plate":
+        return name
+    raise ApiError(404, f"unknown field: {name}")
+
+
+def parse_filters(raw_filters: list[str]) -> list[dict]:
+    """ "field:match:value" 形式のフィルターを Streamlit 版と同じ辞書形式に変換"""
+    filters = []
+    for raw in raw_filters:
+        parts = raw.split(":", 2)
+        if len(parts) != 3:
+            raise ApiError(400, f"filter must be field:match:value, got {raw!r}")
+        field_path, match_type, value = parts
+        filters.append({"field": field_path, "match": match_type, "value": value})
+    return filters
+
+
+def parse_query_expression(query: dict) -> tuple[list[dict], object]:
+    """filter パラメーター（AND）と expr パラメーター（フィルター式）を1つの式にまとめる
+
+    (filter の辞書のリスト, 式) を返す。
+    """
+    filters = parse_filters(query.get("filter", []))
+    try:
+        expression = combine(
+            rows_to_expression(filters),
+            *(parse_expression(text) for text in query.get("expr", [])),
+        )
+    except FilterSyntaxError as e:
+        raise ApiError(400, str(e)) from None
+    return filters, expression
+
+
+class QueryApi(AsyncHttpServer):
+    """フィールド値・フィルター結果を JSON で返すローカル HTTP サービス"""
+
+    def __init__(self, store: DatasetStore | None = None, cache_size: int = 512):
+        self.store = store or create_dataset_store()
+        self.cache = ResponseCache(cache_size)
+
+    # ---- エンドポイント ----
+
+    def countries(self, data: dict, query: dict) -> dict:
+        return {
+            "countries": [
+                {"name": country, "latlng": info.get("latlng")}
+                for country, info in data.items()
+            ]
+        }
+
+    def field(self, data: dict, query: dict, name: str) -> dict:
+        field_path = resolve_field(name)
+        column = get_field_column(self.store, field_path)
+        return {
+            "field": field_path,
+            "values": dict(zip(column.countries, column.raw)),
+        }
+
+    def query(self, data: dict, query: dict, filters: list[dict], expression) -> dict:
+        countries = tuple(data)
+        mask, _ = evaluate_expression(
+            self.store, expression, countries, special=self.special(data, expression)
+        )
+        matches = [country for country, passed in zip(countries, mask) if passed]
+        return {
+            "filters": filters,
+            "expression": None if expression is None else str(expression),
+            "count": len(matches),
+            "countries": matches,
+        }
+
+    def special(self, data: dict, expression) -> dict:
+        """列を持たない条件（国名で指定する条件）の評価関数（未対応なら 400）"""
+        special = {}
+        for field_path in expression_fields(expression):
+            if EXPRESSION_FIELDS.get(field_path, ("",))[0] != "country":
+                continue
+            if field_path != "#similar_to":
+                raise ApiError(400, f"unsupported field in query: {field_path}")
+            index = cached_similarity_index(self.store)
+            # 空欄は全ての国（Streamlit 版と同じ）
+            special[field_path] = lambda value: (
+                index.similar_to(value) if value.strip() else set(data)
+            )
+        return special
+
+    def route(self, path: str, query: dict) -> tuple[list[str], Callable]:
+        """パスに対応する (読み込むフィールド, data と query を受け取るハンドラー)"""
+        if path == "/countries":
+            return [], self.countries
+        if path.startswith("/field/") and len(path) > len("/field/"):
+            name = unquote(path[len("/field/") :])
+            return [resolve_field(name)], partial(self.field, name=name)
+        if path == "/query":
+            # 式は1回だけパースし、読み込むフィールドの決定と評価の両方に使う
+            filters, expression = parse_query_expression(query)
+            handler = partial(self.query, filters=filters, expression=expression)
+            return sorted(expression_fields(expression)), handler
+        raise ApiError(404, f"not found: {path}")
+
+    # ---- HTTP ----
+
+    def respond(self, method: str, target: str, headers: dict) -> tuple:
+        """(ステータス, ヘッダー, ボディ) を返す"""
+        if method not in ("GET", "HEAD"):
+            return self._error(405, f"method not allowed: {method}")
+
+        self.store.refresh()
+        url = urlsplit(target)
+        query = parse_qs(url.query, keep_blank_values=True)
+        use_gzip = "gzip" in headers.get("accept-encoding", "")
+        canonical_query = tuple(sorted((k, tuple(v)) for k, v in query.items()))
+        try:
+            fields, handler = self.route(url.path, query)
+        except ApiError as e:
+            return self._error(e.status, e.message)
+        # シャード構成ではフィールドの読み込みでバージョンが変わるため、読み込んだ後の
+        # data とバージョンを同じ時点の組で使う
+        self.store.ensure_fields(fields)
+        data, version, _ = self.store.snapshot()
+        key = (version, url.path, canonical_query, use_gzip)
+
+        entry = self.cache.get(key)
+        if entry is None:
+            try:
+                payload = {"version": version, **handler(data, query)}
+            except ApiError as e:
+                return self._error(e.status, e.message)
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            # ETag はデータバージョン + リクエスト内容（gzip 版は別の表現として区別）
+            digest = hashlib.sha1(repr((url.path, canonical_query)).encode("utf-8"))
+            etag = '"{}-{}{}"'.format(
+                version, digest.hexdigest()[:12], "-gz" if use_gzip else ""
+            )
+            if use_gzip:
+                body = gzip.compress(body, compresslevel=6)
+            entry = (etag, body)
+            self.cache.put(key, entry)
+
+        etag, body = entry
+        response_headers = {
+            "Content-Type": "application/json; charset=utf-8",
+            "ETag": etag,
+            "Cache-Control": "no-cache",
+            "Vary": "Accept-Encoding",
+        }
+        if headers.get("if-none-match") == etag:
+            return 304, response_headers, b""
+        if use_gzip:
+            response_headers["Content-Encoding"] = "gzip"
+        return 200, response_headers, body
+
+    def _error(self, status: int, message: str) -> tuple:
+        body = json.dumps({"error": message}).encode("utf-8")
+        return status, {"Content-Type": "application/json; charset=utf-8"}, body
+
+    async def serve(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+        await super().serve(host, port)
+
+
+if __name__ == "__main__":
+    # cd geogessr_app && python -m config.query_api [--port 8765]
+    import argparse
+
+    parser = argparse.ArgumentParser(description="ローカル JSON クエリ API")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+
+    api = QueryApi()
+    api.store.start_watcher()
+    print(f"serving on http://{args.host}:{args.port} (version {api.store.version})")
+    asyncio.run(api.serve(args.host, args.port))
@@ -0,0 +1,133 @@
+# config/query_api_loadtest.py
+
+import asyncio
+import random
+import time
+
+import numpy as np
+
+from config.query_api import DEFAULT_HOST, DEFAULT_PORT
+
+# 負荷試験で投げるリクエスト（実運用でよく使われる組み合わせ）
+DEFAULT_PATHS = [
+    "/countries",
+    "/field/tld",
+    "/field/language",
+    "/field/gdp_per_capita",
+    "/field/%23dynamic_street_terms",
+    "/query?filter=language:contains:Spanish",
+    "/query?filter=tld:equals:.br",
+    "/query?filter=language:contains:English&filter=gdp_per_capita:contains:1",
+]
+
+
+async def _request(reader, writer, host: str, path: str, use_gzip: bool) -> int:
+    headers = f"GET {path} HTTP/1.1\r\nHost: {host}\r\n"
+    if use_gzip:
+        headers += "Accept-Encoding: gzip\r\n"
+    writer.write((headers + "\r\n").encode("latin-1"))
+    await writer.drain()
+
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("connection closed")
+    status = int(status_line.split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value.strip())
+    if length:
+        await reader.readexactly(length)
+    return status
+
+
+async def _client(host, port, paths, deadline, latencies, errors, use_gzip, seed):
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while time.perf_counter() < deadline:
+            path = rng.choice(paths)
+            started = time.perf_counter()
+            status = await _request(reader, writer, host, path, use_gzip)
+            latencies.append(time.perf_counter() - started)
+            if status >= 400:
+                errors.append((path, status))
+    finally:
+        writer.close()
+
+
+async def run_load_test(
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    concurrency: int = 20,
+    duration: float = 10.0,
+    paths: list[str] | None = None,
+    use_gzip: bool = True,
+) -> dict:
+    """同時接続数 concurrency で duration 秒間リクエストを送り、結果を集計"""
+    latencies = []
+    errors = []
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(
+        *(
+            _client(
+                host,
+                port,
+                paths or DEFAULT_PATHS,
+                deadline,
+                latencies,
+                errors,
+                use_gzip,
+                seed,
+            )
+            for seed in range(concurrency)
+        )
+    )
+    elapsed = time.perf_counter() - started
+    values = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": float(values.max()),
+    }
+
+
+if __name__ == "__main__":
+    # 先にサーバーを起動: cd geogessr_app && python -m config.query_api
+    # cd geogessr_app && python -m config.query_api_loadtest -c 50 -d 10
+    import argparse
+
+    parser = argparse.ArgumentParser(description="クエリ API の負荷試験")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("-c", "--concurrency", type=int, default=20)
+    parser.add_argument("-d", "--duration", type=float, default=10.0)
+    parser.add_argument("--no-gzip", action="store_true")
+    args = parser.parse_args()
+
+    result = asyncio.run(
+        run_load_test(
+            args.host,
+            args.port,
+            args.concurrency,
+            args.duration,
+            use_gzip=not args.no_gzip,
+        )
+    )
+    print(
+        f"requests: {result['requests']} ({result['errors']} errors), "
+        f"throughput: {result['throughput']:.0f} req/s"
+    )
+    print(
+        f"latency p50 {result['p50_ms']:.2f} ms, p95 {result['p95_ms']:.2f} ms, "
+        f"p99 {result['p99_ms']:.2f} ms, max {result['max_ms']:.2f} ms"
+    )
@@ -0,0 +1,172 @@
+# config/shards.py
+
+import hashlib
+from pathlib import Path
+
+import yaml
+
+from config.data_processor import DataProcessor
+from config.dataset_store import MEMBERSHIP_FIELD, DatasetStore
+from config.field_config import FIELD_GROUPS
+from config.paths import GEO_DATA_PATH, SHARD_DIR
+from config.yaml_blocks import country_info
+
+CORE_GROUP = "core"
+
+
+def group_for_key(key: str) -> str:
+    """トップレベルのキーが属するシャード（未定義のキーは core）"""
+    for group, keys in FIELD_GROUPS.items():
+        if key in keys:
+            return group
+    return CORE_GROUP
+
+
+def groups_for_fields(field_paths) -> set[str]:
+    """フィールドパス（動的フィールドを含む）の読み込みに必要なシャード"""
+    groups = {CORE_GROUP}
+    for field_path in field_paths:
+        for key in DataProcessor.field_dependencies(field_path):
+            groups.add(group_for_key(key))
+    return groups
+
+
+def shard_path(shard_dir: Path, group: str) -> Path:
+    return Path(shard_dir) / f"{group}.yaml"
+
+
+class ShardedDatasetStore(DatasetStore):
+    """フィールドグループごとのシャードを必要になった時点で読み込むストア
+
+    読み込み済みのシャードはそれぞれ DatasetStore として変更を監視し、
+    各国のデータは読み込み済みシャードの内容をマージした辞書になる。
+    """
+
+    def __init__(self, shard_dir: Path | str = SHARD_DIR):
+        self._shards = {}
+        super().__init__(shard_dir)
+
+    @property
+    def loaded_groups(self) -> set[str]:
+        return set(self._shards)
+
+    def ensure_fields(self, field_paths) -> dict[str, set[str]]:
+        return self.ensure_groups(groups_for_fields(field_paths))
+
+    def ensure_groups(self, groups) -> dict[str, set[str]]:
+        """未読み込みのシャードを読み込み、追加された (国 → フィールド) を返す"""
+        with self._lock:
+            missing = [
+                group
+                for group in groups
+                if group not in self._shards and shard_path(self.path, group).exists()
+            ]
+            if not missing:
+                return {}
+            changes = {}
+            for group in missing:
+                shard = DatasetStore(shard_path(self.path, group))
+                self._shards[group] = shard
+                for country, info in shard.data.items():
+                    changes.setdefault(country, set()).update(info)
+            return self._merge(changes)
+
+    def refresh(self) -> dict[str, set[str]]:
+        with self._lock:
+            if CORE_GROUP not in self._shards:
+                return self.ensure_groups({CORE_GROUP})
+            changes = {}
+            for shard in self._shards.values():
+                for country, fields in shard.refresh().items():
+                    changes.setdefault(country, set()).update(fields)
+            return self._merge(changes) if changes else {}
+
+    def _merge(self, changes: dict[str, set[str]]) -> dict[str, set[str]]:
+        """変更のあった国だけシャードの内容をマージし直し、キャッシュを無効化"""
+        core = self._shards[CORE_GROUP].data
+        new_data = {}
+        for country in core:
+            if country in changes or country not in self.data:
+                merged = {}
+                for shard in self._shards.values():
+                    merged.update(shard.data.get(country) or {})
+                # 単一ファイル版と同じ Country レコード（キーはアルファベット順）にする
+                new_data[country] = self._record(country, merged)
+            else:
+                new_data[country] = self.data[country]
+
+        # core から消えた国、core に追加された国は全キャッシュに影響
+        for country in self.data.keys() ^ new_data.keys():
+            changes.setdefault(country, set()).add(MEMBERSHIP_FIELD)
+        changes = {
+            country: fields
+            for country, fields in changes.items()
+            if country in new_data or country in self.data
+        }
+
+        if list(new_data) != list(self.data):
+            self.order_version += 1
+        self.data = new_data
+        self.version = hashlib.sha1(
+            "|".join(
+                f"{group}:{shard.version}"
+                for group, shard in sorted(self._shards.items())
+            ).encode("utf-8")
+        ).hexdigest()[:12]
+        self.reload_count += 1
+        for cache in self._caches.values():
+            cache.invalidate(changes)
+        return changes
+
+
+def split_dataset(
+    data_path: Path = GEO_DATA_PATH, shard_dir: Path = SHARD_DIR
+) -> dict[str, int]:
+    """geo_data.yaml をフィールドグループごとのシャードに分割（グループ → 国数）"""
+    with open(data_path, "r", encoding="utf-8") as f:
+        data = yaml.safe_load(f)
+
+    shards = {group: {} for group in FIELD_GROUPS}
+    for country, info in (data or {}).items():
+        # core には全ての国を入れ、国の一覧と順序を保持する
+        shards[CORE_GROUP][country] = {}
+        for key, value in country_info(country, info).items():
+            shards[group_for_key(key)].setdefault(country, {})[key] = value
+
+    Path(shard_dir).mkdir(parents=True, exist_ok=True)
+    for group, shard in shards.items():
+        with open(shard_path(shard_dir, group), "w", encoding="utf-8") as f:
+            yaml.safe_dump(shard, f, allow_unicode=True, sort_keys=False)
+    return {group: len(shard) for group, shard in shards.items()}
+
+
+def join_shards(shard_dir: Path = SHARD_DIR, data_path: Path = GEO_DATA_PATH) -> int:
+    """シャードを結合して geo_data.yaml 形式に戻す（国数を返す）"""
+    store = ShardedDatasetStore(shard_dir)
+    store.ensure_groups(FIELD_GROUPS)
+    with open(data_path, "w", encoding="utf-8") as f:
+        yaml.safe_dump(
+            {country: info.to_dict() for country, info in store.data.items()},
+            f,
+            allow_unicode=True,
+            sort_keys=True,
+        )
+    return len(store.data)
+
+
+if __name__ == "__main__":
+    # cd geogessr_app && python -m config.shards split|join [--data PATH] [--shards DIR]
+    import argparse
+
+    parser = argparse.ArgumentParser(description="geo_data.yaml とシャードの相互変換")
+    parser.add_argument("command", choices=["split", "join"])
+    parser.add_argument("--data", default=str(GEO_DATA_PATH))
+    parser.add_argument("--shards", default=str(SHARD_DIR))
+    args = parser.parse_args()
+
+    if args.command == "split":
+        for group, count in split_dataset(Path(args.data), Path(args.shards)).items():
+            print(f"{group}: {count} countries")
+    else:
+        count = join_shards(Path(args.shards), Path(args.data))
+        print(f"joined {count} countries into {args.data}")
@@ -0,0 +1,479 @@
+# config/shared_dataset.py
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from collections.abc import Mapping
+from pathlib import Path
+
+import numpy as np
+
+from config.country_record import Country, to_plain
+from config.dataset_store import MEMBERSHIP_FIELD, DatasetStore, mark_reordered
+from config.field_columns import FieldColumn, materialize_field
+from config.field_config import FIELD_GROUPS, FILTERABLE_FIELDS, field_options
+from config.paths import SHARED_DATASET_DIR
+
+MANIFEST_NAME = "manifest.json"
+# ファイル構成の版（変えたら上げる。違う版の manifest には接続しない）
+FORMAT_VERSION = 2
+
+# 値の種類（lowered 列の復元に使用）
+_KIND_NONE, _KIND_TEXT, _KIND_LIST = 0, 1, 2
+# リストの要素を1つの文字列にまとめるときの区切り文字
+_LIST_SEPARATOR = "\x1f"
+
+
+def published_fields() -> list[str]:
+    """共有ファイルに書き出すフィールド（表示フィールドとフィルター可能なフィールド）"""
+    fields = dict.fromkeys(field_options.values())
+    fields.update(dict.fromkeys(FILTERABLE_FIELDS))
+    return list(fields)
+
+
+def _json_default(value):
+    """レコードは辞書に、それ以外の JSON にない型（日付など）は文字列にする"""
+    return to_plain(value) if isinstance(value, Mapping) else str(value)
+
+
+class StringTable:
+    """UTF-8 のバイト列とオフセットの配列で表した読み取り専用の文字列の列"""
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+
+    @staticmethod
+    def encode(values: list[str]) -> tuple[np.ndarray, np.ndarray]:
+        encoded = [v.encode("utf-8") for v in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(b) for b in encoded])
+        blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        return blob, offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return (
+            self.blob[self.offsets[i] : self.offsets[i + 1]].tobytes().decode("utf-8")
+        )
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+class _DecodedSequence:
+    """StringTable の各要素を読み出すときに変換する列（全体を展開しない）"""
+
+    def __init__(self, table: StringTable, decode):
+        self.table = table
+        self.decode = decode
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def __getitem__(self, i: int):
+        return self.decode(i, self.table[i])
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+class SharedFieldColumn(FieldColumn):
+    """共有ファイル上の配列を参照する列（値の索引で一致判定を行う）"""
+
+    def __init__(self, dataset: "SharedDataset", field_path: str, prefix: str):
+        arrays = dataset.arrays
+        kinds = arrays[f"{prefix}.kind"]
+
+        def decode_raw(i, text):
+            return json.loads(text)
+
+        def decode_lowered(i, text):
+            if kinds[i] == _KIND_NONE:
+                return None
+            if kinds[i] == _KIND_LIST:
+                return tuple(text.split(_LIST_SEPARATOR)) if text else ()
+            return text
+
+        super().__init__(
+            field_path=field_path,
+            countries=dataset.countries,
+            raw=_DecodedSequence(dataset.table(f"{prefix}.raw"), decode_raw),
+            display=dataset.table(f"{prefix}.display"),
+            valid=arrays[f"{prefix}.valid"],
+            numeric=arrays[f"{prefix}.numeric"],
+            lowered=_DecodedSequence(
+                dataset.table(f"{prefix}.lowered"), decode_lowered
+            ),
+            positions=dataset.positions,
+        )
+        object.__setattr__(self, "ranks", arrays[f"{prefix}.rank"])
+        object.__setattr__(self, "_index_values", dataset.table(f"{prefix}.index"))
+        object.__setattr__(self, "_index_rows", arrays[f"{prefix}.index_rows"])
+        object.__setattr__(self, "_index_offsets", arrays[f"{prefix}.index_offsets"])
+
+    def _index_rows_for(self, value_index: int) -> np.ndarray:
+        start, end = self._index_offsets[value_index : value_index + 2]
+        return self._index_rows[start:end]
+
+    def matches(
+        self, match_type: str, filter_value: str, candidates: np.ndarray | None = None
+    ) -> np.ndarray:
+        """値 → 国の番号の索引を使って FieldColumn.matches と同じ判定を行う"""
+        needle = filter_value.lower()
+        mask = np.zeros(len(self.countries), dtype=bool)
+        for i, value in enumerate(self._index_values):
+            if (match_type == "equals" and value == needle) or (
+                match_type == "contains" and needle in value
+            ):
+                mask[self._index_rows_for(i)] = True
+        return mask if candidates is None else mask[candidates]
+
+
+class SharedDataset:
+    """読み込み専用でメモリマップした共有データセット
+
+    ページキャッシュを全てのワーカープロセスで共有するため、プロセスを増やしても
+    国ごとのデータ（JSON）と列データ（表示・フィルター用の列、順位、値の索引、latlng）の
+    メモリは増えない。ワーカーは AttachedDatasetStore でこれだけを読み、YAML は解析しない。
+    類似度の索引やプレートの属性索引などの列以外の派生キャッシュは、使われたときに
+    各プロセスで作る。
+    """
+
+    def __init__(self, directory: Path, manifest: dict):
+        self.directory = Path(directory)
+        self.manifest = manifest
+        self.version = manifest["version"]
+        self.fields = manifest["fields"]
+        data_dir = self.directory / manifest["path"]
+        self.arrays = {
+            name: np.load(data_dir / f"{name}.npy", mmap_mode="r")
+            for name in manifest["arrays"]
+        }
+        self.countries = tuple(self.table("countries"))
+        self.positions = {country: i for i, country in enumerate(self.countries)}
+        self.latlng = self.arrays["latlng"]
+        self._columns = {}
+
+    @classmethod
+    def attach(cls, directory: Path = SHARED_DATASET_DIR) -> "SharedDataset | None":
+        manifest_path = Path(directory) / MANIFEST_NAME
+        if not manifest_path.exists():
+            return None
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        if manifest.get("format") != FORMAT_VERSION:
+            return None
+        return cls(directory, manifest)
+
+    def table(self, name: str) -> StringTable:
+        return StringTable(self.arrays[f"{name}.blob"], self.arrays[f"{name}.offsets"])
+
+    def column(self, field_path: str) -> SharedFieldColumn | None:
+        prefix = self.fields.get(field_path)
+        if prefix is None:
+            return None
+        if field_path not in self._columns:
+            self._columns[field_path] = SharedFieldColumn(self, field_path, prefix)
+        return self._columns[field_path]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in self.arrays.values())
+
+
+def _percentile_ranks(numeric: np.ndarray) -> np.ndarray:
+    """数値の列の各値が全体の何割より大きいか（0〜1、値がない場合は NaN）"""
+    present = np.sort(numeric[~np.isnan(numeric)])
+    ranks = np.full(len(numeric), np.nan, dtype=np.float32)
+    if len(present):
+        mask = ~np.isnan(numeric)
+        ranks[mask] = np.searchsorted(present, numeric[mask], side="left") / len(
+            present
+        )
+    return ranks
+
+
+def _column_arrays(column: FieldColumn, prefix: str) -> dict[str, np.ndarray]:
+    arrays = {}
+
+    def add_table(name, values):
+        arrays[f"{name}.blob"], arrays[f"{name}.offsets"] = StringTable.encode(values)
+
+    kinds = np.array(
+        [
+            (
+                _KIND_NONE
+                if v is None
+                else _KIND_LIST if isinstance(v, tuple) else _KIND_TEXT
+            )
+            for v in column.lowered
+        ],
+        dtype=np.int8,
+    )
+    add_table(
+        f"{prefix}.lowered",
+        [
+            _LIST_SEPARATOR.join(v) if isinstance(v, tuple) else (v or "")
+            for v in column.lowered
+        ],
+    )
+    add_table(
+        f"{prefix}.raw",
+        [json.dumps(v, ensure_ascii=False, default=str) for v in column.raw],
+    )
+    add_table(f"{prefix}.display", list(column.display))
+    arrays[f"{prefix}.kind"] = kinds
+    arrays[f"{prefix}.valid"] = np.asarray(column.valid, dtype=bool)
+    arrays[f"{prefix}.numeric"] = np.asarray(column.numeric, dtype=np.float64)
+    arrays[f"{prefix}.rank"] = _percentile_ranks(column.numeric)
+
+    # フィルター用の索引: 値（リストは要素ごと）→ その値を持つ国の番号。値ごとの国の番号を
+    # 1本の配列に連結し、値ごとの開始位置を持つ（大きさは値の出現数に比例）
+    postings = {}
+    for row, value in enumerate(column.lowered):
+        if value is None:
+            continue
+        for v in set(value) if isinstance(value, tuple) else (value,):
+            postings.setdefault(v, []).append(row)
+    values = sorted(postings)
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(postings[v]) for v in values])
+    add_table(f"{prefix}.index", values)
+    arrays[f"{prefix}.index_rows"] = np.fromiter(
+        (row for v in values for row in postings[v]), dtype=np.int32, count=offsets[-1]
+    )
+    arrays[f"{prefix}.index_offsets"] = offsets
+    return arrays
+
+
+def publish_dataset(store, directory: Path = SHARED_DATASET_DIR) -> dict:
+    """ストアの国ごとのデータと列データを共有ファイルに書き出し、manifest を差し替える
+
+    データはバージョンごとのディレクトリに書き、最後に manifest を置き換えるため、
+    ワーカーは書き込み途中のファイルを読むことはない。
+    """
+    directory = Path(directory)
+    fields = published_fields()
+    # 国ごとのデータは全てのフィールドを書き出す（ワーカーは YAML を読まない）
+    store.ensure_fields(
+        fields + [key for group in FIELD_GROUPS.values() for key in group]
+    )
+    data = store.data
+    countries = list(data)
+
+    arrays = {}
+    arrays["countries.blob"], arrays["countries.offsets"] = StringTable.encode(
+        countries
+    )
+    records = [
+        json.dumps(info, ensure_ascii=False, sort_keys=True, default=_json_default)
+        for info in data.values()
+    ]
+    arrays["records.blob"], arrays["records.offsets"] = StringTable.encode(records)
+    # ワーカーが付け替えのときに変更された国だけを比較するためのハッシュ
+    arrays["records.hash.blob"], arrays["records.hash.offsets"] = StringTable.encode(
+        [hashlib.sha1(record.encode("utf-8")).hexdigest()[:16] for record in records]
+    )
+    arrays["latlng"] = np.array(
+        [
+            (
+                info["latlng"][:2]
+                if isinstance(info.get("latlng"), (list, tuple))
+                and len(info["latlng"]) >= 2
+                else (np.nan, np.nan)
+            )
+            for info in data.values()
+        ],
+        dtype=np.float64,
+    ).reshape(-1, 2)
+
+    prefixes = {}
+    for i, field_path in enumerate(fields):
+        prefixes[field_path] = f"f{i}"
+        arrays.update(_column_arrays(materialize_field(data, field_path), f"f{i}"))
+
+    # 同じデータでもファイル構成の版が違えば別のディレクトリに書く
+    path = f"{store.version}-v{FORMAT_VERSION}"
+    version_dir = directory / path
+    tmp_dir = directory / f".{path}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    for name, array in arrays.items():
+        np.save(tmp_dir / f"{name}.npy", array)
+    if version_dir.exists():
+        shutil.rmtree(tmp_dir)
+    else:
+        os.replace(tmp_dir, version_dir)
+
+    manifest = {
+        "format": FORMAT_VERSION,
+        "version": store.version,
+        "path": path,
+        "rows": len(countries),
+        "fields": prefixes,
+        "arrays": sorted(arrays),
+    }
+    manifest_tmp = directory / f".{MANIFEST_NAME}.tmp"
+    manifest_tmp.write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+    os.replace(manifest_tmp, directory / MANIFEST_NAME)
+    _remove_old_versions(directory, keep={path})
+    return manifest
+
+
+def _remove_old_versions(directory: Path, keep: set[str], keep_latest: int = 2):
+    """古いバージョンのディレクトリを削除（直近のものは接続中のワーカーのために残す）"""
+    versions = sorted(
+        (p for p in directory.iterdir() if p.is_dir() and not p.name.startswith(".")),
+        key=lambda p: p.stat().st_mtime,
+        reverse=True,
+    )
+    for path in versions[keep_latest:]:
+        if path.name not in keep:
+            # Windows ではマップ中のファイルは削除できないので次回に回す
+            shutil.rmtree(path, ignore_errors=True)
+
+
+class SharedRecords(Mapping):
+    """共有ファイル上の国ごとのデータ（JSON）を、読み出すときに Country に戻す読み取り専用の対応表
+
+    解析済みのレコードはプロセス内に保持しないため、読み出すたびに新しいレコードになる。
+    """
+
+    def __init__(self, dataset: SharedDataset):
+        self.dataset = dataset
+        self._records = dataset.table("records")
+
+    def __getitem__(self, country: str) -> Country:
+        record = self._records[self.dataset.positions[country]]
+        return Country.from_dict(country, json.loads(record))
+
+    def __contains__(self, country) -> bool:
+        return country in self.dataset.positions
+
+    def __iter__(self):
+        return iter(self.dataset.countries)
+
+    def __len__(self) -> int:
+        return len(self.dataset.countries)
+
+
+class AttachedDatasetStore(DatasetStore):
+    """読み込み役のプロセスが公開した共有ファイルだけを読むストア（ワーカー用）
+
+    YAML は解析せず、data は共有ファイル上の国ごとの JSON を読み出すときに Country に戻す。
+    manifest が差し替えられたら新しいバージョンに付け替え、JSON のハッシュが変わった国の
+    フィールドの差分で派生キャッシュを無効化する。
+    """
+
+    def __init__(self, directory: Path | str = SHARED_DATASET_DIR):
+        self.shared = None
+        self._record_hashes = {}
+        super().__init__(directory)
+
+    def refresh(self) -> dict[str, set[str]]:
+        """manifest が更新されていれば付け替え、(国 → 変更フィールド) を返す"""
+        try:
+            stat = (self.path / MANIFEST_NAME).stat()
+        except FileNotFoundError:
+            return {}
+        stat_key = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            if stat_key == self._stat:
+                return {}
+            try:
+                dataset = SharedDataset.attach(self.path)
+            except (OSError, ValueError, KeyError):
+                # 公開の途中などで読めない場合は次回に読み直す
+                return {}
+            self._stat = stat_key
+            if dataset is None or (
+                self.shared is not None and dataset.version == self.shared.version
+            ):
+                return {}
+            return self._attach(dataset)
+
+    def _attach(self, dataset: SharedDataset) -> dict[str, set[str]]:
+        old_data = self.data
+        new_data = SharedRecords(dataset)
+        new_hashes = dict(zip(dataset.countries, dataset.table("records.hash")))
+        changes = {}
+
+        for country, record_hash in new_hashes.items():
+            old_hash = self._record_hashes.get(country)
+            if old_hash == record_hash:
+                continue
+            info = new_data[country]
+            if old_hash is None:
+                changes[country] = set(info) | {MEMBERSHIP_FIELD}
+                continue
+            old_info = old_data[country]
+            changed = {
+                key
+                for key in set(info) | set(old_info)
+                if info.get(key) != old_info.get(key)
+            }
+            if changed:
+                changes[country] = changed
+
+        for country in self._record_hashes.keys() - new_hashes.keys():
+            changes[country] = set(old_data[country]) | {MEMBERSHIP_FIELD}
+
+        if mark_reordered(list(self._record_hashes), list(new_hashes), changes):
+            self.order_version += 1
+        self.shared = dataset
+        self.data = new_data
+        self._record_hashes = new_hashes
+        self.version = dataset.version
+        self.reload_count += 1
+        for cache in self._caches.values():
+            cache.invalidate(changes)
+        return changes
+
+
+if __name__ == "__main__":
+    # 読み込み役のプロセス: cd geogessr_app && python -m config.shared_dataset publish --watch 1
+    # ワーカー: GEO_SHARED_DATASET=attach streamlit run geogessr_app/geogessr_app.py
+    import argparse
+
+    from config.dataset_store import create_dataset_store
+
+    parser = argparse.ArgumentParser(description="列データの共有ファイルを作成・確認")
+    parser.add_argument("command", choices=["publish", "info"])
+    parser.add_argument("--dir", default=str(SHARED_DATASET_DIR))
+    parser.add_argument(
+        "--watch",
+        type=float,
+        default=0,
+        help="指定した秒間隔でデータの変更を監視して再公開する",
+    )
+    args = parser.parse_args()
+
+    if args.command == "info":
+        dataset = SharedDataset.attach(Path(args.dir))
+        if dataset is None:
+            raise SystemExit(f"no shared dataset in {args.dir}")
+        print(
+            f"version {dataset.version}: {len(dataset.countries)} countries, "
+            f"{len(dataset.fields)} fields, {dataset.nbytes / 1024:.1f} KB mapped"
+        )
+    else:
+        # 読み込み役は GEO_SHARED_DATASET の設定に関係なく元のデータを読む
+        store = create_dataset_store(attach=False)
+        published = None
+        while True:
+            store.refresh()
+            if store.version != published:
+                manifest = publish_dataset(store, Path(args.dir))
+                published = store.version
+                print(
+                    f"published {manifest['version']}: {manifest['rows']} countries, "
+                    f"{len(manifest['fields'])} fields"
+                )
+            if not args.watch:
+                break
+            time.sleep(args.watch)
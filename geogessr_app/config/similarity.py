@@ -0,0 +1,165 @@
+# config/similarity.py
+
+import json
+from collections.abc import Mapping
+
+import numpy as np
+
+from config.country_record import to_plain
+
+# 類似度の計算に使う特徴量と重み（language は Jaccard 係数、他は完全一致）
+SIMILARITY_WEIGHTS = {
+    "language": 3.0,
+    "number_plate_config": 2.0,
+    "crosswalk_stripes": 1.0,
+    "camera": 1.0,
+    "sign_back": 1.0,
+    "tld": 0.5,
+}
+
+# 「似ている国」として扱う上位件数
+SIMILAR_TO_TOP_K = 5
+
+
+def _categorical_codes(values: list) -> np.ndarray:
+    """値をカテゴリ番号に変換（欠損は -1）"""
+    codes = {}
+    result = np.full(len(values), -1, dtype=np.int32)
+    for i, value in enumerate(values):
+        if value is None or value == "" or (isinstance(value, Mapping) and not value):
+            continue
+        if isinstance(value, (Mapping, list, tuple)):
+            value = json.dumps(
+                value, sort_keys=True, ensure_ascii=False, default=to_plain
+            )
+        result[i] = codes.setdefault(value, len(codes))
+    return result
+
+
+def _postings(codes: np.ndarray) -> list[np.ndarray]:
+    """カテゴリ番号ごとの国の番号の配列（転置リスト、欠損の国は含めない）"""
+    n_codes = int(codes.max()) + 1 if len(codes) else 0
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(n_codes + 1))
+    return [order[bounds[c] : bounds[c + 1]] for c in range(n_codes)]
+
+
+def _language_terms(language_lists: list) -> tuple[list[np.ndarray], list[np.ndarray]]:
+    """国ごとの言語番号の配列と、言語ごとの国の番号の配列（転置リスト）"""
+    vocabulary = {}
+    terms = []
+    for languages in language_lists:
+        ids = {
+            vocabulary.setdefault(language, len(vocabulary))
+            for language in set(languages or [])
+        }
+        terms.append(np.array(sorted(ids), dtype=np.int32))
+    members = [[] for _ in vocabulary]
+    for i, ids in enumerate(terms):
+        for term in ids:
+            members[term].append(i)
+    return terms, [np.array(m, dtype=np.int32) for m in members]
+
+
+class SimilarityIndex:
+    """特徴量の値ごとの転置リストから国同士の類似度を求め、上位 k 件を検索
+
+    n×n の類似度行列は作らず、問い合わせのあった国の行だけを、同じ値を持つ国への加算で
+    計算する（値を共有しない国の類似度は 0）。上位 k 件は国ごとに覚えておく。
+    """
+
+    def __init__(
+        self,
+        names: list[str],
+        codes: dict[str, np.ndarray],
+        postings: dict[str, list[np.ndarray]],
+        language_terms: list[np.ndarray],
+        language_postings: list[np.ndarray],
+    ):
+        self.names = names
+        self.codes = codes
+        self.postings = postings
+        self.language_terms = language_terms
+        self.language_postings = language_postings
+        self._language_sizes = np.array(
+            [len(ids) for ids in language_terms], dtype=np.float32
+        )
+        self._positions = {name: i for i, name in enumerate(names)}
+        self._casefolded = {name.casefold(): name for name in names}
+        self._top: dict[tuple[int, int], list[tuple[str, float]]] = {}
+
+    @classmethod
+    def from_data(cls, data: dict) -> "SimilarityIndex":
+        names = list(data)
+        infos = list(data.values())
+        codes, postings = {}, {}
+        for key in SIMILARITY_WEIGHTS:
+            if key == "language":
+                continue
+            codes[key] = _categorical_codes([info.get(key) for info in infos])
+            postings[key] = _postings(codes[key])
+        language_terms, language_postings = _language_terms(
+            [info.get("language") for info in infos]
+        )
+        return cls(names, codes, postings, language_terms, language_postings)
+
+    def resolve(self, name: str) -> str | None:
+        """国名を大文字・小文字を区別せずに解決"""
+        return self._casefolded.get(name.strip().casefold())
+
+    def scores(self, i: int) -> np.ndarray:
+        """i 番目の国と全ての国の類似度（language は Jaccard 係数、他は完全一致）"""
+        total = np.zeros(len(self.names), dtype=np.float32)
+        for key, weight in SIMILARITY_WEIGHTS.items():
+            if key == "language":
+                terms = self.language_terms[i]
+                if not len(terms):
+                    continue
+                intersection = np.zeros(len(self.names), dtype=np.float32)
+                for term in terms:
+                    intersection[self.language_postings[term]] += 1.0
+                # 共通の言語がある国では和集合の大きさは 1 以上
+                union = len(terms) + self._language_sizes - intersection
+                total += weight * np.divide(
+                    intersection,
+                    union,
+                    out=np.zeros_like(intersection),
+                    where=intersection > 0,
+                )
+            elif self.codes[key][i] >= 0:
+                total[self.postings[key][self.codes[key][i]]] += weight
+        total /= sum(SIMILARITY_WEIGHTS.values())
+        total[i] = 0.0
+        return total
+
+    def top_k(self, country: str, k: int = SIMILAR_TO_TOP_K) -> list[tuple[str, float]]:
+        """country と紛らわしい国を類似度の高い順に返す"""
+        i = self._positions.get(country)
+        if i is None or k <= 0:
+            return []
+        cached = self._top.get((i, k))
+        if cached is not None:
+            return cached
+        row = self.scores(i)
+        candidates = np.flatnonzero(row > 0)
+        # 同点は元の並び順で決める
+        ranked = candidates[np.lexsort((candidates, -row[candidates]))][:k]
+        result = self._top[(i, k)] = [(self.names[j], float(row[j])) for j in ranked]
+        return result
+
+    def similar_to(self, name: str, k: int = SIMILAR_TO_TOP_K) -> set[str]:
+        """「X に似ている」フィルター用の国集合（X 自身を含む）"""
+        country = self.resolve(name)
+        if country is None:
+            return set()
+        return {country} | {other for other, _ in self.top_k(country, k)}
+
+
+def cached_similarity_index(store) -> SimilarityIndex:
+    """ストアの国同士の類似度の索引（類似度に使うキーが変わったときだけ作り直す）"""
+    store.ensure_fields(list(SIMILARITY_WEIGHTS))
+    return store.cache("similarity").get_or_compute(
+        "index",
+        lambda: SimilarityIndex.from_data(store.data),
+        fields=set(SIMILARITY_WEIGHTS),
+    )
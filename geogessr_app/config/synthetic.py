@@ -0,0 +1,58 @@
+# config/synthetic.py
+
+import json
+import random
+
+import yaml
+
+DEFAULT_SOURCE = "geo_data.yaml"
+
+
+def load_templates(source_path: str = DEFAULT_SOURCE) -> list[tuple[str, str]]:
+    """合成データの元になる国データを (国名, JSON文字列) のリストで取得"""
+    with open(source_path, "r", encoding="utf-8") as f:
+        data = yaml.safe_load(f)
+    return [(name, json.dumps(info, ensure_ascii=False)) for name, info in data.items()]
+
+
+def iter_synthetic_dataset(
+    n_regions: int, source_path: str = DEFAULT_SOURCE, seed: int = 0
+):
+    """実データを複製した合成データを (地域名, 国データ) で1件ずつ生成
+
+    全件を辞書にまとめないため、大きな件数でもメモリ使用量は一定に保たれる。
+    """
+    templates = load_templates(source_path)
+    rng = random.Random(seed)
+    for i in range(n_regions):
+        name, payload = templates[i % len(templates)]
+        info = json.loads(payload)
+        latlng = info.get("latlng")
+        if latlng and len(latlng) == 2:
+            info["latlng"] = [
+                max(-85.0, min(85.0, latlng[0] + rng.uniform(-2.0, 2.0))),
+                latlng[1] + rng.uniform(-2.0, 2.0),
+            ]
+        yield f"{name} #{i}", info
+
+
+def generate_synthetic_dataset(
+    n_regions: int, source_path: str = DEFAULT_SOURCE, seed: int = 0
+) -> dict:
+    """実データを複製して n_regions 件の合成データセットを生成
+
+    YAMLから読み込んだ場合と同様に、各エントリは独立した文字列オブジェクトを持つ。
+    """
+    return dict(iter_synthetic_dataset(n_regions, source_path, seed))
+
+
+def write_synthetic_yaml(
+    path, n_regions: int, source_path: str = DEFAULT_SOURCE, seed: int = 0
+) -> int:
+    """合成データを geo_data.yaml と同じ形式で1件ずつ書き出し、件数を返す"""
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for name, info in iter_synthetic_dataset(n_regions, source_path, seed):
+            yaml.safe_dump({name: info}, f, allow_unicode=True, sort_keys=False)
+            count += 1
+    return count
@@ -0,0 +1,196 @@
+# config/tile_server.py
+
+import asyncio
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from config.http_server import AsyncHttpServer, ResponseCache
+from config.paths import BASE_TILES, MBTILES_PATH, TILE_SERVER_URL
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = urlsplit(TILE_SERVER_URL).port or 8766
+
+# タイルはファイルが差し替えられるまで変わらないので、ブラウザに1日キャッシュさせる
+TILE_MAX_AGE = 86400
+
+_TILE_PATH = re.compile(r"^/tiles/(\d+)/(\d+)/(\d+)\.(\w+)$")
+
+_CONTENT_TYPES = {
+    "png": "image/png",
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+    "pbf": "application/x-protobuf",
+}
+
+
+class MBTilesSource:
+    """MBTiles（SQLite）のタイルを読み取り専用で返す
+
+    ファイルが差し替えられていれば開き直し、ファイルがなければタイルなしとして扱う。
+    MBTiles の行番号は TMS（南から数える）なので、Leaflet の XYZ（北から数える）に
+    変換して引く。
+    """
+
+    def __init__(self, path: Path = MBTILES_PATH):
+        self.path = Path(path)
+        self.metadata = {}
+        self._connection = None
+        self._stat = None
+        self._lock = threading.Lock()
+        self.reload()
+
+    def reload(self):
+        """ファイルが更新されていれば開き直してメタデータを読み直す"""
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            stat = None
+        stat_key = None if stat is None else (stat.st_mtime_ns, stat.st_size)
+        if stat_key == self._stat:
+            return
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+            self.metadata = {}
+            self._stat = stat_key
+            if stat_key is None:
+                return
+            self._connection = sqlite3.connect(
+                f"file:{self.path}?mode=ro", uri=True, check_same_thread=False
+            )
+            self.metadata = dict(
+                self._connection.execute("SELECT name, value FROM metadata")
+            )
+
+    @property
+    def version(self) -> str:
+        """ファイルの (更新時刻, サイズ) から作った短い識別子（ETag に使う）"""
+        return hashlib.sha1(repr(self._stat).encode("utf-8")).hexdigest()[:12]
+
+    @property
+    def format(self) -> str:
+        return self.metadata.get("format", "png")
+
+    def tile(self, z: int, x: int, y: int) -> bytes | None:
+        tms_y = (1 << z) - 1 - y
+        with self._lock:
+            if self._connection is None:
+                return None
+            row = self._connection.execute(
+                "SELECT tile_data FROM tiles "
+                "WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+                (z, x, tms_y),
+            ).fetchone()
+        return None if row is None else bytes(row[0])
+
+
+class TileServer(AsyncHttpServer):
+    """MBTiles のタイルを /tiles/{z}/{x}/{y}.{ext} で配信するローカル HTTP サービス"""
+
+    def __init__(self, source: MBTilesSource | None = None, cache_size: int = 4096):
+        self.source = source or MBTilesSource()
+        # よく見る範囲のタイル（ないタイルも含む）をメモリに保持
+        self.cache = ResponseCache(cache_size)
+
+    def tile_entry(self, z: int, x: int, y: int) -> tuple:
+        """(ETag, ボディ) を返す（タイルがなければボディは None）"""
+        key = (self.source.version, z, x, y)
+        entry = self.cache.get(key)
+        if entry is None:
+            etag = f'"{self.source.version}-{z}-{x}-{y}"'
+            entry = (etag, self.source.tile(z, x, y))
+            self.cache.put(key, entry)
+        return entry
+
+    def respond(self, method: str, target: str, headers: dict) -> tuple:
+        """(ステータス, ヘッダー, ボディ) を返す"""
+        if method not in ("GET", "HEAD"):
+            return self._error(405, f"method not allowed: {method}")
+
+        self.source.reload()
+        path = urlsplit(target).path
+        if path == "/metadata.json":
+            body = json.dumps(self.source.metadata, ensure_ascii=False).encode("utf-8")
+            return 200, {"Content-Type": "application/json; charset=utf-8"}, body
+
+        match = _TILE_PATH.match(path)
+        if match is None:
+            return self._error(404, f"not found: {path}")
+        z, x, y = (int(v) for v in match.groups()[:3])
+        etag, body = self.tile_entry(z, x, y)
+        if body is None:
+            return self._error(404, f"no tile at {z}/{x}/{y}")
+
+        response_headers = {
+            "Content-Type": _CONTENT_TYPES.get(
+                self.source.format, "application/octet-stream"
+            ),
+            "ETag": etag,
+            "Cache-Control": f"public, max-age={TILE_MAX_AGE}",
+            "Access-Control-Allow-Origin": "*",
+        }
+        # ベクタータイルは gzip 圧縮されたまま格納されていることが多い
+        if body[:2] == b"\x1f\x8b":
+            response_headers["Content-Encoding"] = "gzip"
+        if headers.get("if-none-match") == etag:
+            return 304, response_headers, b""
+        return 200, response_headers, body
+
+    def _error(self, status: int, message: str) -> tuple:
+        body = json.dumps({"error": message}).encode("utf-8")
+        return status, {"Content-Type": "application/json; charset=utf-8"}, body
+
+    async def serve(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+        await super().serve(host, port)
+
+
+def folium_tile_options(
+    source: MBTilesSource | None, base_tiles: str = BASE_TILES
+) -> dict:
+    """folium.Map に渡す背景地図の引数（"osm" なら既定の OpenStreetMap のまま）
+
+    source は再実行をまたいで使い回す（ファイルが更新されたときだけ開き直す）。
+    """
+    if base_tiles != "mbtiles":
+        return {}
+    metadata = {}
+    if source is not None:
+        source.reload()
+        metadata = source.metadata
+    options = {
+        "tiles": "{}/tiles/{{z}}/{{x}}/{{y}}.{}".format(
+            TILE_SERVER_URL.rstrip("/"), metadata.get("format", "png")
+        ),
+        "attr": metadata.get("attribution") or metadata.get("name") or "MBTiles",
+    }
+    for key in ("minzoom", "maxzoom"):
+        if key in metadata:
+            options[key.replace("zoom", "_zoom")] = int(metadata[key])
+    return options
+
+
+if __name__ == "__main__":
+    # cd geogessr_app && python -m config.tile_server [--mbtiles data/basemap.mbtiles]
+    # アプリ側は GEO_BASE_TILES=mbtiles で起動する
+    import argparse
+
+    parser = argparse.ArgumentParser(description="MBTiles のローカルタイルサーバー")
+    parser.add_argument("--mbtiles", default=str(MBTILES_PATH))
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--cache-size", type=int, default=4096)
+    args = parser.parse_args()
+
+    server = TileServer(MBTilesSource(Path(args.mbtiles)), args.cache_size)
+    print(
+        f"serving {args.mbtiles} ({server.source.format}) "
+        f"on http://{args.host}:{args.port}/tiles/{{z}}/{{x}}/{{y}}"
+    )
+    asyncio.run(server.serve(args.host, args.port))
@@ -0,0 +1,123 @@
+# config/yaml_blocks.py
+
+import re
+
+import yaml
+
+# インデントなしの "国名:" 行（"国名: {}" を含む）をトップレベルブロックの開始とみなす
+_TOP_LEVEL_KEY = re.compile(r"^(?!---|\.\.\.)[^\s#][^\n]*:(\s|$)")
+
+
+def split_top_level_blocks(text: str) -> list[tuple[str, str]]:
+    """geo_data.yaml のテキストを国ごとの (国名, ブロック文字列) に分割"""
+    return list(iter_top_level_blocks(text.splitlines(keepends=True)))
+
+
+def iter_top_level_blocks(lines):
+    """行の列（開いたファイルなど）から国ごとの (国名, ブロック文字列) を順に返す"""
+    current_lines = []
+    for line in lines:
+        if _TOP_LEVEL_KEY.match(line) and current_lines:
+            yield _finish_block(current_lines)
+            current_lines = []
+        current_lines.append(line)
+    if current_lines and any(line.strip() for line in current_lines):
+        yield _finish_block(current_lines)
+
+
+def iter_top_level_items(stream):
+    """YAML の最上位のマッピングを (キー, 値) で1件ずつ返す（ストリームは少しずつ読む）
+
+    PyYAML の compose の API で1件分のノードだけを組み立てて変換するため、ファイル全体の
+    ノードを同時に保持しない。値は yaml.safe_load で読んだ場合と同じ。
+    """
+    loader = yaml.SafeLoader(stream)
+    try:
+        loader.get_event()  # StreamStart
+        if loader.check_event(yaml.StreamEndEvent):
+            return
+        loader.get_event()  # DocumentStart
+        if not loader.check_event(yaml.MappingStartEvent):
+            # 空の文書（null）は国なし、それ以外の最上位の値は扱えない
+            node = loader.compose_node(None, None)
+            if loader.construct_object(node, deep=True) is None:
+                return
+            raise yaml.YAMLError("top-level value must be a mapping")
+        loader.get_event()  # MappingStart
+        while not loader.check_event(yaml.MappingEndEvent):
+            key_node = loader.compose_node(None, None)
+            value_node = loader.compose_node(None, None)
+            key = loader.construct_object(key_node, deep=True)
+            value = loader.construct_object(value_node, deep=True)
+            # 変換済みのオブジェクトの表を空にして、国ごとにノードを手放す
+            loader.constructed_objects = {}
+            yield key, value
+    finally:
+        loader.dispose()
+
+
+def country_info(name, value) -> dict:
+    """国の値を国データの辞書にそろえる（null の国は空の辞書、辞書以外は不正）
+
+    ブロック単位のパース・逐次読み込み・シャードの分割で同じ扱いにするために使う。
+    """
+    if value is None:
+        return {}
+    if not isinstance(value, dict):
+        raise yaml.YAMLError(f"country {name!r} must be a mapping, got {value!r}")
+    return value
+
+
+def _finish_block(lines: list[str]) -> tuple[str, str]:
+    block = "".join(lines)
+    key = yaml.safe_load(lines[0])
+    name = next(iter(key)) if isinstance(key, dict) and key else ""
+    return str(name), block
+
+
+def parse_block(block: str) -> tuple[str, dict]:
+    """1ブロックだけをパースして (国名, 国データ) を返す"""
+    parsed = yaml.safe_load(block) or {}
+    name, info = next(iter(parsed.items()))
+    return str(name), country_info(name, info)
+
+
+def replace_scalar_field(block: str, field: str, value) -> str:
+    """ブロック内のトップレベルフィールドを1つだけ書き換えたブロックを返す
+
+    値の行（と折り返し行）だけを置き換え、他の行には手を付けない。
+    フィールドが存在しない場合はキー順（アルファベット順）の位置に挿入する。
+    """
+    dumped = yaml.safe_dump(
+        {field: value}, allow_unicode=True, default_flow_style=False, width=80
+    )
+    new_lines = ["  " + line + "\n" for line in dumped.rstrip("\n").split("\n")]
+
+    lines = block.splitlines(keepends=True)
+    header, body = lines[:1], lines[1:]
+
+    # body 内のトップレベルフィールドの開始位置
+    starts = [
+        i
+        for i, line in enumerate(body)
+        if line.startswith("  ")
+        and not line.startswith("   ")
+        and ":" in line
+        and not line.lstrip().startswith("- ")
+    ]
+    for pos, start in enumerate(starts):
+        key = body[start].strip().split(":", 1)[0]
+        if key == field:
+            end = starts[pos + 1] if pos + 1 < len(starts) else len(body)
+            # 末尾の空行は残す
+            while end > start + 1 and not body[end - 1].strip():
+                end -= 1
+            return "".join(header + body[:start] + new_lines + body[end:])
+        if key > field:
+            return "".join(header + body[:start] + new_lines + body[start:])
+
+    # 最後尾に追加（末尾の空行の前）
+    end = len(body)
+    while end > 0 and not body[end - 1].strip():
+        end -= 1
+    return "".join(header + body[:end] + new_lines + body[end:])
@@ -1,38 +1,165 @@
 # poetry run streamlit run geogessr_app/geogessr_app.py
 
+import tempfile
+import time
+from collections.abc import Mapping
+
 import folium
 import numpy as np
 import streamlit as st
-import yaml
-from config.char_config import CHAR_TO_LANGUAGES
+from folium import DivIcon
+from streamlit_folium import st_folium
+
+from config.arrow_table import (
+    arrow_available,
+    column_labels,
+    get_country_table,
+    select_rows,
+)
+from config.char_config import (
+    CHAR_PICKER_LABELS,
+    CHAR_PICKER_OPTIONS,
+    CHAR_TO_LANGUAGES,
+    SPECIFICITY_LEGEND,
+    get_and_matching_languages,
+    matches_selected_language,
+)
+from config.choropleth import (
+    band_for_zoom,
+    build_feature_collection,
+    load_boundary_bands,
+)
 from config.data_processor import DataProcessor
+from config.dataset_store import DatasetStore, create_dataset_store
+from config.export import (
+    EXPORT_FORMAT_LABELS,
+    EXPORT_FORMATS,
+    available_formats,
+    export_fields,
+    export_rows,
+    iter_export_rows,
+)
+from config.field_columns import (
+    get_field_column,
+    get_plate_attribute_index,
+    parse_numeric_value,
+)
 from config.field_config import (
     DISPLAY_OPTIONS,
+    FIELD_GROUPS,
     FILTERABLE_FIELDS,
+    PLATE_ATTRIBUTES,
+    PLATE_SIDES,
+    POPUP_FIELD_GROUPS,
     field_options,
     icon_options,
 )
-from config.number_plate_config import has_number_plate_config
+from config.filter_expressions import (
+    FILTER_RESULT_CACHE_SIZE,
+    NUMERIC_MATCH_TYPES,
+    TEXT_MATCH_TYPES,
+    FilterSyntaxError,
+    canonicalize,
+    combine,
+    evaluate_expression,
+    explain,
+    expression_dependencies,
+    expression_fields,
+    make_predicate,
+    parse_expression,
+)
+from config.flag_sprites import flag_code, get_flag_sprite, inject_flag_sprite
+from config.inference import (
+    CLUE_DEPENDENCIES,
+    CLUE_LABELS,
+    INFERENCE_TOP_K,
+    InferenceIndex,
+)
+from config.label_placement import LABEL_PLACEMENT_CACHE_SIZE, place_labels
+from config.map_styles import background_style, inject_map_styles
+from config.memory_profile import PROFILER
+from config.metrics import (
+    LOAD_DATA,
+    MAP_MARKERS,
+    PAYLOAD_BYTES,
+    REGISTRY,
+    RERUN_SECONDS,
+    RERUNS,
+    STAGE_SECONDS,
+    cache_collector,
+    sample_payload,
+    start_metrics_server,
+)
+from config.number_plate_config import (
+    get_combined_plate_data_url,
+    has_number_plate_config,
+    plate_attribute_field,
+)
+from config.page_state import PageState
+from config.paths import BASE_TILES, BOUNDARY_PATH
+from config.similarity import (
+    SIMILARITY_WEIGHTS,
+    SimilarityIndex,
+    cached_similarity_index,
+)
 from config.street_config import LANGUAGE_STREET_TERMS
-from folium import DivIcon
-from streamlit_folium import st_folium
+from config.tile_server import MBTilesSource, folium_tile_options
 
 st.set_page_config(page_title="GeoGuessR Helper", layout="wide")
 st.title("🗺️ GeoGuessR Helper: Countries, Languages & Street Terms")
 
 
-@st.cache_data
-def load_data() -> dict:
-    with open("geo_data.yaml", "r", encoding="utf-8") as f:
-        return yaml.safe_load(f)
+@st.cache_resource
+def get_dataset_store() -> DatasetStore:
+    """プロセス全体で共有するデータストア（geo_data.yaml を逐次読み込み、変更を監視）"""
+    with PROFILER.stage("dataset"):
+        store = create_dataset_store(stream=True)
+        # 最初のまとまりが読み込まれたら、残りの読み込みを待たずに描画を始める
+        store.wait_for_first_batch()
+    store.start_watcher()
+    return store
+
+
+@st.cache_resource
+def get_tile_source() -> MBTilesSource | None:
+    """プロセス全体で共有する MBTiles の読み取り（背景地図が mbtiles のときだけ開く）"""
+    return MBTilesSource() if BASE_TILES == "mbtiles" else None
+
+
+@st.cache_resource
+def get_metrics_server():
+    """プロセス全体で1つの /metrics サーバー（ストアのキャッシュ統計はスクレイプ時に集める）"""
+    REGISTRY.register_collector("dataset_store", cache_collector(get_dataset_store()))
+    return start_metrics_server()
+
+
+def load_data(field_paths=()) -> dict:
+    # シャード構成では必要なフィールドのシャードだけを初回アクセス時に読み込む
+    with STAGE_SECONDS.time(stage="load"), PROFILER.stage("load"):
+        store = get_dataset_store()
+        store.ensure_fields(field_paths)
+        # 変更があれば変更された国のブロックだけを再パースし、関連キャッシュを無効化
+        changes = store.refresh()
+    LOAD_DATA.inc(result="reload" if changes else "hit")
+    return store.data
 
 
-@st.cache_data
 def calculate_numeric_percentiles(data: dict, field_path: str):
-    """数値フィールドの分布を計算してパーセンタイルを取得"""
+    """数値フィールドの分布を計算してパーセンタイルを取得（フィールド単位でキャッシュ）"""
+    return (
+        get_dataset_store()
+        .cache("percentiles")
+        .get_or_compute(
+            field_path,
+            lambda: _compute_numeric_percentiles(field_path),
+            fields=DataProcessor.field_dependencies(field_path),
+        )
+    )
+
+
+def _compute_numeric_percentiles(field_path: str):
     values = []
-    for country_info in data.values():
-        value = DataProcessor.process_field(field_path, country_info)
+    for value in get_field_column(get_dataset_store(), field_path).raw:
         # 数値の解析を改善（範囲や不確実性を含む値を処理）
         parsed_value = parse_numeric_value(value)
         if parsed_value is not None:
@@ -52,61 +179,6 @@ def calculate_numeric_percentiles(data: dict, field_path: str):
     }
 
 
-def parse_numeric_value(value):
-    """数値、範囲、不確実性を含む値を解析"""
-    if isinstance(value, (int, float)):
-        return value
-
-    if not isinstance(value, str):
-        return None
-
-    import re
-
-    # "3" のような単純な数値
-    if value.isdigit():
-        return int(value)
-
-    # "3.5" のような小数
-    try:
-        return float(value)
-    except ValueError:
-        pass
-
-    # "3 or 5", "3-5", "3～5" のような範囲
-    range_patterns = [
-        r"(\d+(?:\.\d+)?)\s*(?:or|または)\s*(\d+(?:\.\d+)?)",  # "3 or 5"
-        r"(\d+(?:\.\d+)?)\s*[-～〜]\s*(\d+(?:\.\d+)?)",  # "3-5", "3～5"
-        r"(\d+(?:\.\d+)?)\s*to\s*(\d+(?:\.\d+)?)",  # "3 to 5"
-    ]
-
-    for pattern in range_patterns:
-        match = re.search(pattern, value)
-        if match:
-            # 範囲の場合は中央値を返す
-            min_val = float(match.group(1))
-            max_val = float(match.group(2))
-            return (min_val + max_val) / 2
-
-    # "約3", "~3", "3前後" のような近似値
-    approx_patterns = [
-        r"(?:約|~|around|approximately)\s*(\d+(?:\.\d+)?)",  # "約3", "~3"
-        r"(\d+(?:\.\d+)?)\s*(?:前後|程度|くらい)",  # "3前後"
-    ]
-
-    for pattern in approx_patterns:
-        match = re.search(pattern, value)
-        if match:
-            return float(match.group(1))
-
-    # 単純に数値を抽出
-    numbers = re.findall(r"\d+(?:\.\d+)?", value)
-    if numbers:
-        # 複数の数値がある場合は最初のものを使用
-        return float(numbers[0])
-
-    return None
-
-
 def get_background_color_for_numeric_field(
     field_path: str, value, percentiles: dict = None
 ) -> str:
@@ -163,7 +235,7 @@ def format_tips_for_popup(tips: list) -> str:
     tip_items = []
 
     for tip in tips:
-        if isinstance(tip, dict):  # 辞書の場合の処理
+        if isinstance(tip, Mapping):  # 辞書の場合の処理
             if tip.get("type") == "text":
                 # テキストTips
                 content = tip.get("content", "")
@@ -184,11 +256,11 @@ def format_tips_for_popup(tips: list) -> str:
                 # 画像とキャプションを組み合わせ
                 if caption:
                     tip_items.append(
-                        f'<div style="margin: 5px 0;"><img src="{image_src}" style="max-width: 120px; height: auto; display: block;"><small>{caption}</small></div>'
+                        f'<div class="gg-popup-tip"><img src="{image_src}"><small>{caption}</small></div>'
                     )
                 else:
                     tip_items.append(
-                        f'<div style="margin: 5px 0;"><img src="{image_src}" style="max-width: 120px; height: auto; display: block;"></div>'
+                        f'<div class="gg-popup-tip"><img src="{image_src}"></div>'
                     )
         else:
             # 文字列の場合はそのまま表示
@@ -205,7 +277,7 @@ def get_display_content(country: str, info: dict, field_path: str) -> str:
     # DataProcessorを使用して動的/静的フィールドを統一的に処理
     value = DataProcessor.process_field(field_path, info_with_country)
 
-    if isinstance(value, list):
+    if isinstance(value, (list, tuple)):
         formatted_value = ", ".join(str(v) for v in value)
     elif not isinstance(value, str):
         formatted_value = str(value) if value is not None else ""
@@ -240,11 +312,7 @@ def create_display_html(
 
     # 通常のテキスト表示処理
     # フラグアイコンの準備
-    flag_html = ""
-    if show_flag:
-        flag_url = info.get("flag", {}).get("image_url", "")
-        if flag_url:
-            flag_html = f'<img src="{flag_url}" style="width: 40px; height: auto; display: block; margin: 0 auto;" />'
+    flag_html = get_flag_sprite().flag_html(info) if show_flag else ""
 
     # 国名プレフィックスの準備
     prefix_text = ""
@@ -254,391 +322,924 @@ def create_display_html(
     # 最終的な表示テキスト
     display_text = f"{prefix_text}{content}" if content else ""
 
+    # スタイルは地図に1回だけ埋め込むスタイルシート（map_styles）で指定
+    bg_style = background_style(bg_color)
     if flag_html:
         # フラグアイコン付きの場合
-        html = f"""
-        <div style="text-align: center; font-size: 10px;">
-            {flag_html}
-            {f'<div style="display: inline-block; background: {bg_color}; padding: 1px 4px; border-radius: 4px; max-width: 1000px; word-wrap: break-word; border: 1px solid #666; color: #000;">{display_text}</div>' if display_text else ""}
-        </div>
-        """
+        text_html = (
+            f'<div class="gg-text"{bg_style}>{display_text}</div>'
+            if display_text
+            else ""
+        )
+        html = f'<div class="gg-label">{flag_html}{text_html}</div>'
     else:
         # テキストのみの場合
-        html = f"""
-        <div style="text-align: center; font-size: 10px;">
-            <div style="display: inline-block; background: {bg_color}; padding: 2px 6px; border-radius: 4px; max-width: 1000px; word-wrap: break-word; line-height: 1.2; border: 1px solid #666; color: #000;">
-                {display_text}
-            </div>
-        </div>
-        """
+        html = (
+            f'<div class="gg-label"><div class="gg-text gg-text-only"{bg_style}>'
+            f"{display_text}</div></div>"
+        )
 
     return html
 
 
-display_config = DISPLAY_OPTIONS.get("prepend_country_name", {})
-data = load_data()
+def format_data_for_popup(
+    country_name: str, info: dict, confusables: tuple = (), street_terms: str = ""
+) -> str:
+    """国の全データを動的にポップアップ用にフォーマット"""
+    sections = []
 
-# ▼ 表示観点（サイドバー）
-st.sidebar.write("### 🎯 Display Field")
-selected_field = st.sidebar.selectbox(
-    "Content Field",
-    list(field_options.keys()),
-    index=0,
-)
-content_field = field_options[selected_field]
-
-st.sidebar.write("### 🖼️ Display Options")
-show_flag = st.sidebar.checkbox("Show Flag Icon", value=True)
-show_country_name = st.sidebar.checkbox("Show Country Name", value=True)
-
-# ▼ 数値フィールドの分布計算と凡例表示
-numeric_percentiles = None
-if (
-    content_field in FILTERABLE_FIELDS
-    and FILTERABLE_FIELDS[content_field][0] == "number"
-):
-    numeric_percentiles = calculate_numeric_percentiles(data, content_field)
-
-    if numeric_percentiles:
-        st.markdown("### 🎨 Color Legend (Based on Data Distribution)")
-        legend_items = get_legend_info(content_field, numeric_percentiles)
-
-        # 統計情報も表示
-        stats_col1, stats_col2 = st.columns(2)
-        with stats_col1:
-            st.markdown(f"**Field:** {FILTERABLE_FIELDS[content_field][1]}")
-            st.markdown(
-                f"**Total countries with data:** {len(numeric_percentiles['values'])}"
-            )
-        with stats_col2:
-            st.markdown(
-                f"**Range:** {numeric_percentiles['min']:.0f} - {numeric_percentiles['max']:.0f}"
-            )
-            st.markdown(f"**Median:** {numeric_percentiles['median']:.0f}")
-
-        # 色の凡例（パーセンタイル順位ベース）
-        if legend_items:
-            st.markdown("#### Color Scale (Percentile Ranking)")
-            legend_cols = st.columns(len(legend_items))
-            for i, (range_text, color, description) in enumerate(legend_items):
-                with legend_cols[i]:
-                    st.markdown(
-                        f'<div style="background-color: {color}; padding: 8px; border-radius: 4px; text-align: center; border: 1px solid #ddd; margin: 2px;">'
-                        f"<strong>{range_text}</strong><br><small>{description}</small></div>",
-                        unsafe_allow_html=True,
-                    )
+    # 紛らわしい国（類似度行列の上位）
+    if confusables:
+        confusable_text = ", ".join(
+            f"{other} ({score:.0%})" for other, score in confusables
+        )
+        sections.append(f"<b>Confusable with:</b> {confusable_text}")
+
+    # 除外するキー（表示しない項目）
+    excluded_keys = {"flag", "latlng"}  # flagは別途表示、latlngは座標として表示
+
+    # 表示名のマッピング
+    display_names = {
+        "language": "Language",
+        "tld": "Domain",
+        "gdp_per_capita": "GDP per capita",
+        "number_plate": "Number Plate",
+        "crosswalk_stripes": "Crosswalk Stripes",
+        "crosswalk_features": "Crosswalk Features",
+        "sign_back": "Sign Back",
+        "camera": "Camera",
+    }
 
-# ▼ 特徴文字によるフィルター設定
-import unicodedata
+    # 動的フィールドの処理（街路表記は一括展開済みの列から渡される）
+    if street_terms:
+        sections.append(f"<b>Street Terms:</b> {street_terms}")
+
+    # GeoGuessrのTipsを整理して表示（long版を使用）
+    tips_data = info.get("geoguessr_tips", {})
+    tips = tips_data.get("long", [])  # long版を使用
+    if tips:
+        tips_html = format_tips_for_popup(tips)
+        sections.append(f"<b>GeoGuessr Tips:</b><br>{tips_html}")
+
+    # 通常のフィールドを動的に処理
+    for key, value in info.items():
+        if key in excluded_keys:
+            continue
+
+        display_name = display_names.get(key, key.replace("_", " ").title())
+
+        if isinstance(value, (list, tuple)):
+            formatted_value = ", ".join(str(v) for v in value)
+        elif isinstance(value, Mapping):
+            # ネストした辞書は無視（flagなど）
+            continue
+        else:
+            formatted_value = str(value)
 
+        if formatted_value:  # 空でない場合のみ表示
+            sections.append(f"<b>{display_name}:</b> {formatted_value}")
 
-def sort_characters_by_base(char_list: list[str]) -> list[str]:
-    def base_form(char: str) -> str:
-        return (
-            unicodedata.normalize("NFKD", char)
-            .encode("ASCII", "ignore")
-            .decode("ASCII")
-            .lower()
-        )
+    # フラグ説明を追加
+    flag_info = info.get("flag", {})
+    if flag_info.get("description"):
+        sections.append(f"<b>Flag:</b> {flag_info['description']}")
 
-    return sorted(char_list, key=base_form)
+    # 座標情報を追加
+    latlng = info.get("latlng", [])
+    if len(latlng) == 2:
+        sections.append(f"<b>Coordinates:</b> {latlng[0]}, {latlng[1]}")
 
+    return "<br><br>".join(sections)
 
-st.sidebar.write("### 🔤 Character-based Language Filter")
-char_states = {}
-char_cols = st.sidebar.columns(5)
-for idx, char in enumerate(sort_characters_by_base(CHAR_TO_LANGUAGES)):
-    lang_count = len(CHAR_TO_LANGUAGES[char])
-    if lang_count == 1:
-        color = "#ff4d4d"  # vivid red (very specific)
-    elif lang_count == 2:
-        color = "#ffa500"  # strong orange
-    elif lang_count == 3:
-        color = "#f4e04d"  # bright yellow
-    else:
-        color = "#c6f7c3"  # soft green (less specific)
-    with char_cols[idx % 5]:
-        st.markdown(
-            f"<div style='background-color:{color}; padding:3px; border-radius:5px; text-align: center;'>",
-            unsafe_allow_html=True,
-        )
-        char_states[char] = st.checkbox(char, key=f"char_{char}_checkbox")
-        st.markdown("</div>", unsafe_allow_html=True)
 
-selected_chars = [c for c, v in char_states.items() if v]
+def create_popup_html(
+    country: str, info: dict, confusables: tuple = (), street_terms: str = ""
+) -> str:
+    """詳細なポップアップ（全データを動的に表示）"""
+    popup_content = format_data_for_popup(country, info, confusables, street_terms)
+    return (
+        '<div class="gg-popup"><div class="gg-popup-header">'
+        f"<h4>{info['flag']['emoji']} {country}</h4>"
+        f'{get_flag_sprite().flag_html(info, "gg-popup-flag")}</div>'
+        f'<div class="gg-popup-body">{popup_content}</div></div>'
+    )
+
 
+def get_similarity_index() -> SimilarityIndex:
+    """国同士の類似度の索引（類似度に使うキーが変わったときだけ作り直す）"""
+    load_data(list(SIMILARITY_WEIGHTS))
+    return cached_similarity_index(get_dataset_store())
 
-def get_and_matching_languages(
-    selected_chars: list[str], char_to_lang: dict
-) -> set[str]:
-    if not selected_chars:
-        return set()
-    lang_sets = [set(char_to_lang.get(c, [])) for c in selected_chars]
-    return set.intersection(*lang_sets)
 
+def get_inference_index() -> InferenceIndex:
+    """手がかり推論用の特徴行列（データバージョンごとに1回だけ計算）"""
+    data = load_data(sorted(CLUE_DEPENDENCIES))
+    return (
+        get_dataset_store()
+        .cache("inference")
+        .get_or_compute(
+            "features",
+            lambda: InferenceIndex.from_data(data),
+            fields=CLUE_DEPENDENCIES,
+        )
+    )
 
-matching_langs = get_and_matching_languages(selected_chars, CHAR_TO_LANGUAGES)
 
+def get_filtered_indices(
+    data: dict,
+    order_version: int,
+    expression,
+    selected_chars: list[str],
+    matching_langs: set[str],
+) -> tuple[np.ndarray, str]:
+    """文字フィルターとフィルター式を通過する国の番号（data の順）と実行計画の説明
 
-def matches_selected_language(info: dict, matching_langs: set[str]) -> bool:
-    langs = info.get("language", [])
-    return any(lang in matching_langs for lang in langs)
+    結果は正規化した式と文字フィルターの言語をキーに、全セッション共通の LRU キャッシュに
+    国の番号の配列として保持する。エントリは式が参照するフィールドにだけ依存させるため、
+    関係のないフィールドの編集では破棄されない。番号は国の並びに依存するため、並びの
+    バージョン（order_version は data と同じ時点のもの）が違うエントリは使わない。
+    """
+    expression = canonicalize(expression)
+    key = (expression, tuple(sorted(matching_langs)) if selected_chars else None)
+    fields = expression_dependencies(expression)
+    if selected_chars:
+        fields.add("language")
+
+    def similar_to(value: str) -> set[str]:
+        # 「似ている国」フィルターは類似度行列の上位 k 件から国集合を求める（空欄は全ての国）
+        if not value.strip():
+            return set(data)
+        return get_similarity_index().similar_to(value)
+
+    countries = tuple(data)
+
+    def compute() -> tuple[np.ndarray, str]:
+        store = get_dataset_store()
+        # 条件は一括展開済みの列で、絞り込みの強いものから評価する
+        mask, plan = evaluate_expression(
+            store,
+            expression,
+            countries,
+            special={"#similar_to": similar_to},
+        )
+        if selected_chars:
+            # 値は計算の開始後のストアから読むので、計算中の変更は無効化で検知される
+            current = store.data
+            mask &= np.array(
+                [
+                    matches_selected_language(
+                        current.get(country) or {}, matching_langs
+                    )
+                    for country in countries
+                ],
+                dtype=bool,
+            )
+        return np.flatnonzero(mask).astype(np.int32), explain(plan)
 
+    indices, plan_text = (
+        get_dataset_store()
+        .cache("filter_results", max_entries=FILTER_RESULT_CACHE_SIZE)
+        .get_or_compute(key, compute, fields=fields, version=order_version)
+    )
+    return indices, plan_text
 
-# フィルターの状態
-if "filters" not in st.session_state:
-    st.session_state.filters = []
-if "filter_counter" not in st.session_state:
-    st.session_state.filter_counter = 0
 
-# メイン領域にフィルター表示
-with st.expander("Filters", expanded=True):
-    if st.button("+ Add Filter"):
-        # 現在選択されているContent Fieldを正確に判定
-        if content_field in FILTERABLE_FIELDS:
-            default_field = content_field
-        else:
-            # フィルター不可能な場合はlanguageをデフォルトに
-            default_field = "language"
-
-        st.session_state.filter_counter += 1
-        st.session_state.filters.append(
-            {
-                "field": default_field,
-                "match": "contains",
-                "value": "",
-                "id": st.session_state.filter_counter,
-            }
+def get_marker_html(
+    country: str,
+    info: dict,
+    content_field: str,
+    show_flag: bool,
+    show_country_name: bool,
+    bg_color: str,
+    show_confusables: bool = False,
+) -> tuple[str, str]:
+    """マーカー用の (ラベルHTML, ポップアップHTML) を国単位でキャッシュして取得"""
+    store = get_dataset_store()
+    # 類似国は他の国のデータにも依存するため、結果をキーに含めて変更を検知する
+    # （表示しない場合は類似度の索引を作らない）
+    confusables = (
+        tuple(
+            (other, round(score, 2))
+            for other, score in get_similarity_index().top_k(country)
         )
+        if show_confusables
+        else ()
+    )
+    street_column = get_field_column(store, "#dynamic_street_terms")
+    position = street_column.position(country)
+    street_terms = (
+        street_column.display[position]
+        if position is not None and street_column.valid[position]
+        else ""
+    )
 
-    for i, f in enumerate(st.session_state.filters):
-        cols = st.columns([2, 2, 4, 1])
-        with cols[0]:
-            # フィルターIDを使ってユニークなkeyを生成
-            filter_id = f.get("id", i)
-            f["field"] = st.selectbox(
-                "Field",
-                sorted(FILTERABLE_FIELDS.keys()),
-                index=(
-                    sorted(FILTERABLE_FIELDS.keys()).index(f["field"])
-                    if f["field"] in FILTERABLE_FIELDS
-                    else 0
-                ),
-                key=f"field_{filter_id}",
-            )
-        with cols[1]:
-            f["match"] = st.selectbox(
-                "Match", ["contains", "equals"], key=f"match_{filter_id}"
+    def render() -> tuple[str, str]:
+        render_info = info
+        if content_field == "#number_plate_visual":
+            # ナンバープレート画像（SVG）は国ごとにキャッシュ
+            with PROFILER.stage("plate_uris"):
+                plate_data_url = store.cache("plate_svgs").get_or_compute(
+                    country,
+                    lambda: get_combined_plate_data_url(info, country),
+                    countries={country},
+                    fields={"number_plate_config"},
+                )
+            render_info = {**info, "_plate_data_url": plate_data_url}
+        html = create_display_html(
+            country, render_info, content_field, show_flag, show_country_name, bg_color
+        )
+        return html, create_popup_html(country, info, confusables, street_terms)
+
+    # 旗のスプライトを作り直した場合も描き直す
+    sprite_version = get_flag_sprite().version
+    return store.cache("markers").get_or_compute(
+        (
+            country,
+            content_field,
+            show_flag,
+            show_country_name,
+            bg_color,
+            confusables,
+            sprite_version,
+        ),
+        render,
+        countries={country},
+    )
+
+
+def get_boundary_bands(data: dict) -> list[dict]:
+    """ズーム帯ごとの簡略化済み国境（簡略化結果は境界ファイルごとにディスクキャッシュ）"""
+    return (
+        get_dataset_store()
+        .cache("boundaries")
+        .get_or_compute("bands", lambda: load_boundary_bands(list(data)), fields=set())
+    )
+
+
+def get_label_placements(
+    content_field: str, zoom: int, show_country_name: bool
+) -> dict:
+    """ズームごとのラベル配置（フィールド・ズーム・国名表示ごとにキャッシュ）
+
+    フィルターに関係なく全ての国のラベルを1回だけ配置するため、表示する国が変わっても
+    配置は作り直さない。表示する国の配置だけを取り出すのは呼び出し側。
+    """
+    store = get_dataset_store()
+
+    def compute() -> dict:
+        # 値は計算の開始後のストアから読むので、計算中の変更は無効化で検知される
+        column = get_field_column(store, content_field)
+        labels = []
+        for country, info in store.data.items():
+            position = column.position(country)
+            latlng = info.get("latlng")
+            if position is None or not column.valid[position]:
+                continue
+            if not isinstance(latlng, (list, tuple)) or len(latlng) < 2:
+                continue
+            text = format_canvas_label(
+                country, column.display[position], show_country_name
             )
-        with cols[2]:
-            help_text = FILTERABLE_FIELDS.get(f["field"], ("", ""))[1]
-            f["value"] = st.text_input(
-                f"Value ({help_text})", key=f"value_{filter_id}", value=f["value"]
+            labels.append((country, latlng[0], latlng[1], text))
+        return place_labels(labels, zoom)
+
+    return store.cache(
+        "label_placement", max_entries=LABEL_PLACEMENT_CACHE_SIZE
+    ).get_or_compute(
+        (content_field, zoom, show_country_name),
+        compute,
+        fields=DataProcessor.field_dependencies(content_field) | {"latlng"},
+    )
+
+
+def format_canvas_label(country: str, content: str, show_country_name: bool) -> str:
+    """Canvas 表示用の1行ラベル（長い場合は省略）"""
+    text = f"{country}: {content}" if show_country_name else content
+    return text if len(text) <= 40 else text[:37] + "..."
+
+
+@st.fragment
+def render_results(page: PageState):
+    """表示オプション・フィルター・地図
+
+    この中の操作（フィルターの編集、表示オプション、地図の移動）ではこの部分だけが
+    再実行される。サイドバーで決まる状態は page で明示的に受け取る。
+    """
+    selected_field = page.selected_field
+    content_field = page.content_field
+    selected_chars = list(page.selected_chars)
+    matching_langs = set(page.matching_langs)
+    numeric_percentiles = page.numeric_percentiles
+    fragment_started = time.perf_counter()
+    # フラグメントだけの再実行のときはここからを1回の再実行として計測
+    profiling_fragment = PROFILER.begin_rerun("fragment")
+
+    # ▼ 表示オプション（地図だけに影響するのでフラグメント内に置く）
+    option_cols = st.columns(4)
+    with option_cols[0]:
+        show_flag = st.checkbox("Show Flag Icon", value=True)
+    with option_cols[1]:
+        show_country_name = st.checkbox("Show Country Name", value=True)
+        # 類似度の索引はこれを選んだとき（と #similar_to を使ったとき）だけ作る
+        show_confusables = st.checkbox("Show Look-alikes in Popups", value=False)
+
+    # ▼ 表示モード（数値フィールドで国境データがある場合はコロプレス表示を選択可能）
+    display_mode = "Labels"
+    if (
+        FILTERABLE_FIELDS.get(content_field, ("",))[0] == "number"
+        and BOUNDARY_PATH.exists()
+    ):
+        with option_cols[2]:
+            display_mode = st.radio(
+                "Display Mode", ["Labels", "Choropleth"], horizontal=True
             )
-        with cols[3]:
-            if st.button("❌", key=f"remove_{filter_id}"):
-                st.session_state.filters.pop(i)
-                st.rerun()
 
+    # ▼ ラベルの描画方法（Canvas は重なりを間引いた軽量なラベル、画像系フィールドは HTML のみ）
+    canvas_labels = False
+    if not DataProcessor.is_special_field(content_field):
+        with option_cols[3]:
+            canvas_labels = (
+                st.radio(
+                    "Label Renderer", ["HTML", "Canvas (decluttered)"], horizontal=True
+                )
+                != "HTML"
+            )
 
-def passes_all_filters(info: dict, filters: list[dict]) -> bool:
-    """汎用的なフィルター判定関数"""
-    for f in filters:
-        if not DataProcessor.filter_matches(f["field"], info, f["match"], f["value"]):
-            return False
-    return True
+    # フィルターの状態
+    if "filters" not in st.session_state:
+        st.session_state.filters = []
+    if "filter_counter" not in st.session_state:
+        st.session_state.filter_counter = 0
+
+    # メイン領域にフィルター表示
+    with st.expander("Filters", expanded=True):
+        if st.button("+ Add Filter"):
+            # 現在選択されているContent Fieldを正確に判定
+            if content_field in FILTERABLE_FIELDS:
+                default_field = content_field
+            else:
+                # フィルター不可能な場合はlanguageをデフォルトに
+                default_field = "language"
+
+            st.session_state.filter_counter += 1
+            st.session_state.filters.append(
+                {
+                    "field": default_field,
+                    "match": "contains",
+                    "value": "",
+                    "id": st.session_state.filter_counter,
+                }
+            )
 
+        for i, f in enumerate(st.session_state.filters):
+            cols = st.columns([2, 2, 4, 1])
+            with cols[0]:
+                # フィルターIDを使ってユニークなkeyを生成
+                filter_id = f.get("id", i)
+                f["field"] = st.selectbox(
+                    "Field",
+                    sorted(FILTERABLE_FIELDS.keys()),
+                    index=(
+                        sorted(FILTERABLE_FIELDS.keys()).index(f["field"])
+                        if f["field"] in FILTERABLE_FIELDS
+                        else 0
+                    ),
+                    key=f"field_{filter_id}",
+                )
+            with cols[1]:
+                match_types = list(TEXT_MATCH_TYPES)
+                if FILTERABLE_FIELDS.get(f["field"], ("",))[0] == "number":
+                    match_types += NUMERIC_MATCH_TYPES
+                f["match"] = st.selectbox(
+                    "Match", match_types, key=f"match_{filter_id}"
+                )
+            with cols[2]:
+                help_text = FILTERABLE_FIELDS.get(f["field"], ("", ""))[1]
+                f["value"] = st.text_input(
+                    f"Value ({help_text})", key=f"value_{filter_id}", value=f["value"]
+                )
+            with cols[3]:
+                if st.button("❌", key=f"remove_{filter_id}"):
+                    st.session_state.filters.pop(i)
+                    st.rerun(scope="fragment")
+
+        # ナンバープレートの属性（全て AND、属性索引のビット列の積で判定）
+        plate_index = get_plate_attribute_index(get_dataset_store())
+        plate_conditions = st.multiselect(
+            "Plate attributes (all must match)",
+            [
+                (side, attribute, value)
+                for side in PLATE_SIDES
+                for attribute in PLATE_ATTRIBUTES
+                for value in plate_index.values(side, attribute)
+            ],
+            format_func=lambda c: f"{c[0].title()} {PLATE_ATTRIBUTES[c[1]]}: {c[2]}",
+            key="plate_filter",
+        )
 
-# ▼ チェックされた文字に対応する言語を表示
-if selected_chars:
-    st.markdown("### 🧠 Languages Matching Selected Characters")
+        # 似ている国（選んだ国とその類似国だけを表示、上の行とは AND で結合）
+        similar_country = st.selectbox(
+            "Similar to",
+            [""] + sorted(get_dataset_store().data),
+            format_func=lambda c: c or "(any country)",
+            key="similar_to_filter",
+        )
 
-    # 選択された文字すべてを使用する言語を取得（AND演算）
-    matching_langs = get_and_matching_languages(selected_chars, CHAR_TO_LANGUAGES)
+        # OR・NOT・数値比較を含む条件は式で指定（上の行とは AND で結合）
+        filter_expression_text = st.text_input(
+            "Expression",
+            key="filter_expression",
+            placeholder="language contains Spanish and (tld = .ar or not gdp_per_capita < 10000)",
+            help=(
+                "Combine conditions with and / or / not and parentheses. "
+                "Match: contains, equals (=), != and >, >=, <, <= for numeric fields. "
+                "Quote values that contain spaces."
+            ),
+        )
+        show_filter_plan = st.checkbox("Explain filter plan", key="explain_filter_plan")
+
+        filter_parts = []
+        for f in st.session_state.filters:
+            try:
+                filter_parts.append(make_predicate(f["field"], f["match"], f["value"]))
+            except FilterSyntaxError as e:
+                st.warning(f"Filter on {f['field']} ignored: {e}")
+        filter_parts.extend(
+            make_predicate(plate_attribute_field(side, attribute), "equals", value)
+            for side, attribute, value in plate_conditions
+        )
+        if similar_country:
+            filter_parts.append(
+                make_predicate("#similar_to", "equals", similar_country)
+            )
+        try:
+            filter_parts.append(parse_expression(filter_expression_text))
+        except FilterSyntaxError as e:
+            st.warning(f"Expression ignored: {e}")
+        filter_expression = combine(*filter_parts)
+        filter_plan_slot = st.empty()
+
+    # フィルターとポップアップに必要なフィールドを読み込む
+    load_data(
+        sorted(expression_fields(filter_expression))
+        + [key for group in POPUP_FIELD_GROUPS for key in FIELD_GROUPS[group]]
+    )
+    # 国の番号は data の並びに対するものなので、同じ時点のバージョンと組で扱う
+    data, data_version, order_version = get_dataset_store().snapshot()
 
-    st.markdown(f"**Selected characters:** {' '.join(selected_chars)}")
-    if matching_langs:
-        st.markdown(
-            f"**Matching languages (uses ALL selected characters):** {', '.join(sorted(matching_langs))}"
+    with STAGE_SECONDS.time(stage="filter"), PROFILER.stage("filter"):
+        visible_indices, filter_plan = get_filtered_indices(
+            data, order_version, filter_expression, selected_chars, matching_langs
+        )
+        countries = tuple(data)
+        visible_countries = {countries[i] for i in visible_indices}
+    if show_filter_plan:
+        filter_plan_slot.code(filter_plan, language="text")
+
+    # 地図の作成（ここからマーカーを追加し終えるまでを render 段階として計測）
+    render_started = time.perf_counter()
+    PROFILER.enter("render")
+    track_zoom = display_mode == "Choropleth" or canvas_labels
+    if track_zoom:
+        # コロプレス表示・Canvas ラベルはズームに応じて内容が変わるため、表示位置を保持する
+        map_zoom = st.session_state.get("map_zoom", 2)
+        map_center = st.session_state.get("map_center") or {"lat": 0, "lng": 0}
+        m = folium.Map(
+            location=[map_center["lat"], map_center["lng"]],
+            zoom_start=map_zoom,
+            prefer_canvas=canvas_labels,
+            **folium_tile_options(get_tile_source()),
         )
     else:
-        st.markdown("**No languages use ALL of the selected characters together**")
-
-    # 街路表記モードの場合は対応する街路表記をテーブル形式で表示
-    if content_field == "#dynamic_street_terms" and matching_langs:
-        st.markdown("#### 🛣️ Street Terms for Selected Languages")
-
-        # テーブル形式で見やすく表示
-        street_data = []
-        for lang in matching_langs:
-            if lang in LANGUAGE_STREET_TERMS:
-                terms = LANGUAGE_STREET_TERMS[lang]
-                # 全ての街路表記を表示
-                street_data.append(
+        m = folium.Map(
+            location=[0, 0], zoom_start=2, **folium_tile_options(get_tile_source())
+        )
+    # マーカー・ポップアップ共通のスタイルは地図に1回だけ埋め込む
+    inject_map_styles(m)
+
+    choropleth_geometries = {}
+    choropleth_styles = {}
+    if display_mode == "Choropleth":
+        bands = get_boundary_bands(data)
+        if bands:
+            choropleth_geometries = bands[band_for_zoom(map_zoom)]
+
+    canvas_markers = []
+    # 描画した国の旗（スプライトから地図に1回だけ埋め込む）
+    flag_codes = set()
+    # 表示フィールドは全ての国について一括展開済みの列（表示文字列・元の値・有効フラグ）を使う
+    content_column = get_field_column(get_dataset_store(), content_field)
+
+    filtered_count = 0
+    for country, info in data.items():
+        if country not in visible_countries:
+            continue
+
+        position = content_column.position(country)
+        # 有効な値がない場合（空文字、None、街路表記なしなど）はスキップ
+        if position is None or not content_column.valid[position]:
+            continue
+        content = content_column.display[position]
+
+        # ここまで来た場合のみカウント
+        filtered_count += 1
+
+        # 数値フィールドの場合は背景色を取得
+        raw_value = content_column.raw[position]
+        bg_color = get_background_color_for_numeric_field(
+            content_field, raw_value, numeric_percentiles
+        )
+
+        # コロプレス表示で国境がある国はポリゴンで塗り分ける（ない国はラベル表示）
+        if country in choropleth_geometries:
+            choropleth_styles[country] = (content, bg_color)
+            continue
+
+        # 表示用HTMLとポップアップを生成（国単位でキャッシュ）
+        with PROFILER.stage("markers"):
+            html, popup_html = get_marker_html(
+                country,
+                info,
+                content_field,
+                show_flag,
+                show_country_name,
+                bg_color,
+                show_confusables,
+            )
+        flag_codes.add(flag_code(info))
+
+        if canvas_labels:
+            # 配置はすべての国を集めてから決める
+            canvas_markers.append(
+                (
+                    country,
+                    info["latlng"][0],
+                    info["latlng"][1],
+                    format_canvas_label(country, content, show_country_name),
+                    bg_color,
+                    popup_html,
+                )
+            )
+            continue
+
+        # アイコンサイズを大きくする
+        div_icon = DivIcon(icon_size=(200, 40), icon_anchor=(100, 20), html=html)
+
+        # ✅ wrap-around 表示（経度ずらし）
+        for offset in [-360, 0, 360]:
+            lon = info["latlng"][1] + offset
+            lat = info["latlng"][0]
+            # 有効なラベルがある場合のみマーカーを表示
+            folium.Marker(
+                location=[lat, lon],
+                icon=div_icon,
+                popup=folium.Popup(popup_html, max_width=350),
+                tooltip=country,
+            ).add_to(m)
+
+    inject_flag_sprite(m, flag_codes)
+
+    if canvas_markers:
+        # 全ての国の配置のうち、表示する国のものだけを使う
+        placements = get_label_placements(
+            content_field, round(map_zoom), show_country_name
+        )
+        for country, lat, lng, text, bg_color, popup_html in canvas_markers:
+            offset_px = placements.get(country)
+            for offset in [-360, 0, 360]:
+                folium.CircleMarker(
+                    location=[lat, lng + offset],
+                    radius=4,
+                    color="#666",
+                    weight=1,
+                    fill=True,
+                    fill_color="#fff" if bg_color == "white" else bg_color,
+                    fill_opacity=1.0,
+                    popup=folium.Popup(popup_html, max_width=350),
+                    # 重なって配置できなかったラベルは点だけ表示（ホバーで国名）
+                    tooltip=(
+                        folium.Tooltip(
+                            text, permanent=True, direction="center", offset=offset_px
+                        )
+                        if offset_px is not None
+                        else country
+                    ),
+                ).add_to(m)
+
+    if choropleth_styles:
+        folium.GeoJson(
+            build_feature_collection(choropleth_geometries, choropleth_styles),
+            style_function=lambda feature: {
+                "fillColor": feature["properties"]["fill"],
+                "fillOpacity": 1.0,
+                "color": "#666",
+                "weight": 0.5,
+            },
+            tooltip=folium.GeoJsonTooltip(
+                fields=["name", "value"], aliases=["Country", selected_field]
+            ),
+        ).add_to(m)
+
+    STAGE_SECONDS.observe(time.perf_counter() - render_started, stage="render")
+    PROFILER.exit()
+    MAP_MARKERS.observe(filtered_count)
+    # 地図ペイロードは描画し直して測るため、一定回数に1回だけ指標に記録する
+    if sample_payload():
+        PAYLOAD_BYTES.observe(len(m.get_root().render().encode("utf-8")))
+
+    # 統計情報の表示
+    st.markdown(f"### 📊 Showing {filtered_count} countries")
+
+    # ▼ 地図ペイロードのサイズ計測（Content Field ごとに記録、計測時は地図を1回余分に描画）
+    with st.expander("📦 Map Payload Size"):
+        if st.checkbox("Measure payload per rerun", key="measure_payload"):
+            payload_bytes = len(m.get_root().render().encode("utf-8"))
+            payload_sizes = st.session_state.setdefault("payload_sizes", {})
+            payload_sizes[selected_field] = (payload_bytes, filtered_count)
+            st.dataframe(
+                [
                     {
-                        "Language": lang,
-                        "Street Terms": ", ".join(terms["street"]),
-                        "Abbreviations": ", ".join(terms["abbreviations"]),
+                        "Content Field": field_label,
+                        "KB": round(size / 1024, 1),
+                        "Countries": count,
+                        "Bytes/Country": size // count if count else 0,
                     }
-                )
+                    for field_label, (size, count) in payload_sizes.items()
+                ],
+                hide_index=True,
+            )
 
-        if street_data:
-            import pandas as pd
+    # ▼ フィルター結果の書き出し（準備したときだけ、行を少しずつファイル形式に変換）
+    with st.expander("⬇️ Export Filtered Countries"):
+        export_format = st.radio(
+            "Format",
+            available_formats(),
+            format_func=EXPORT_FORMAT_LABELS.get,
+            horizontal=True,
+            key="export_format",
+        )
+        if st.checkbox("Prepare download", key="prepare_export"):
+            fields = export_fields(content_field, filter_expression)
+            rows = iter_export_rows(
+                ((c, info) for c, info in data.items() if c in visible_countries),
+                fields,
+                numeric_values=export_format == "parquet",
+            )
+            # 書き出しは一時ファイルに少しずつ行い、ボタンにはファイルをそのまま渡す
+            # （Streamlit がダウンロード用に保持する1つ以外にファイル全体のコピーを作らない）。
+            # Streamlit が読めるのはバッファなしのファイル（RawIOBase）
+            with tempfile.TemporaryFile(buffering=0) as spool:
+                exported = export_rows(rows, export_format, spool, fields)
+                spool.seek(0)
+                extension, mime = EXPORT_FORMATS[export_format]
+                st.download_button(
+                    f"Download {exported} countries",
+                    spool,
+                    file_name=f"geoguessr_{content_field.strip('#')}.{extension}",
+                    mime=mime,
+                )
 
-            df = pd.DataFrame(street_data)
-            st.dataframe(df, use_container_width=True, hide_index=True)
+    # ▼ 全フィールドの一覧表（Arrow の表をフィルター結果の行だけ切り出して渡す）
+    with st.expander("📋 Country Table"):
+        if arrow_available():
+            table = select_rows(
+                get_country_table(get_dataset_store(), data, data_version),
+                visible_indices,
+            )
+            st.caption(f"{table.num_rows} countries match the filters")
+            st.dataframe(table, hide_index=True, column_config=column_labels())
+        else:
+            st.caption("The country table requires pyarrow.")
+
+    # ▼ 横幅をブラウザ幅にフィットさせる（最大1500px）
+    with STAGE_SECONDS.time(stage="serialize"), PROFILER.stage("serialize"):
+        map_state = st_folium(m, width=1500, height=1000)
+    if profiling_fragment:
+        PROFILER.end_rerun()
+    # ページ全体の実行の中の呼び出しは scope="app" の再実行として数える
+    if not app_run_active:
+        RERUNS.inc(scope="fragment")
+        RERUN_SECONDS.observe(time.perf_counter() - fragment_started, scope="fragment")
+
+    # ズーム帯（コロプレス）やズームレベル（Canvas ラベル）が変わったら描き直す
+    if track_zoom and map_state and map_state.get("zoom") is not None:
+        new_zoom = map_state["zoom"]
+        if (
+            display_mode == "Choropleth"
+            and band_for_zoom(new_zoom) != band_for_zoom(map_zoom)
+        ) or (canvas_labels and round(new_zoom) != round(map_zoom)):
+            st.session_state.map_zoom = map_state["zoom"]
+            st.session_state.map_center = map_state.get("center")
+            st.rerun(scope="fragment")
+
+
+@st.fragment
+def render_inference(page: PageState):
+    """観測した手がかりから候補国をスコア順に並べる（入力を変えるとこの部分だけ再実行）"""
+    index = get_inference_index()
+    with st.expander("🔎 Clue Inference", expanded=False):
+        st.caption(
+            "Characters come from the sidebar picker. Each clue adds its weight when "
+            "a country matches all observed options and subtracts it when none match."
+        )
+        if not index.names:
+            st.caption("No countries are loaded yet.")
+            return
+        observed = {"chars": list(page.selected_chars)}
+        clue_inputs = [c for c in index.clues if c != "chars" and index.options[c]]
+        clue_cols = st.columns(len(clue_inputs)) if clue_inputs else []
+        for col, clue in zip(clue_cols, clue_inputs):
+            with col:
+                observed[clue] = st.multiselect(
+                    CLUE_LABELS[clue], index.options[clue], key=f"clue_{clue}"
+                )
 
-# 地図の作成
-m = folium.Map(location=[0, 0], zoom_start=2)
+        if not any(observed.values()):
+            st.caption("Select characters or clues to rank candidate countries.")
+            return
+        matches = index.rank(observed, limit=INFERENCE_TOP_K)
+        if not matches:
+            st.caption("No candidate countries for the selected clues.")
+            return
+        active = list(matches[0].contributions)
+        st.dataframe(
+            [
+                {
+                    "Country": match.country,
+                    "Score": round(match.score, 2),
+                    "Consistent": "✓" if match.consistent else "",
+                    **{
+                        CLUE_LABELS[clue]: round(match.contributions[clue], 2)
+                        for clue in active
+                    },
+                }
+                for match in matches
+            ],
+            hide_index=True,
+        )
 
-# デバッグ情報を表示
-if content_field == "#number_plate_visual":
-    debug_info = []
-    for country, info in data.items():
-        if has_number_plate_config(info):
-            debug_info.append(country)
-
-    st.write(f"Countries with number plate config: {', '.join(debug_info)}")
-    st.write(f"Total countries with config: {len(debug_info)}")
-
-filtered_count = 0
-for country, info in data.items():
-    if selected_chars and not matches_selected_language(info, matching_langs):
-        continue
-    if not passes_all_filters(info, st.session_state.filters):
-        continue
-
-    content = get_display_content(country, info, content_field)
-
-    # 有効な値がない場合（空文字、None、"No ... available"など）はスキップ
-    def has_valid_content(content_text, field_key):
-        # 特別フィールドの場合はDataProcessorで判定
-        if DataProcessor.is_special_field(field_key):
-            if field_key == "#number_plate_visual":
-                return has_number_plate_config(info)
-            elif field_key == "#geoguessr_tips":
-                tips_data = info.get("geoguessr_tips", {})
-                tips = tips_data.get("short", []) or tips_data.get("long", [])
-                return bool(tips_data.get("short") or tips_data.get("long"))
-            # 他の特別フィールドもここで処理
-            return False
-
-        if not content_text or content_text.strip() == "":
-            return False
-        if (
-            "No " in content_text and "available" in content_text
-        ):  # "No street terms available"など
-            return False
-        return True
 
-    if not has_valid_content(content, content_field):
-        continue
+rerun_started = time.perf_counter()
+# ページ全体の実行中だけ True（フラグメントだけの再実行では前回の実行の終わりの False）
+app_run_active = True
+PROFILER.begin_rerun("app")
+# 例外・st.stop()・st.rerun() で途中で終わった再実行も数える
+try:
+    get_metrics_server()
 
-    # ここまで来た場合のみカウント
-    filtered_count += 1
+    display_config = DISPLAY_OPTIONS.get("prepend_country_name", {})
 
-    # 数値フィールドの場合は背景色を取得
-    raw_value = DataProcessor.process_field(content_field, info)
-    bg_color = get_background_color_for_numeric_field(
-        content_field, raw_value, numeric_percentiles
+    # ▼ 表示観点（サイドバー）
+    st.sidebar.write("### 🎯 Display Field")
+    selected_field = st.sidebar.selectbox(
+        "Content Field",
+        list(field_options.keys()),
+        index=0,
     )
-
-    # 表示用HTMLを生成
-    html = create_display_html(
-        country, info, content_field, show_flag, show_country_name, bg_color
+    content_field = field_options[selected_field]
+    data = load_data([content_field])
+    if get_dataset_store().loading:
+        st.info(f"⏳ Loading countries… {len(data)} so far")
+
+    # ▼ 数値フィールドの分布計算と凡例表示
+    numeric_percentiles = None
+    if (
+        content_field in FILTERABLE_FIELDS
+        and FILTERABLE_FIELDS[content_field][0] == "number"
+    ):
+        with PROFILER.stage("percentiles"):
+            numeric_percentiles = calculate_numeric_percentiles(data, content_field)
+
+        if numeric_percentiles:
+            st.markdown("### 🎨 Color Legend (Based on Data Distribution)")
+            legend_items = get_legend_info(content_field, numeric_percentiles)
+
+            # 統計情報も表示
+            stats_col1, stats_col2 = st.columns(2)
+            with stats_col1:
+                st.markdown(f"**Field:** {FILTERABLE_FIELDS[content_field][1]}")
+                st.markdown(
+                    f"**Total countries with data:** {len(numeric_percentiles['values'])}"
+                )
+            with stats_col2:
+                st.markdown(
+                    f"**Range:** {numeric_percentiles['min']:.0f} - {numeric_percentiles['max']:.0f}"
+                )
+                st.markdown(f"**Median:** {numeric_percentiles['median']:.0f}")
+
+            # 色の凡例（パーセンタイル順位ベース）
+            if legend_items:
+                st.markdown("#### Color Scale (Percentile Ranking)")
+                legend_cols = st.columns(len(legend_items))
+                for i, (range_text, color, description) in enumerate(legend_items):
+                    with legend_cols[i]:
+                        st.markdown(
+                            f'<div style="background-color: {color}; padding: 8px; border-radius: 4px; text-align: center; border: 1px solid #ddd; margin: 2px;">'
+                            f"<strong>{range_text}</strong><br><small>{description}</small></div>",
+                            unsafe_allow_html=True,
+                        )
+
+    # ▼ 特徴文字によるフィルター設定（文字体系・特定しやすさの順に並べた1つの選択ウィジェット）
+    st.sidebar.write("### 🔤 Character-based Language Filter")
+    st.sidebar.caption(SPECIFICITY_LEGEND)
+    selected_chars = st.sidebar.pills(
+        "Characters",
+        CHAR_PICKER_OPTIONS,
+        selection_mode="multi",
+        format_func=CHAR_PICKER_LABELS.get,
+        key="char_picker",
+        label_visibility="collapsed",
     )
-    # アイコンサイズを大きくする
-    div_icon = DivIcon(icon_size=(200, 40), icon_anchor=(100, 20), html=html)
-
-    # 詳細なポップアップ（全データを動的に表示）
-    def format_data_for_popup(country_name: str, info: dict) -> str:
-        """国の全データを動的にポップアップ用にフォーマット"""
-        sections = []
-
-        # 除外するキー（表示しない項目）
-        excluded_keys = {"flag", "latlng"}  # flagは別途表示、latlngは座標として表示
-
-        # 表示名のマッピング
-        display_names = {
-            "language": "Language",
-            "tld": "Domain",
-            "gdp_per_capita": "GDP per capita",
-            "number_plate": "Number Plate",
-            "crosswalk_stripes": "Crosswalk Stripes",
-            "crosswalk_features": "Crosswalk Features",
-            "sign_back": "Sign Back",
-            "camera": "Camera",
-        }
-
-        # 動的フィールドの処理
-        street_terms = DataProcessor.process_field("#dynamic_street_terms", info)
-        if street_terms and street_terms != "No street terms available":
-            sections.append(f"<b>Street Terms:</b> {street_terms}")
-
-        # GeoGuessrのTipsを整理して表示（long版を使用）
-        tips_data = info.get("geoguessr_tips", {})
-        tips = tips_data.get("long", [])  # long版を使用
-        if tips:
-            tips_html = format_tips_for_popup(tips)
-            sections.append(f"<b>GeoGuessr Tips:</b><br>{tips_html}")
-
-        # 通常のフィールドを動的に処理
-        for key, value in info.items():
-            if key in excluded_keys:
-                continue
 
-            display_name = display_names.get(key, key.replace("_", " ").title())
+    matching_langs = get_and_matching_languages(selected_chars, CHAR_TO_LANGUAGES)
 
-            if isinstance(value, list):
-                formatted_value = ", ".join(str(v) for v in value)
-            elif isinstance(value, dict):
-                # ネストした辞書は無視（flagなど）
-                continue
-            else:
-                formatted_value = str(value)
-
-            if formatted_value:  # 空でない場合のみ表示
-                sections.append(f"<b>{display_name}:</b> {formatted_value}")
-
-        # フラグ説明を追加
-        flag_info = info.get("flag", {})
-        if flag_info.get("description"):
-            sections.append(f"<b>Flag:</b> {flag_info['description']}")
-
-        # 座標情報を追加
-        latlng = info.get("latlng", [])
-        if len(latlng) == 2:
-            sections.append(f"<b>Coordinates:</b> {latlng[0]}, {latlng[1]}")
-
-        return "<br><br>".join(sections)
-
-    popup_content = format_data_for_popup(country, info)
-    popup_html = f"""
-    <div style="width: 300px; text-align: left; max-height: 400px; overflow-y: auto; background: #fff; color: #000; border: 1px solid #666;">
-        <div style="text-align: center; margin-bottom: 10px; padding: 10px; background: #f8f9fa; border-bottom: 1px solid #ddd;">
-            <h4 style="margin: 0 0 8px 0; color: #000;">{info['flag']['emoji']} {country}</h4>
-            <img src="{info['flag']['image_url']}" width="80" />
-        </div>
-        <div style="font-size: 12px; line-height: 1.4; padding: 10px; color: #000;">
-            {popup_content}
-        </div>
-    </div>
-    """
+    # ▼ チェックされた文字に対応する言語を表示
+    if selected_chars:
+        st.markdown("### 🧠 Languages Matching Selected Characters")
 
-    # ✅ wrap-around 表示（経度ずらし）
-    for offset in [-360, 0, 360]:
-        lon = info["latlng"][1] + offset
-        lat = info["latlng"][0]
-        # 有効なラベルがある場合のみマーカーを表示
-        folium.Marker(
-            location=[lat, lon],
-            icon=div_icon,
-            popup=folium.Popup(popup_html, max_width=350),
-            tooltip=country,
-        ).add_to(m)
+        # 選択された文字すべてを使用する言語を取得（AND演算）
+        matching_langs = get_and_matching_languages(selected_chars, CHAR_TO_LANGUAGES)
 
-# 統計情報の表示
-st.markdown(f"### 📊 Showing {filtered_count} countries")
+        st.markdown(f"**Selected characters:** {' '.join(selected_chars)}")
+        if matching_langs:
+            st.markdown(
+                f"**Matching languages (uses ALL selected characters):** {', '.join(sorted(matching_langs))}"
+            )
+        else:
+            st.markdown("**No languages use ALL of the selected characters together**")
+
+        # 街路表記モードの場合は対応する街路表記をテーブル形式で表示
+        if content_field == "#dynamic_street_terms" and matching_langs:
+            st.markdown("#### 🛣️ Street Terms for Selected Languages")
+
+            # テーブル形式で見やすく表示
+            street_data = []
+            for lang in matching_langs:
+                if lang in LANGUAGE_STREET_TERMS:
+                    terms = LANGUAGE_STREET_TERMS[lang]
+                    # 全ての街路表記を表示
+                    street_data.append(
+                        {
+                            "Language": lang,
+                            "Street Terms": ", ".join(terms["street"]),
+                            "Abbreviations": ", ".join(terms["abbreviations"]),
+                        }
+                    )
+
+            if street_data:
+                import pandas as pd
+
+                df = pd.DataFrame(street_data)
+                st.dataframe(df, use_container_width=True, hide_index=True)
+
+    # デバッグ情報を表示
+    if content_field == "#number_plate_visual":
+        debug_info = []
+        for country, info in data.items():
+            if has_number_plate_config(info):
+                debug_info.append(country)
+
+        st.write(f"Countries with number plate config: {', '.join(debug_info)}")
+        st.write(f"Total countries with config: {len(debug_info)}")
+
+    # ▼ フラグメントに渡す共有状態（ページ全体の再実行のときだけ更新される）
+    page_state = PageState(
+        selected_field=selected_field,
+        content_field=content_field,
+        selected_chars=tuple(selected_chars),
+        matching_langs=frozenset(matching_langs),
+        numeric_percentiles=numeric_percentiles,
+    )
 
-# ▼ 横幅をブラウザ幅にフィットさせる（最大1500px）
-st_folium(m, width=1500, height=1000)
+    render_inference(page_state)
+    render_results(page_state)
+
+    # ▼ フィルター結果キャッシュ（全セッション共通）のヒット率
+    with st.sidebar.expander("🗂️ Filter Cache"):
+        filter_cache = get_dataset_store().cache(
+            "filter_results", max_entries=FILTER_RESULT_CACHE_SIZE
+        )
+        st.markdown(
+            f"**Entries:** {len(filter_cache)} / {filter_cache.max_entries}  \n"
+            f"**Hits:** {filter_cache.hits} · **Misses:** {filter_cache.misses} · "
+            f"**Evictions:** {filter_cache.evictions}  \n"
+            f"**Hit rate:** {filter_cache.hit_rate:.1%}"
+        )
+
+    # ▼ 処理段階ごとのメモリ使用量（GEO_MEMORY_PROFILE=on のときだけ）
+    memory_report = PROFILER.end_rerun()
+    if memory_report is not None:
+        with st.sidebar.expander("🧠 Memory Profile"):
+            st.caption(
+                "tracemalloc, whole process: other sessions' allocations are included."
+            )
+            st.code(memory_report.format(), language="text")
+finally:
+    RERUNS.inc(scope="app")
+    RERUN_SECONDS.observe(time.perf_counter() - rerun_started, scope="app")
+    app_run_active = False
+
+# ▼ 逐次読み込みの途中なら、読み込んだ国まで描画した状態で少し待って再実行する
+if get_dataset_store().loading:
+    time.sleep(0.5)
+    st.rerun()
@@ -0,0 +1,25 @@
+# tests/conftest.py
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# アプリと同じく config パッケージを geogessr_app/ から読み込む
+APP_DIR = Path(__file__).resolve().parent.parent / "geogessr_app"
+if str(APP_DIR) not in sys.path:
+    sys.path.insert(0, str(APP_DIR))
+
+from config.dataset_store import DatasetStore  # noqa: E402
+from config.paths import GEO_DATA_PATH  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def geo_data_path() -> Path:
+    return GEO_DATA_PATH
+
+
+@pytest.fixture(scope="session")
+def store(geo_data_path) -> DatasetStore:
+    """実データ（geo_data.yaml）を読み込んだストア（テスト間で共有、変更しないこと）"""
+    return DatasetStore(geo_data_path)
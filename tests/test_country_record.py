@@ -0,0 +1,67 @@
+# tests/test_country_record.py
+
+import json
+import pickle
+
+import yaml
+
+from config.country_record import (
+    MISSING,
+    Country,
+    PlateSide,
+    Tips,
+    build_countries,
+    to_plain,
+)
+
+
+def test_records_read_like_the_source_dicts(geo_data_path):
+    data = yaml.safe_load(geo_data_path.read_text(encoding="utf-8"))
+    records = build_countries(data)
+    for name, info in data.items():
+        record = records[name]
+        assert record.to_dict() == (info or {})
+        assert set(record) == set(info or {})
+        assert json.loads(json.dumps(record, default=to_plain)) == (info or {})
+
+
+def test_absent_keys_and_explicit_nulls():
+    record = Country.from_dict(
+        "Alpha",
+        {"tld": None, "number_plate_config": {"rear": {"bg_color": "yellow"}}},
+    )
+    assert "tld" in record and record["tld"] is None
+    assert "camera" not in record and record.get("camera", "x") == "x"
+    assert record.camera is MISSING
+    rear = record["number_plate_config"]["rear"]
+    assert isinstance(rear, PlateSide)
+    assert rear.get("aspect_ratio") is None and "aspect_ratio" not in rear
+
+
+def test_unknown_keys_and_non_dict_tips_are_kept():
+    info = {
+        "extra_field": [1, 2],
+        "geoguessr_tips": {"short": [{"type": "text", "content": "a"}, "plain"]},
+        "language": ["Alphan", "English"],
+    }
+    record = Country.from_dict("Alpha", info)
+    assert record["extra_field"] == [1, 2]
+    assert isinstance(record["geoguessr_tips"], Tips)
+    assert record["geoguessr_tips"]["short"][1] == "plain"
+    assert record["language"] == ("Alphan", "English")
+    assert record.to_dict() == info
+
+
+def test_pool_shares_sub_records():
+    plate = {"front": {"bg_color": "white"}, "rear": {"bg_color": "white"}}
+    pool = {}
+    alpha = Country.from_dict("Alpha", {"number_plate_config": plate}, pool)
+    beta = Country.from_dict("Beta", {"number_plate_config": dict(plate)}, pool)
+    assert alpha.number_plate_config is beta.number_plate_config
+    assert alpha.number_plate_config.front is alpha.number_plate_config.rear
+
+
+def test_from_dict_accepts_records_and_pickles():
+    record = Country.from_dict("Alpha", {"flag": {"emoji": "x"}, "tld": ".al"})
+    assert Country.from_dict("Alpha", record) == record
+    assert pickle.loads(pickle.dumps(record)) == record
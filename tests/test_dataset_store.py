@@ -0,0 +1,221 @@
+# tests/test_dataset_store.py
+
+import threading
+
+import pytest
+
+from config.country_record import Country
+from config.dataset_store import MEMBERSHIP_FIELD, DatasetStore, DerivedCache
+from config.yaml_blocks import split_top_level_blocks
+
+BASE_YAML = """\
+Alpha:
+  language:
+  - Alphan
+  tld: .al
+Beta:
+  language:
+  - Betan
+  - English
+  tld: .be
+Gamma:
+  tld: .ga
+"""
+
+
+@pytest.fixture
+def small_store(tmp_path) -> DatasetStore:
+    path = tmp_path / "geo_data.yaml"
+    path.write_text(BASE_YAML, encoding="utf-8")
+    return DatasetStore(path)
+
+
+# ---- DerivedCache ----
+
+
+def test_cache_hit_and_miss():
+    cache = DerivedCache("test")
+    calls = []
+    compute = lambda: calls.append(1) or len(calls)  # noqa: E731
+    assert cache.get_or_compute("k", compute) == 1
+    assert cache.get_or_compute("k", compute) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.hit_rate == 0.5
+
+
+def test_cache_version_mismatch_recomputes():
+    cache = DerivedCache("test")
+    assert cache.get_or_compute("k", lambda: "v1", version=1) == "v1"
+    assert cache.get_or_compute("k", lambda: "v2", version=2) == "v2"
+    assert cache.get_or_compute("k", lambda: "v3", version=2) == "v2"
+
+
+def test_invalidate_by_country_and_field():
+    cache = DerivedCache("test")
+    cache.get_or_compute("alpha_tld", lambda: 1, countries={"Alpha"}, fields={"tld"})
+    cache.get_or_compute("beta_tld", lambda: 2, countries={"Beta"}, fields={"tld"})
+    cache.get_or_compute("all_tld", lambda: 3, fields={"tld"})
+    cache.get_or_compute("alpha_any", lambda: 4, countries={"Alpha"})
+    cache.get_or_compute("everything", lambda: 5)
+
+    # 別のフィールドの変更: フィールドを問わないエントリだけが消える
+    assert cache.invalidate({"Alpha": {"language"}}) == 2
+    assert "alpha_any" not in cache._entries and "everything" not in cache._entries
+
+    # 対象の国のフィールドの変更
+    assert cache.invalidate({"Alpha": {"tld"}}) == 2
+    assert set(cache._entries) == {"beta_tld"}
+
+    assert cache.invalidate({}) == 0
+    assert len(cache) == 1
+
+
+def test_invalidate_membership_drops_all_country_entries():
+    cache = DerivedCache("test")
+    cache.get_or_compute("all_tld", lambda: 1, fields={"tld"})
+    cache.get_or_compute("beta_tld", lambda: 2, countries={"Beta"}, fields={"tld"})
+    assert cache.invalidate({"Delta": {MEMBERSHIP_FIELD}}) == 1
+    assert set(cache._entries) == {"beta_tld"}
+
+
+def test_invalidated_during_compute_is_returned_but_not_stored():
+    cache = DerivedCache("test")
+
+    def compute():
+        # 計算中にデータが変わった
+        cache.invalidate({"Alpha": {"tld"}})
+        return "stale"
+
+    assert cache.get_or_compute("k", compute, fields={"tld"}) == "stale"
+    assert len(cache) == 0
+    assert cache.get_or_compute("k", lambda: "fresh", fields={"tld"}) == "fresh"
+    assert len(cache) == 1
+
+
+def test_unrelated_change_during_compute_is_stored():
+    cache = DerivedCache("test")
+
+    def compute():
+        cache.invalidate({"Alpha": {"language"}})
+        return "kept"
+
+    cache.get_or_compute("k", compute, countries={"Alpha"}, fields={"tld"})
+    assert len(cache) == 1
+
+
+def test_pending_is_tracked_per_concurrent_compute():
+    cache = DerivedCache("test")
+    started = threading.Event()
+    release = threading.Event()
+    results = {}
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return "slow"
+
+    worker = threading.Thread(
+        target=lambda: results.update(
+            slow=cache.get_or_compute("slow", slow, fields={"tld"})
+        )
+    )
+    worker.start()
+    started.wait(5)
+    # 別のキーの計算は待たずに終わり、保存される
+    assert cache.get_or_compute("fast", lambda: "fast", fields={"language"}) == "fast"
+    cache.invalidate({"Alpha": {"tld"}})
+    release.set()
+    worker.join(5)
+
+    assert results["slow"] == "slow"
+    assert set(cache._entries) == {"fast"}
+    assert cache._pending == {}
+
+
+def test_lru_eviction():
+    cache = DerivedCache("test", max_entries=2)
+    cache.get_or_compute("a", lambda: 1)
+    cache.get_or_compute("b", lambda: 2)
+    cache.get_or_compute("a", lambda: 1)
+    cache.get_or_compute("c", lambda: 3)
+    assert set(cache._entries) == {"a", "c"}
+    assert cache.evictions == 1
+
+
+# ---- DatasetStore._apply_text ----
+
+
+def test_initial_load_builds_records(small_store):
+    assert list(small_store.data) == ["Alpha", "Beta", "Gamma"]
+    assert all(isinstance(info, Country) for info in small_store.data.values())
+    assert small_store.data["Beta"]["language"] == ("Betan", "English")
+    assert small_store.version
+
+
+def test_field_change_reports_only_that_field(small_store):
+    before = dict(small_store.data)
+    version = small_store.version
+    changes = small_store._apply_text(BASE_YAML.replace("tld: .be", "tld: .bt"))
+    assert changes == {"Beta": {"tld"}}
+    assert small_store.data["Beta"]["tld"] == ".bt"
+    # 変更のない国は同じオブジェクトを使い回す
+    assert small_store.data["Alpha"] is before["Alpha"]
+    assert small_store.version != version
+
+
+def test_added_and_removed_countries(small_store):
+    order_version = small_store.order_version
+    text = BASE_YAML.replace("Gamma:\n  tld: .ga\n", "Delta:\n  tld: .de\n")
+    changes = small_store._apply_text(text)
+    assert changes == {
+        "Gamma": {"tld", MEMBERSHIP_FIELD},
+        "Delta": {"tld", MEMBERSHIP_FIELD},
+    }
+    assert list(small_store.data) == ["Alpha", "Beta", "Delta"]
+    assert small_store.order_version == order_version + 1
+
+
+def test_reorder_marks_moved_countries(small_store):
+    alpha, beta, gamma = (block for _name, block in split_top_level_blocks(BASE_YAML))
+    text = beta + alpha + gamma
+    order_version = small_store.order_version
+    changes = small_store._apply_text(text)
+    assert list(small_store.data) == ["Beta", "Alpha", "Gamma"]
+    assert changes == {"Beta": {MEMBERSHIP_FIELD}, "Alpha": {MEMBERSHIP_FIELD}}
+    assert small_store.order_version == order_version + 1
+
+
+def test_unchanged_text_reports_nothing(small_store):
+    version = small_store.version
+    assert small_store._apply_text(BASE_YAML) == {}
+    assert small_store.version == version
+
+
+def test_null_country_and_explicit_null_field(small_store):
+    text = BASE_YAML.replace("Gamma:\n  tld: .ga\n", "Gamma:\n  tld: null\n")
+    assert small_store._apply_text(text) == {"Gamma": {"tld"}}
+    assert "tld" in small_store.data["Gamma"]
+    assert small_store.data["Gamma"]["tld"] is None
+
+    # null の値を消しても読み出す値（None）は変わらないので、変更としては報告しない
+    version = small_store.version
+    assert small_store._apply_text(text.replace("  tld: null\n", "")) == {}
+    assert dict(small_store.data["Gamma"]) == {}
+    assert small_store.version != version
+
+
+def test_apply_text_invalidates_caches(small_store):
+    cache = small_store.cache("test")
+    cache.get_or_compute("beta", lambda: 1, countries={"Beta"}, fields={"tld"})
+    cache.get_or_compute("alpha", lambda: 2, countries={"Alpha"}, fields={"tld"})
+    small_store._apply_text(BASE_YAML.replace("tld: .be", "tld: .bt"))
+    assert set(cache._entries) == {"alpha"}
+
+
+def test_refresh_picks_up_file_changes(small_store):
+    small_store.path.write_text(
+        BASE_YAML.replace("- Alphan", "- Alphan\n  - French"), encoding="utf-8"
+    )
+    # 更新時刻の分解能に頼らず、サイズの変化で変更を検知する
+    assert small_store.refresh() == {"Alpha": {"language"}}
+    assert small_store.refresh() == {}
@@ -0,0 +1,282 @@
+# tests/test_filter_expressions.py
+
+import operator
+import random
+
+import numpy as np
+import pytest
+
+from config.data_processor import DataProcessor
+from config.field_columns import parse_numeric_value
+from config.filter_expressions import (
+    And,
+    FilterSyntaxError,
+    Not,
+    Or,
+    Predicate,
+    canonicalize,
+    evaluate_expression,
+    make_predicate,
+    parse_expression,
+)
+
+_NUMERIC_OPS = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+}
+
+
+def reference_matches(expr, info: dict) -> bool:
+    """式を国ごとに DataProcessor で判定する素朴な実装（列・索引・計画を使わない）"""
+    if isinstance(expr, And):
+        return all(reference_matches(child, info) for child in expr.children)
+    if isinstance(expr, Or):
+        return any(reference_matches(child, info) for child in expr.children)
+    if isinstance(expr, Not):
+        return not reference_matches(expr.child, info)
+    if expr.match in _NUMERIC_OPS:
+        value = parse_numeric_value(DataProcessor.process_field(expr.field, info))
+        return value is not None and _NUMERIC_OPS[expr.match](value, float(expr.value))
+    return DataProcessor.filter_matches(expr.field, info, expr.match, expr.value)
+
+
+def reference_mask(store, expr) -> np.ndarray:
+    return np.array(
+        [reference_matches(expr, info) for info in store.data.values()], dtype=bool
+    )
+
+
+def evaluate(store, expr) -> np.ndarray:
+    mask, _plan = evaluate_expression(store, expr, tuple(store.data))
+    return mask
+
+
+# ---- parse ----
+
+
+def test_parse_precedence_or_and_not():
+    expr = parse_expression("tld = .br or language contains spanish and not tld = .es")
+    assert expr == Or(
+        (
+            Predicate("tld", "equals", ".br"),
+            And(
+                (
+                    Predicate("language", "contains", "spanish"),
+                    Not(Predicate("tld", "equals", ".es")),
+                )
+            ),
+        )
+    )
+
+
+def test_parse_parentheses_and_flattening():
+    expr = parse_expression("(tld = .a and (tld = .b and tld = .c)) or (tld = .d)")
+    assert expr == Or(
+        (
+            And(
+                (
+                    Predicate("tld", "equals", ".a"),
+                    Predicate("tld", "equals", ".b"),
+                    Predicate("tld", "equals", ".c"),
+                )
+            ),
+            Predicate("tld", "equals", ".d"),
+        )
+    )
+
+
+def test_parse_quotes_not_equal_and_double_negation():
+    assert parse_expression('flag.description contains "red \\"field\\""') == (
+        Predicate("flag.description", "contains", 'red "field"')
+    )
+    assert parse_expression("camera CONTAINS 'gen 4'") == Predicate(
+        "camera", "contains", "gen 4"
+    )
+    assert parse_expression("tld != .br") == Not(Predicate("tld", "equals", ".br"))
+    assert parse_expression("not not tld = .br") == Predicate("tld", "equals", ".br")
+
+
+def test_parse_plate_and_empty():
+    assert parse_expression("number_plate_config.rear.bg_color = yellow") == (
+        Predicate("number_plate_config.rear.bg_color", "equals", "yellow")
+    )
+    assert parse_expression("   ") is None
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "nope = 1",
+        "tld > 3",
+        "gdp_per_capita > lots",
+        "tld like .br",
+        "tld = .br and",
+        "(tld = .br",
+        "tld = .br)",
+        "tld = .br tld = .ar",
+        "= .br",
+        "tld",
+        "tld = .br & tld = .ar",
+    ],
+)
+def test_parse_errors(text):
+    with pytest.raises(FilterSyntaxError):
+        parse_expression(text)
+
+
+def test_make_predicate_accepts_equals_sign():
+    assert make_predicate("tld", "=", ".br") == Predicate("tld", "equals", ".br")
+
+
+# ---- canonicalize ----
+
+
+@pytest.mark.parametrize(
+    "left, right",
+    [
+        ("tld = .BR or tld = .ar", "tld = .ar or tld = .br"),
+        ("tld = .br and tld = .br", "tld = .br"),
+        ("gdp_per_capita > 10000", "gdp_per_capita > 10000.0"),
+        (
+            "language contains Spanish and (tld = .ar or tld = .cl)",
+            "(tld = .CL or tld = .ar) and language contains spanish",
+        ),
+        ("not (tld = .br or tld = .ar)", "not (tld = .ar or tld = .BR)"),
+        (
+            "(tld = .br and (tld = .ar and tld = .cl))",
+            "tld = .cl and tld = .ar and tld = .br",
+        ),
+    ],
+)
+def test_canonicalize_equivalent_forms(left, right):
+    assert canonicalize(parse_expression(left)) == canonicalize(parse_expression(right))
+
+
+def test_canonicalize_keeps_different_expressions_apart():
+    assert canonicalize(parse_expression("tld = .br")) != canonicalize(
+        parse_expression("tld contains .br")
+    )
+    assert canonicalize(parse_expression("tld = .br or tld = .ar")) != canonicalize(
+        parse_expression("tld = .br and tld = .ar")
+    )
+
+
+def test_canonicalize_is_idempotent():
+    expr = parse_expression(
+        "not (tld = .BR or (camera contains Gen and gdp_per_capita >= 5e3))"
+    )
+    once = canonicalize(expr)
+    assert canonicalize(once) == once
+    assert canonicalize(None) is None
+
+
+# ---- execute ----
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "tld = .br",
+        "tld = .BR",
+        "tld contains .b",
+        "language = spanish",
+        "language contains ish",
+        "gdp_per_capita > 20000",
+        "gdp_per_capita <= 5000 or crosswalk_stripes >= 6",
+        "not gdp_per_capita > 20000",
+        "#dynamic_street_terms contains calle",
+        "flag.description contains red and not language = english",
+        "number_plate_config.rear.bg_color = yellow",
+        "number_plate_config.front.bg_color = white and not language contains french",
+        "camera contains gen or sign_back contains yellow",
+        "tld = .nowhere",
+    ],
+)
+def test_execute_matches_reference(store, text):
+    expr = parse_expression(text)
+    np.testing.assert_array_equal(evaluate(store, expr), reference_mask(store, expr))
+
+
+def test_execute_canonical_form_gives_same_result(store):
+    expr = parse_expression(
+        "(language contains Spanish or tld = .PT) and not gdp_per_capita < 8000"
+    )
+    np.testing.assert_array_equal(
+        evaluate(store, canonicalize(expr)), evaluate(store, expr)
+    )
+
+
+def test_execute_without_expression_selects_everything(store):
+    assert evaluate(store, None).all()
+
+
+def _predicate_pool(store) -> list[Predicate]:
+    """実データの値から作った条件（一致するもの・しないもの・数値の境界を含む）"""
+    rng = random.Random(0)
+    infos = list(store.data.values())
+    pool = []
+    for field_path in ("tld", "language", "camera", "sign_back", "flag.description"):
+        values = [DataProcessor.process_field(field_path, info) for info in infos]
+        words = sorted(
+            {
+                str(word).lower()
+                for value in values
+                if value
+                for word in (value if isinstance(value, tuple) else str(value).split())
+            }
+        )
+        for word in rng.sample(words, min(4, len(words))):
+            pool.append(Predicate(field_path, "equals", word))
+            pool.append(
+                Predicate(field_path, "contains", word[: max(1, len(word) // 2)])
+            )
+    for field_path in ("gdp_per_capita", "crosswalk_stripes"):
+        numbers = sorted(
+            v
+            for v in (
+                parse_numeric_value(DataProcessor.process_field(field_path, info))
+                for info in infos
+            )
+            if v is not None
+        )
+        for threshold in (numbers[0], numbers[len(numbers) // 2], numbers[-1]):
+            for match in _NUMERIC_OPS:
+                pool.append(Predicate(field_path, match, str(threshold)))
+    for color in ("yellow", "white", "black"):
+        pool.append(Predicate("number_plate_config.rear.bg_color", "equals", color))
+        pool.append(Predicate("number_plate_config.front.text_color", "equals", color))
+    return pool
+
+
+def _random_expression(rng: random.Random, pool: list[Predicate], depth: int = 0):
+    if depth >= 3 or rng.random() < 0.3:
+        return rng.choice(pool)
+    kind = rng.choice(("and", "or", "not"))
+    if kind == "not":
+        return Not(_random_expression(rng, pool, depth + 1))
+    children = tuple(
+        _random_expression(rng, pool, depth + 1) for _ in range(rng.randint(2, 3))
+    )
+    return And(children) if kind == "and" else Or(children)
+
+
+def test_random_expressions_match_reference(store):
+    """ランダムな式で計画の実行（候補の絞り込み・索引）と素朴な判定が一致すること"""
+    rng = random.Random(1234)
+    pool = _predicate_pool(store)
+    for _ in range(150):
+        expr = _random_expression(rng, pool)
+        expected = reference_mask(store, expr)
+        np.testing.assert_array_equal(
+            evaluate(store, expr), expected, err_msg=str(expr)
+        )
+        np.testing.assert_array_equal(
+            evaluate(store, canonicalize(expr)), expected, err_msg=str(expr)
+        )
+        # 文字列に戻した式を解析し直しても同じ結果になる
+        reparsed = parse_expression(str(expr))
+        np.testing.assert_array_equal(
+            evaluate(store, reparsed), expected, err_msg=str(expr)
+        )
@@ -0,0 +1,110 @@
+# tests/test_query_api.py
+
+import gzip
+import json
+
+import pytest
+
+from config.query_api import QueryApi
+
+
+@pytest.fixture
+def api(store) -> QueryApi:
+    return QueryApi(store)
+
+
+def get(api: QueryApi, target: str, method: str = "GET", **headers):
+    status, response_headers, body = api.respond(method, target, headers)
+    if response_headers.get("Content-Encoding") == "gzip":
+        body = gzip.decompress(body)
+    return status, response_headers, json.loads(body) if body else None
+
+
+def test_countries(api, store):
+    status, headers, payload = get(api, "/countries")
+    assert status == 200
+    assert headers["Content-Type"].startswith("application/json")
+    assert payload["version"] == store.version
+    assert [c["name"] for c in payload["countries"]] == list(store.data)
+
+
+@pytest.mark.parametrize(
+    "name", ["tld", "Top-level Domain", "number_plate_config.rear.bg_color"]
+)
+def test_field_by_path_or_label(api, store, name):
+    status, _headers, payload = get(api, f"/field/{name.replace(' ', '%20')}")
+    assert status == 200
+    assert set(payload["values"]) == set(store.data)
+
+
+def test_field_values_are_json_lists_for_languages(api):
+    _status, _headers, payload = get(api, "/field/language")
+    assert all(
+        value is None or isinstance(value, list) for value in payload["values"].values()
+    )
+
+
+@pytest.mark.parametrize(
+    "target, count",
+    [
+        ("/query?filter=tld:equals:.br", 1),
+        ("/query?expr=tld%20%3D%20.br%20or%20tld%20%3D%20.ar", 2),
+        ("/query?filter=tld:equals:.br&expr=language%20contains%20english", 0),
+        ("/query?expr=number_plate_config.rear.bg_color%20%3D%20yellow", 6),
+        ("/query?expr=%23similar_to%20%3D%20Spain", 6),
+        ("/query", None),
+    ],
+)
+def test_query_counts(api, store, target, count):
+    status, _headers, payload = get(api, target)
+    assert status == 200
+    assert payload["count"] == (len(store.data) if count is None else count)
+    assert len(payload["countries"]) == payload["count"]
+
+
+@pytest.mark.parametrize(
+    "target",
+    [
+        "/query?filter=tld",
+        "/query?filter=nope:equals:x",
+        "/query?filter=tld:like:x",
+        "/query?expr=tld%20%3D",
+        "/query?expr=gdp_per_capita%20%3E%20lots",
+    ],
+)
+def test_query_bad_request(api, target):
+    status, _headers, payload = get(api, target)
+    assert status == 400
+    assert payload["error"]
+
+
+@pytest.mark.parametrize(
+    "target", ["/nowhere", "/field/", "/field/nope", "/field/%23similar_to"]
+)
+def test_not_found(api, target):
+    status, _headers, payload = get(api, target)
+    assert status == 404
+    assert payload["error"]
+
+
+def test_method_not_allowed(api):
+    status, _headers, _payload = get(api, "/countries", method="POST")
+    assert status == 405
+    assert get(api, "/countries", method="HEAD")[0] == 200
+
+
+def test_etag_not_modified_and_gzip(api):
+    status, headers, _payload = get(api, "/query?filter=tld:equals:.br")
+    etag = headers["ETag"]
+    status, headers, payload = get(
+        api, "/query?filter=tld:equals:.br", **{"if-none-match": etag}
+    )
+    assert (status, payload) == (304, None)
+
+    status, headers, payload = get(
+        api, "/query?filter=tld:equals:.br", **{"accept-encoding": "gzip"}
+    )
+    assert status == 200
+    assert headers["Content-Encoding"] == "gzip"
+    assert headers["ETag"] != etag
+    assert payload["count"] == 1
@@ -0,0 +1,114 @@
+# tests/test_shards.py
+
+import yaml
+
+from config.dataset_store import MEMBERSHIP_FIELD, DatasetStore
+from config.field_config import FIELD_GROUPS
+from config.shards import (
+    CORE_GROUP,
+    ShardedDatasetStore,
+    join_shards,
+    shard_path,
+    split_dataset,
+)
+
+SMALL_YAML = """\
+Alpha:
+  camera: Gen 3
+  language:
+  - Alphan
+  number_plate_config:
+    rear:
+      bg_color: yellow
+      top_band_color: null
+  tld: .al
+  unknown_key: kept
+Beta: null
+Gamma:
+  geoguessr_tips:
+    short:
+    - type: text
+      content: Look for poles
+    - plain string tip
+  tld: .ga
+"""
+
+
+def test_split_join_round_trip_geo_data(geo_data_path, tmp_path):
+    counts = split_dataset(geo_data_path, tmp_path / "shards")
+    original = yaml.safe_load(geo_data_path.read_text(encoding="utf-8"))
+    assert counts[CORE_GROUP] == len(original)
+
+    joined = tmp_path / "joined.yaml"
+    assert join_shards(tmp_path / "shards", joined) == len(original)
+    assert yaml.safe_load(joined.read_text(encoding="utf-8")) == {
+        name: info or {} for name, info in original.items()
+    }
+
+
+def test_split_join_round_trip_keeps_nulls_and_unknown_keys(tmp_path):
+    source = tmp_path / "geo_data.yaml"
+    source.write_text(SMALL_YAML, encoding="utf-8")
+    split_dataset(source, tmp_path / "shards")
+
+    plate = yaml.safe_load(shard_path(tmp_path / "shards", "plate").read_text())
+    assert set(plate) == {"Alpha"}
+    # 未定義のキーは core に入る
+    core = yaml.safe_load(shard_path(tmp_path / "shards", CORE_GROUP).read_text())
+    assert core["Alpha"]["unknown_key"] == "kept"
+    assert core["Beta"] == {}
+
+    joined = tmp_path / "joined.yaml"
+    join_shards(tmp_path / "shards", joined)
+    expected = yaml.safe_load(SMALL_YAML)
+    expected["Beta"] = {}
+    assert yaml.safe_load(joined.read_text(encoding="utf-8")) == expected
+
+
+def test_sharded_store_matches_monolithic(geo_data_path, tmp_path):
+    split_dataset(geo_data_path, tmp_path / "shards")
+    sharded = ShardedDatasetStore(tmp_path / "shards")
+    assert sharded.loaded_groups == {CORE_GROUP}
+    sharded.ensure_groups(FIELD_GROUPS)
+    monolithic = DatasetStore(geo_data_path)
+    assert list(sharded.data) == list(monolithic.data)
+    assert sharded.data == monolithic.data
+
+
+def test_sharded_store_loads_groups_on_demand(tmp_path):
+    source = tmp_path / "geo_data.yaml"
+    source.write_text(SMALL_YAML, encoding="utf-8")
+    split_dataset(source, tmp_path / "shards")
+    store = ShardedDatasetStore(tmp_path / "shards")
+    assert "camera" not in store.data["Alpha"]
+
+    changes = store.ensure_fields(["camera"])
+    assert changes == {"Alpha": {"camera"}}
+    assert store.loaded_groups == {CORE_GROUP, "text"}
+    assert store.data["Alpha"]["camera"] == "Gen 3"
+    assert store.ensure_fields(["camera"]) == {}
+
+    store.ensure_fields(["number_plate_config.rear.bg_color"])
+    assert store.data["Alpha"]["number_plate_config"]["rear"]["bg_color"] == "yellow"
+
+
+def test_sharded_store_refresh_reports_shard_changes(tmp_path):
+    source = tmp_path / "geo_data.yaml"
+    source.write_text(SMALL_YAML, encoding="utf-8")
+    shards = tmp_path / "shards"
+    split_dataset(source, shards)
+    store = ShardedDatasetStore(shards)
+
+    core = shard_path(shards, CORE_GROUP)
+    core.write_text(
+        core.read_text(encoding="utf-8").replace("tld: .ga", "tld: .gama"),
+        encoding="utf-8",
+    )
+    assert store.refresh() == {"Gamma": {"tld"}}
+    assert store.data["Gamma"]["tld"] == ".gama"
+
+    data = yaml.safe_load(core.read_text(encoding="utf-8"))
+    data["Delta"] = {"tld": ".de"}
+    core.write_text(yaml.safe_dump(data, sort_keys=False), encoding="utf-8")
+    assert store.refresh() == {"Delta": {"tld", MEMBERSHIP_FIELD}}
+    assert list(store.data)[-1] == "Delta"
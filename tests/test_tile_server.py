@@ -0,0 +1,79 @@
+# tests/test_tile_server.py
+
+import json
+import sqlite3
+
+import pytest
+
+from config.tile_server import MBTilesSource, TileServer
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 16
+
+
+@pytest.fixture
+def mbtiles(tmp_path):
+    path = tmp_path / "basemap.mbtiles"
+    connection = sqlite3.connect(path)
+    connection.executescript(
+        "CREATE TABLE metadata (name TEXT, value TEXT);"
+        "CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER,"
+        " tile_row INTEGER, tile_data BLOB);"
+    )
+    connection.executemany(
+        "INSERT INTO metadata VALUES (?, ?)", [("name", "test"), ("format", "png")]
+    )
+    # XYZ の (1, 0, 0) は TMS の行番号では 1
+    connection.execute("INSERT INTO tiles VALUES (1, 0, 1, ?)", (PNG,))
+    connection.commit()
+    connection.close()
+    return path
+
+
+@pytest.fixture
+def server(mbtiles) -> TileServer:
+    return TileServer(MBTilesSource(mbtiles))
+
+
+def test_tile_found(server):
+    status, headers, body = server.respond("GET", "/tiles/1/0/0.png", {})
+    assert status == 200
+    assert body == PNG
+    assert headers["Content-Type"] == "image/png"
+    assert "max-age" in headers["Cache-Control"]
+
+
+def test_tile_not_modified(server):
+    _status, headers, _body = server.respond("GET", "/tiles/1/0/0.png", {})
+    status, _headers, body = server.respond(
+        "GET", "/tiles/1/0/0.png", {"if-none-match": headers["ETag"]}
+    )
+    assert (status, body) == (304, b"")
+
+
+@pytest.mark.parametrize("target", ["/tiles/1/0/1.png", "/tiles/9/9/9.png"])
+def test_missing_tile(server, target):
+    status, _headers, body = server.respond("GET", target, {})
+    assert status == 404
+    assert "no tile" in json.loads(body)["error"]
+
+
+@pytest.mark.parametrize("target", ["/", "/tiles/1/0.png", "/tiles/a/b/c.png"])
+def test_unknown_path(server, target):
+    assert server.respond("GET", target, {})[0] == 404
+
+
+def test_metadata(server):
+    status, _headers, body = server.respond("GET", "/metadata.json", {})
+    assert status == 200
+    assert json.loads(body) == {"name": "test", "format": "png"}
+
+
+def test_method_not_allowed(server):
+    assert server.respond("POST", "/tiles/1/0/0.png", {})[0] == 405
+
+
+def test_missing_file_serves_no_tiles(tmp_path):
+    server = TileServer(MBTilesSource(tmp_path / "missing.mbtiles"))
+    assert server.respond("GET", "/tiles/1/0/0.png", {})[0] == 404
+    status, _headers, body = server.respond("GET", "/metadata.json", {})
+    assert (status, json.loads(body)) == (200, {})
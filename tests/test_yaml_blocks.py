@@ -0,0 +1,71 @@
+# tests/test_yaml_blocks.py
+
+import io
+
+import pytest
+import yaml
+
+from config.yaml_blocks import (
+    iter_top_level_items,
+    parse_block,
+    replace_scalar_field,
+    split_top_level_blocks,
+)
+
+
+def load_items(text: str) -> dict:
+    return dict(iter_top_level_items(io.StringIO(text)))
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "",
+        "null\n",
+        "{}\n",
+        "Alpha: {}\n",
+        "Alpha:\nBeta:\n  tld: .be\n",
+        "# comment\n---\nAlpha:\n  tld: .al\n...\n",
+        "Alpha: {tld: .al, language: [Alphan, English]}\n",
+        "Alpha:\n  latlng: [1.5, -2]\n  gdp_per_capita: 12000\n"
+        "  note: |\n    line 1\n    line 2\n",
+        "Alpha:\n  flag: &flag\n    emoji: x\nBeta:\n  flag: *flag\n",
+        "'Côte d''Ivoire':\n  tld: .ci\n\"São Tomé\":\n  tld: .st\n",
+        "1:\n  tld: .one\ntrue: yes\n",
+    ],
+)
+def test_items_match_safe_load(text):
+    assert load_items(text) == (yaml.safe_load(text) or {})
+
+
+def test_items_match_safe_load_on_geo_data(geo_data_path):
+    with open(geo_data_path, "r", encoding="utf-8") as f:
+        streamed = list(iter_top_level_items(f))
+    expected = yaml.safe_load(geo_data_path.read_text(encoding="utf-8"))
+    assert dict(streamed) == expected
+    assert [name for name, _info in streamed] == list(expected)
+
+
+@pytest.mark.parametrize("text", ["- Alpha\n- Beta\n", "just a string\n"])
+def test_items_reject_non_mapping_documents(text):
+    with pytest.raises(yaml.YAMLError):
+        load_items(text)
+
+
+def test_blocks_parse_to_the_same_data(geo_data_path):
+    text = geo_data_path.read_text(encoding="utf-8")
+    parsed = dict(parse_block(block) for _name, block in split_top_level_blocks(text))
+    assert parsed == {name: info or {} for name, info in yaml.safe_load(text).items()}
+
+
+def test_replace_scalar_field_touches_one_field():
+    block = "Alpha:\n  language:\n  - Alphan\n  tld: .al\n"
+    replaced = replace_scalar_field(block, "tld", ".xx")
+    assert replaced == "Alpha:\n  language:\n  - Alphan\n  tld: .xx\n"
+    inserted = replace_scalar_field(block, "gdp_per_capita", 100)
+    assert parse_block(inserted)[1] == {
+        "gdp_per_capita": 100,
+        "language": ["Alphan"],
+        "tld": ".al",
+    }
+    assert inserted.index("gdp_per_capita") < inserted.index("language")